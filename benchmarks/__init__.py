@@ -0,0 +1,20 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+"""
+Benchmarks of the bot's hot path, runnable with "python -m benchmarks".
+"""
+
+from benchmarks.suite import BENCHMARKS, Benchmark, run_benchmarks
+
+__all__ = ["BENCHMARKS", "Benchmark", "run_benchmarks"]
@@ -0,0 +1,73 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import datetime
+import json
+import platform
+import sys
+
+from benchmarks.suite import SEED, run_benchmarks
+
+
+def main() -> None:
+    """
+    Runs the benchmark suite and prints the results as JSON.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Benchmark the dice roller, roll logs and command parsing.",
+    )
+    parser.add_argument(
+        "-k", "--filter", default="",
+        help="only run benchmarks whose name contains this text",
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=5,
+        help="number of timings per benchmark (default: 5)",
+    )
+    parser.add_argument(
+        "--quick", action="store_true",
+        help="time a tenth of the calls, for a fast smoke run",
+    )
+    parser.add_argument(
+        "-o", "--output",
+        help="write the JSON report to this file instead of stdout",
+    )
+    args = parser.parse_args()
+
+    results = run_benchmarks(
+        name_filter=args.filter,
+        repeat=args.repeat,
+        scale=0.1 if args.quick else 1.0,
+        progress=lambda name: print(name, file=sys.stderr),
+    )
+    report = {
+        "created": datetime.datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "seed": SEED,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding='utf-8') as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
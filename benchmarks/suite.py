@@ -0,0 +1,441 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import timeit
+from typing import Any, Callable, Optional
+
+from bot_reasoning import CommandRouter
+from dice_expression import _compile_normalized, compile_expression
+from logger import (
+    BinaryRollLogger,
+    JsonlRollLogger,
+    RingRollLogger,
+    RollLogger,
+    SqliteRollLogger,
+)
+from roll_store import RollStore
+from roller import Roller
+
+POOL_SIZES: tuple[tuple[int, int], ...] = (
+    (1, 20),
+    (4, 6),
+    (10, 10),
+    (100, 6),
+    (500, 6),
+    (999, 1000),
+)
+ROLL_TYPES: tuple[str, ...] = (
+    "normal_roll",
+    "drop_high",
+    "drop_low",
+    "keep_high",
+    "keep_low",
+)
+HISTORY_SIZES: tuple[int, ...] = (500, 5000)
+EXPRESSIONS: tuple[str, ...] = (
+    "2d6+1d4+3",
+    "(4d6dl)x6",
+    "1d20+5 vs 15",
+    "10d10kh3",
+    "6d10e>=8",
+    "1000d6",
+)
+SEED: int = 20231017
+
+
+class Benchmark:
+    """
+    A single benchmark: a setup function that returns the callable to time.
+
+    Attributes:
+        name (str): Unique name of the benchmark.
+        params (dict): Parameters reported with the result.
+        setup (Callable): Builds the callable to time; it may also return
+            a cleanup function as a second element.
+        number (int): Number of calls per timing.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        setup: Callable[[], Any],
+        number: int,
+        **params: Any,
+    ) -> None:
+        """
+        Initializes the benchmark.
+
+        Args:
+            name (str): Unique name of the benchmark.
+            setup (Callable): Builds the callable to time, or a tuple of the
+                callable and a cleanup function.
+            number (int): Number of calls per timing.
+            **params: Parameters reported with the result.
+        """
+        self.name: str = name
+        self.setup: Callable[[], Any] = setup
+        self.number: int = number
+        self.params: dict[str, Any] = params
+
+    def run(self, repeat: int, scale: float = 1.0) -> dict[str, Any]:
+        """
+        Times the benchmark.
+
+        Args:
+            repeat (int): Number of timings.
+            scale (float): Factor applied to the number of calls per timing.
+
+        Returns:
+            dict: Name, parameters and the timings in seconds per call.
+        """
+        random.seed(SEED)
+        prepared = self.setup()
+        cleanup: Optional[Callable[[], None]] = None
+        if isinstance(prepared, tuple):
+            prepared, cleanup = prepared
+        number = max(1, int(self.number * scale))
+        try:
+            timings = timeit.Timer(prepared).repeat(repeat, number)
+        finally:
+            if cleanup is not None:
+                cleanup()
+        per_call = [timing / number for timing in timings]
+        return {
+            "name": self.name,
+            "params": self.params,
+            "number": number,
+            "repeat": repeat,
+            "best_s": min(per_call),
+            "median_s": statistics.median(per_call),
+            "ops_per_s": 1 / min(per_call) if min(per_call) else None,
+        }
+
+
+def _in_temp_dir(
+    build: Callable[[], Callable[[], Any]]
+) -> tuple[Callable[[], Any], Callable[[], None]]:
+    """
+    Runs a benchmark inside a temporary working directory,
+        so log files are created there.
+
+    The previous working directory is restored by the cleanup function,
+        which Benchmark.run calls even if the timed call fails, or at once
+        if build fails.
+
+    Args:
+        build (Callable): Builds the callable to time.
+
+    Returns:
+        tuple: The callable to time and the cleanup function.
+    """
+    previous = os.getcwd()
+    directory = tempfile.mkdtemp()
+    os.chdir(directory)
+
+    def cleanup() -> None:
+        os.chdir(previous)
+        shutil.rmtree(directory, ignore_errors=True)
+
+    try:
+        return build(), cleanup
+    except BaseException:
+        cleanup()
+        raise
+
+
+def _history(size: int) -> list[dict]:
+    """
+    Builds synthetic roll log entries.
+
+    Args:
+        size (int): Number of entries.
+
+    Returns:
+        list[dict]: Entries shaped like the ones RollLogger writes.
+    """
+    return [
+        {
+            "hash": f"{index:032x}",
+            "time": "2023-01-01T00:00:00.000000",
+            "roll_data": {
+                "type": "normal",
+                "num_dice": 4,
+                "sides": 6,
+                "modifier": 0,
+                "threshold": None,
+                "results": [[1, 2, 3, 4], [10, 0]],
+            },
+        }
+        for index in range(size)
+    ]
+
+
+def _roller_benchmarks() -> list[Benchmark]:
+    """
+    Builds the Roller benchmarks: every roll type across pool sizes
+        and exploding chains.
+
+    Returns:
+        list[Benchmark]: The benchmarks.
+    """
+    benchmarks = []
+    for num_dice, sides in POOL_SIZES:
+        number = max(1, 20000 // num_dice)
+        for roll_type in ROLL_TYPES:
+            benchmarks.append(
+                Benchmark(
+                    f"roller.{roll_type}.{num_dice}d{sides}",
+                    lambda n=num_dice, m=sides, t=roll_type: getattr(
+                        Roller(n, m), t
+                    ),
+                    number,
+                    num_dice=num_dice,
+                    sides=sides,
+                    roll_type=roll_type,
+                )
+            )
+    for num_dice, sides, threshold in ((2, 6, None), (10, 2, None), (20, 6, 4)):
+        benchmarks.append(
+            Benchmark(
+                f"roller.exploding_roll.{num_dice}d{sides}e{threshold or ''}",
+                lambda n=num_dice, m=sides, t=threshold: (
+                    lambda roller=Roller(n, m): roller.exploding_roll(t)
+                ),
+                2000,
+                num_dice=num_dice,
+                sides=sides,
+                threshold=threshold,
+            )
+        )
+    return benchmarks
+
+
+def _log_benchmarks() -> list[Benchmark]:
+    """
+    Builds the roll log benchmarks for several history sizes.
+
+    Returns:
+        list[Benchmark]: The benchmarks.
+    """
+    roll_data = {"type": "normal", "num_dice": 1, "sides": 20, "results": []}
+    benchmarks = []
+    for size in HISTORY_SIZES:
+        for logger_class in (
+            RollLogger,
+            JsonlRollLogger,
+            BinaryRollLogger,
+            RingRollLogger,
+            SqliteRollLogger,
+        ):
+
+            def build_logger(cls=logger_class, history=size) -> RollLogger:
+                logger = cls(max_logs=history)
+                logger.logs = _history(history)
+                logger.save_logs()
+                return logger
+
+            name = logger_class.__name__
+            benchmarks.append(
+                Benchmark(
+                    f"log.{name}.log_roll.{size}",
+                    lambda build=build_logger: _in_temp_dir(
+                        lambda: lambda logger=build(): logger.log_roll(roll_data)
+                    ),
+                    20 if logger_class is RollLogger else 500,
+                    backend=name,
+                    history=size,
+                )
+            )
+            benchmarks.append(
+                Benchmark(
+                    f"log.{name}.get_roll_by_hash.{size}",
+                    lambda build=build_logger, history=size: _in_temp_dir(
+                        lambda: lambda logger=build(): logger.get_roll_by_hash(
+                            f"{history - 1:032x}"
+                        )
+                    ),
+                    200,
+                    backend=name,
+                    history=size,
+                )
+            )
+            benchmarks.append(
+                Benchmark(
+                    f"log.{name}.load_logs.{size}",
+                    lambda build=build_logger: _in_temp_dir(
+                        lambda: lambda logger=build(): logger.load_logs()
+                    ),
+                    20,
+                    backend=name,
+                    history=size,
+                )
+            )
+
+        def build_store(history=size) -> RollStore:
+            backend = JsonlRollLogger(max_logs=history)
+            backend.logs = _history(history)
+            return RollStore(backend, flush_threshold=history)
+
+        benchmarks.append(
+            Benchmark(
+                f"log.RollStore.log_roll.{size}",
+                lambda build=build_store: _in_temp_dir(
+                    lambda: lambda store=build(): store.log_roll(roll_data)
+                ),
+                2000,
+                backend="RollStore",
+                history=size,
+            )
+        )
+        benchmarks.append(
+            Benchmark(
+                f"log.RollStore.get_roll_by_hash.{size}",
+                lambda build=build_store, history=size: _in_temp_dir(
+                    lambda: lambda store=build(): store.get_roll_by_hash(
+                        f"{history - 1:032x}"
+                    )
+                ),
+                20000,
+                backend="RollStore",
+                history=size,
+            )
+        )
+    return benchmarks
+
+
+def _chatter(count: int) -> list[str]:
+    """
+    Builds a mix of room messages, mostly chatter with some commands.
+
+    Args:
+        count (int): Number of messages.
+
+    Returns:
+        list[str]: The messages.
+    """
+    rng = random.Random(SEED)
+    samples = (
+        ["I attack the goblin with my sword", "lol", "brb", "ok who's next?"]
+        * 10
+        + ["/roll 1d20+5", "/roll 4d6dl", "/roll 2d6e", "/stats 3d6"]
+        + ["/reroll 0123456789abcdef0123456789abcdef", "/ping"]
+    )
+    return [rng.choice(samples) for _ in range(count)]
+
+
+def _parser_benchmarks() -> list[Benchmark]:
+    """
+    Builds the command parsing benchmarks over mixed chatter.
+
+    Returns:
+        list[Benchmark]: The benchmarks.
+    """
+    messages = _chatter(1000)
+
+    def route_all() -> None:
+        for message in messages:
+            try:
+                CommandRouter.route(message)
+            except ValueError:
+                pass
+
+    return [
+        Benchmark(
+            "parser.CommandRouter.route.mixed1000",
+            lambda: route_all,
+            20,
+            messages=len(messages),
+        ),
+    ]
+
+
+def _expression_benchmarks() -> list[Benchmark]:
+    """
+    Builds the dice expression benchmarks: compiling without the cache,
+        compiling through the cache and rolling a compiled expression.
+
+    Returns:
+        list[Benchmark]: The benchmarks.
+    """
+    benchmarks = []
+    for expression in EXPRESSIONS:
+        benchmarks.append(
+            Benchmark(
+                f"expression.compile.{expression}",
+                lambda source=expression: lambda: _compile_normalized.__wrapped__(
+                    source
+                ),
+                2000,
+                expression=expression,
+            )
+        )
+        benchmarks.append(
+            Benchmark(
+                f"expression.compile_cached.{expression}",
+                lambda source=expression: lambda: compile_expression(source),
+                20000,
+                expression=expression,
+            )
+        )
+        benchmarks.append(
+            Benchmark(
+                f"expression.roll.{expression}",
+                lambda source=expression: compile_expression(source).roll,
+                5000,
+                expression=expression,
+            )
+        )
+    return benchmarks
+
+
+BENCHMARKS: list[Benchmark] = (
+    _roller_benchmarks()
+    + _log_benchmarks()
+    + _parser_benchmarks()
+    + _expression_benchmarks()
+)
+
+
+def run_benchmarks(
+    name_filter: str = "",
+    repeat: int = 5,
+    scale: float = 1.0,
+    progress: Optional[Callable[[str], None]] = None,
+) -> list[dict[str, Any]]:
+    """
+    Runs the registered benchmarks.
+
+    Args:
+        name_filter (str): Only benchmarks whose name contains this text run.
+        repeat (int): Number of timings per benchmark.
+        scale (float): Factor applied to the number of calls per timing.
+        progress (Callable, optional): Called with each benchmark's name
+            before it runs.
+
+    Returns:
+        list[dict]: The result of every benchmark that ran.
+    """
+    results = []
+    for benchmark in BENCHMARKS:
+        if name_filter not in benchmark.name:
+            continue
+        if progress is not None:
+            progress(benchmark.name)
+        results.append(benchmark.run(repeat, scale))
+    return results
@@ -13,12 +13,21 @@
 # You should have received a copy of the GNU General Public License
 # along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
 
+import argparse
 from datetime import datetime
-from typing import Union
+from typing import Iterable, Iterator, Optional, Union
 import asyncio
+import itertools
+import time
+from collections import deque
+
+# The local profiler; pylint orders it with the standard library, which
+# gained a module of the same name.
+from profiling import SamplingProfiler
 
 from nio import (
     LoginResponse,
+    SyncResponse,
     InviteEvent,
     RoomMessageText,
     AsyncClient,
@@ -28,8 +37,41 @@ from nio import (
 
 from connections import CredentialsManager, ClientFactory
 from dice_roller_app import DiceRollerApp
-from bot_reasoning import BotCommandParser
-from logger import BotLogger
+from bot_reasoning import (
+    AuditCommand,
+    Command,
+    CommandRouter,
+    CreditsCommand,
+    ExpressionCommand,
+    HistoryCommand,
+    MyRollsCommand,
+    PingCommand,
+    RerollCommand,
+    RollCommand,
+    RollManyCommand,
+    StatsCommand,
+)
+from dice_expression import BulkRollResult, ExpressionResult
+from logger import BotLogger, create_roll_logger
+from roll_store import RollStore
+from roller import split_selection
+from dispatcher import RoomDispatcher
+from outbox import RoomOutbox
+from rate_limit import RateLimiter, command_cost, roll_cost
+from persistence import BackgroundWriter
+from metrics import (
+    COMMANDS,
+    MESSAGES,
+    RATE_LIMITED,
+    REGISTRY,
+    ROLL_LOG_ENTRIES,
+    ROLL_LOG_PENDING,
+    ROLLS,
+    STAGE_SECONDS,
+    SYNC_LAG_SECONDS,
+    MetricsServer,
+)
+from sharding import ShardPool
 
 
 class MatrixRollBot:
@@ -41,21 +83,129 @@ class MatrixRollBot:
         client: The Matrix client instance used to interact with the platform.
         logger: An instance of the logging utility to track bot activities.
         credentials: The credentials used to authenticate the bot on the Matrix platform.
+        roll_store: The in-memory roll store shared by all commands, persisted
+            to the backend selected by the optional "roll_log" key of the
+            credentials file ("json" or "jsonl").
+        dice_app: The dice roller application working on the roll store.
+        shards: Worker processes the rooms are sharded across for computing rolls
+            and distributions, as many as set by the optional "shards" key of the
+            credentials file, or None to compute them in the bot's process.
+        writer: Performs the roll store, watermark and sync token file writes
+            off the event loop.
+        dispatcher: Queues messages per room, so rooms are handled concurrently
+            while messages of one room keep their order.
+        outbox: Coalesces the replies to a room sent within REPLY_WINDOW seconds,
+            or the optional "reply_window" key of the credentials file,
+            into one message.
+        rate_limiter: Token buckets limiting the commands of each user and room,
+            set by the optional "user_rate", "user_burst", "room_rate",
+            "room_burst" and "rate_notice_interval" keys of the credentials file.
+        replay_watermarks: The watermark of every room as it was when the room
+            was first seen by this run: older messages of the room were handled
+            by a previous run and are ignored when history is replayed.
+        sync_token: The next_batch token of the last sync whose messages were queued.
+        unhandled: Sequence number of every queued message not yet handled,
+            by event id.
+        sync_marks: The next_batch token of every sync not yet known to be
+            fully handled, with the sequence number its messages end before.
+        metrics_server: Serves the metrics over HTTP on the port set by the optional
+            "metrics_port" key of the credentials file, or None if it is not set.
+        metrics_file: File the metrics are written to with the other state, set by
+            the optional "metrics_file" key of the credentials file, or None.
+        PERSIST_INTERVAL: Seconds between writes of the roll store, the watermark
+            and the sync token.
+        MAX_MESSAGE_LENGTH: Length above which a reply is split into several messages,
+            and above which replies are not coalesced.
+        REPLY_WINDOW: Default seconds the replies to a busy room are held for.
+        MAX_HISTORY: Largest number of rolls listed by /history and /myrolls.
+        BULK_COMMANDS: Commands that may roll or replay rolls in bulk, answered
+            on a thread so they do not block the event loop.
+        REPLAY_COMMANDS: Commands replaying logged rolls, which also cost
+            as much as those rolls once they are looked up.
     """
 
-    def __init__(self, client: AsyncClient, logger: BotLogger):
+    PERSIST_INTERVAL: float = 5.0
+    MAX_MESSAGE_LENGTH: int = 4000
+    MAX_HISTORY: int = 50
+    REPLY_WINDOW: float = 0.25
+    BULK_COMMANDS: tuple[type, ...] = (
+        RollManyCommand,
+        RerollCommand,
+        AuditCommand,
+        HistoryCommand,
+        MyRollsCommand,
+    )
+    REPLAY_COMMANDS: tuple[type, ...] = (
+        RerollCommand,
+        AuditCommand,
+        HistoryCommand,
+        MyRollsCommand,
+    )
+
+    def __init__(
+        self,
+        client: AsyncClient,
+        logger: BotLogger,
+        writer: Optional[BackgroundWriter] = None,
+    ):
         """
         Initializes a new instance of the MatrixRollBot.
 
         Args:
             client: The Matrix client instance.
             logger: An instance of the logging utility.
+            writer: The background writer for file writes. Defaults to the
+                logger's writer, or a new one if the logger has none.
         """
         self.client: AsyncClient = client
         self.logger: BotLogger = logger
         self.credentials: dict = CredentialsManager.load_credentials(
             "credentials.txt"
         )
+        self.writer: BackgroundWriter = (
+            writer or logger.writer or BackgroundWriter()
+        )
+        self.roll_store: RollStore = RollStore(
+            create_roll_logger(self.credentials.get("roll_log") or "jsonl"),
+            writer=self.writer,
+        )
+        self.shards: Optional[ShardPool] = (
+            ShardPool(int(self.credentials["shards"]))
+            if self.credentials.get("shards")
+            else None
+        )
+        self.dice_app: DiceRollerApp = DiceRollerApp(
+            self.roll_store, shards=self.shards
+        )
+        self.dispatcher: RoomDispatcher = RoomDispatcher(self.handle_message)
+        self.outbox: RoomOutbox = RoomOutbox(
+            self.send_message,
+            window=float(self.credentials.get("reply_window") or self.REPLY_WINDOW),
+            max_length=self.MAX_MESSAGE_LENGTH,
+        )
+        limits = {
+            name: float(self.credentials[name])
+            for name in ("user_rate", "user_burst", "room_rate", "room_burst")
+            if self.credentials.get(name)
+        }
+        if self.credentials.get("rate_notice_interval"):
+            limits["notice_interval"] = float(self.credentials["rate_notice_interval"])
+        self.rate_limiter: RateLimiter = RateLimiter(**limits)
+        self.replay_watermarks: dict[str, datetime] = {}
+        self.sync_token: Optional[str] = None
+        self.unhandled: dict[str, int] = {}
+        self.sync_marks: deque[tuple[int, str]] = deque()
+        self._queued: int = 0
+        self.metrics_server: Optional[MetricsServer] = (
+            MetricsServer(REGISTRY, port=int(self.credentials["metrics_port"]))
+            if self.credentials.get("metrics_port")
+            else None
+        )
+        self.metrics_file: Optional[str] = (
+            self.credentials.get("metrics_file") or None
+        )
+        ROLL_LOG_ENTRIES.function = lambda: len(self.roll_store.entries)
+        ROLL_LOG_PENDING.function = lambda: len(self.roll_store.pending)
 
     async def invite_callback(self, room: MatrixRoom, event: InviteEvent):
         """
@@ -66,7 +216,7 @@ class MatrixRollBot:
             event: The event details.
         """
         if isinstance(event, InviteEvent):
-            self.logger.save_timestamp()
+            self.logger.save_timestamp(room_id=room.room_id)
             await self.client.join(room.room_id)
 
     async def message_callback(
@@ -74,55 +224,426 @@ class MatrixRollBot:
     ):
         """
         Asynchronous callback method triggered when a new message is detected in a room.
-        This method processes dice roll commands and responds accordingly.
+        The message is queued for its room and handled by handle_message,
+            unless it is a command over the rate limits.
+
+        Args:
+            room: The room in which the event occurred.
+            event: The event details, containing information about the message.
+
+        """
+        if self.rate_limiter.enabled and await self.over_limit(room, event):
+            return
+        self.replay_watermark(room.room_id)
+        self.unhandled[event.event_id] = self._queued
+        self._queued += 1
+        await self.dispatcher.dispatch(room, event)
+
+    def replay_watermark(self, room_id: str) -> datetime:
+        """
+        Returns the watermark a room had when this run first saw it.
+
+        Args:
+            room_id: The room.
+
+        Returns:
+            datetime: Messages of the room up to this time were handled
+                by a previous run.
+        """
+        watermark = self.replay_watermarks.get(room_id)
+        if watermark is None:
+            watermark = self.logger.track_room(room_id)
+            self.replay_watermarks[room_id] = watermark
+        return watermark
+
+    async def over_limit(
+        self, room: MatrixRoom, event: Union[RoomMessageText, Event]
+    ) -> bool:
+        """
+        Asynchronous method that takes the estimated cost of a new command
+            from the rate limits of its sender and room, before the command
+            is queued or rolled. A rejected command may be answered with
+            a notice listing the recently ignored commands of the room.
 
         Args:
             room: The room in which the event occurred.
             event: The event details, containing information about the message.
 
+        Returns:
+            bool: Whether the command is over a limit and must be ignored.
+        """
+        if not isinstance(event, RoomMessageText):
+            return False
+        watermark = self.replay_watermark(room.room_id)
+        if event.server_timestamp / 1000.0 <= watermark.timestamp():
+            return False
+        user_name = event.sender.split(":")[0][1:]
+        cost = command_cost(event.body)
+        if not cost:
+            return False
+        return await self.over_cost(room.room_id, event.sender, user_name, cost)
+
+    async def over_replay_limit(
+        self, room_id: str, sender: str, user_name: str, command: Command
+    ) -> bool:
         """
-        last_response_time: datetime = self.logger.get_last_timestamp()
-        response_message: str = ""
+        Asynchronous method that takes the cost of the logged rolls replayed
+            by one of the REPLAY_COMMANDS from the rate limits, before the
+            command is answered. The rolls are looked up on a thread, so the
+            roll log is never read on the event loop.
+
+        Args:
+            room_id: The room the command was sent to.
+            sender: The user id of the sender.
+            user_name: The local part of the sender's user id.
+            command: The command, as routed by CommandRouter.
+
+        Returns:
+            bool: Whether the command is over a limit and must be ignored.
+        """
+        if not self.rate_limiter.enabled or not isinstance(
+            command, self.REPLAY_COMMANDS
+        ):
+            return False
+        cost = await asyncio.to_thread(self.replay_cost, room_id, user_name, command)
+        if not cost:
+            return False
+        return await self.over_cost(room_id, sender, user_name, cost)
+
+    async def over_cost(
+        self, room_id: str, sender: str, user_name: str, cost: float
+    ) -> bool:
+        """
+        Asynchronous method that takes a cost from the rate limits of a user
+            and room, sending the room's notice if the cost is rejected.
+
+        Args:
+            room_id: The room the command was sent to.
+            sender: The user id of the sender.
+            user_name: The local part of the sender's user id.
+            cost: The cost in tokens.
+
+        Returns:
+            bool: Whether the cost is over a limit.
+        """
+        limit = self.rate_limiter.allow(room_id, sender, cost)
+        if limit is None:
+            return False
+        RATE_LIMITED.inc(limit)
+        notice = self.rate_limiter.reject(room_id, user_name)
+        if notice:
+            await self.outbox.put(room_id, notice)
+        return True
+
+    def replay_cost(self, room_id: str, user_name: str, command: Command) -> float:
+        """
+        Estimates the cost of the logged rolls a command replays: the roll
+            repeated by /reroll and /audit, or the rolls /history and
+            /myrolls replay to find their totals. Reads the roll log.
+
+        Args:
+            room_id (str): The room the command was sent to.
+            user_name (str): The local part of the sender's user id.
+            command (Command): The command, as routed by CommandRouter.
+
+        Returns:
+            float: The cost, or 0 if the command replays no rolls.
+        """
+        if isinstance(command, (RerollCommand, AuditCommand)):
+            roll_data = self.dice_app.roll_log.get_roll_by_hash(command.roll_hash)
+            return roll_cost(roll_data) if roll_data else 0.0
+        if isinstance(command, (HistoryCommand, MyRollsCommand)):
+            user = (
+                command.user if isinstance(command, HistoryCommand) else user_name
+            )
+            return sum(
+                roll_cost(entry["roll_data"])
+                for entry in self.dice_app.roll_log.history(
+                    room_id, user, min(command.limit, self.MAX_HISTORY)
+                )
+                if DiceRollerApp.replayed_by_history(entry["roll_data"])
+            )
+        return 0.0
+
+    async def handle_message(
+        self, room: MatrixRoom, event: Union[RoomMessageText, Event]
+    ):
+        """
+        Asynchronous method that processes dice roll commands
+            from a queued message and responds accordingly.
+        With shards, the reply is built on a thread waiting for the room's
+            worker process, so other rooms are handled in the meantime.
+            Without shards, BULK_COMMANDS are answered on a thread as well.
+
+        Args:
+            room: The room in which the event occurred.
+            event: The event details, containing information about the message.
+        """
+        response_message: Union[str, Iterable[str]] = ""
         message_time: datetime = datetime.fromtimestamp(
             event.server_timestamp / 1000.0
         )
 
-        if message_time > last_response_time:
+        if message_time > self.replay_watermark(room.room_id):
+            SYNC_LAG_SECONDS.set(time.time() - event.server_timestamp / 1000.0)
             user_name: str = event.sender.split(":")[0][1:]
 
             if isinstance(event, RoomMessageText):
-                if event.body == "/ping":
-                    response_message = f"pong! {user_name}"
-
-                elif BotCommandParser.ROLL_REGEX.match(event.body):
-                    parsed_data = BotCommandParser().parse_roll(event.body)
-                    dice_roll = DiceRollerApp().roll_dice(
-                        num_dice=int(parsed_data["dice"]),
-                        sides=int(parsed_data["sides"]),
-                        roll_type=str(parsed_data["roll_type"]),
-                        modifier=int(parsed_data["modifier"]),
-                    )
-                    response_message = f"{user_name} rolled: {dice_roll}"
+                try:
+                    with STAGE_SECONDS.time("parse"):
+                        command = CommandRouter.route(event.body)
+                    if await self.over_replay_limit(
+                        room.room_id, event.sender, user_name, command
+                    ):
+                        command = None
+                    if command is not None and (
+                        self.shards is not None
+                        or isinstance(command, self.BULK_COMMANDS)
+                    ):
+                        response_message = await asyncio.to_thread(
+                            self.respond, user_name, command, room.room_id
+                        )
+                    elif command is not None:
+                        response_message = self.respond(
+                            user_name, command, room.room_id
+                        )
+                except ValueError as error:
+                    response_message = f"{user_name}: {error}"
 
-                elif BotCommandParser.REROLL_REGEX.match(event.body):
-                    parsed_data = BotCommandParser().parse_reroll(event.body)
-                    dice_reroll = DiceRollerApp().reroll_dice(
-                        roll_hash=parsed_data["hash"]
-                    )
-                    response_message = f"{user_name} rerolled: {dice_reroll}"
+        self.logger.save_timestamp(message_time, room.room_id)
+        self.unhandled.pop(event.event_id, None)
 
-                elif event.body == "/credits":
-                    response_message = "pong!"
+        if isinstance(response_message, str):
+            response_message = [response_message] if response_message else []
+        for message in response_message:
+            MESSAGES.inc("reply")
+            await self.outbox.put(room.room_id, message)
 
-        self.logger.save_timestamp()
+    async def send_message(self, room_id: str, body: str):
+        """
+        Asynchronous method that sends a text message to a room.
 
-        if response_message:
+        Args:
+            room_id: The room to send the message to.
+            body: The text of the message.
+        """
+        MESSAGES.inc("sent")
+        with STAGE_SECONDS.time("send"):
             await self.client.room_send(
-                room_id=room.room_id,
+                room_id=room_id,
                 message_type="m.room.message",
-                content={"msgtype": "m.text", "body": response_message},
+                content={"msgtype": "m.text", "body": body},
             )
 
+    async def sync_callback(self, response: SyncResponse):
+        """
+        Asynchronous callback method triggered after the events of a sync
+            response have been queued; remembers its token, to be saved
+            once those events are handled.
+
+        Args:
+            response: The sync response.
+        """
+        self.sync_token = response.next_batch
+        self.sync_marks.append((self._queued, response.next_batch))
+
+    def respond(
+        self, user_name: str, command: Command, room_id: Optional[str] = None
+    ) -> Union[str, Iterator[str]]:
+        """
+        Builds the reply to a command.
+
+        Args:
+            user_name: The local part of the sender's user id.
+            command: The command, as routed by CommandRouter.
+            room_id: The room the message was sent to, whose random stream
+                the rolls are drawn from.
+
+        Returns:
+            Union[str, Iterator[str]]: The reply. Long replies are produced
+                as an iterator of messages of at most MAX_MESSAGE_LENGTH
+                characters.
+
+        Raises:
+            ValueError: If a command has invalid arguments.
+        """
+        COMMANDS.inc(type(command).__name__[: -len("Command")].lower())
+
+        if isinstance(command, PingCommand):
+            return f"pong! {user_name}"
+
+        if isinstance(command, RollCommand):
+            ROLLS.inc(split_selection(command.roll_type)[0])
+            with STAGE_SECONDS.time("roll"):
+                dice_roll = self.dice_app.roll_dice(
+                    num_dice=command.num_dice,
+                    sides=command.sides,
+                    roll_type=command.roll_type,
+                    modifier=command.modifier,
+                    threshold=command.threshold,
+                    room_id=room_id,
+                    user=user_name,
+                )
+            return f"{user_name} rolled: {self.describe_results(*dice_roll)}"
+
+        if isinstance(command, ExpressionCommand):
+            ROLLS.inc("expr")
+            with STAGE_SECONDS.time("roll"):
+                dice_roll = self.dice_app.roll_expression(
+                    command.expression, room_id, user_name
+                )
+            return f"{user_name} rolled: {self.describe_results(*dice_roll)}"
+
+        if isinstance(command, RollManyCommand):
+            ROLLS.inc("rollmany")
+            with STAGE_SECONDS.time("roll"):
+                results, roll_hash = self.dice_app.roll_many(
+                    command.count, command.expression, room_id, user_name
+                )
+            return self.chunk_lines(
+                itertools.chain(
+                    [f"{user_name} rolled {command.expression} x{command.count}"
+                     f" ('{roll_hash}'):"],
+                    results.lines(),
+                )
+            )
+
+        if isinstance(command, RerollCommand):
+            with STAGE_SECONDS.time("roll"):
+                dice_reroll = self.dice_app.reroll_dice(
+                    roll_hash=command.roll_hash, room_id=room_id, user=user_name
+                )
+            results, roll_hash = dice_reroll
+            if isinstance(results, BulkRollResult):
+                return self.chunk_lines(
+                    itertools.chain(
+                        [f"{user_name} rerolled ('{roll_hash}'):"], results.lines()
+                    )
+                )
+            return f"{user_name} rerolled: {self.describe_results(*dice_reroll)}"
+
+        if isinstance(command, AuditCommand):
+            results = self.dice_app.replay_roll(command.roll_hash)
+            if isinstance(results, BulkRollResult):
+                return self.chunk_lines(
+                    itertools.chain(
+                        [f"{user_name} audited '{command.roll_hash}':"],
+                        results.lines(),
+                    )
+                )
+            return (
+                f"{user_name} audited '{command.roll_hash}':"
+                f" {self.describe_results(results)}"
+            )
+
+        if isinstance(command, (HistoryCommand, MyRollsCommand)):
+            user = (
+                command.user if isinstance(command, HistoryCommand) else user_name
+            )
+            rolls = self.dice_app.history(
+                room_id, user, min(command.limit, self.MAX_HISTORY)
+            )
+            if not rolls:
+                return f"{user_name}: no rolls found"
+            return self.chunk_lines(
+                itertools.chain(
+                    [f"{user_name}: last {len(rolls)} rolls"
+                     f"{f' of {user}' if user else ''}:"],
+                    (self.describe_roll(entry, total) for entry, total in rolls),
+                )
+            )
+
+        if isinstance(command, StatsCommand):
+            distribution = self.dice_app.distribution(
+                num_dice=command.num_dice,
+                sides=command.sides,
+                roll_type=command.roll_type,
+                modifier=command.modifier,
+                threshold=command.threshold,
+                room_id=room_id,
+            )
+            return f"{user_name} stats: {distribution.summary()}"
+
+        if isinstance(command, CreditsCommand):
+            return "pong!"
+        return ""
+
+    @staticmethod
+    def describe_results(
+        results: Union[tuple, ExpressionResult], roll_hash: Optional[str] = None
+    ) -> str:
+        """
+        Formats the results of a roll for a reply: the dice, then the totals,
+            and for an expression with a target the number of successes.
+
+        Args:
+            results: The results of a roll or of a dice expression.
+            roll_hash: The hash of the logged roll, shown after the results.
+
+        Returns:
+            str: The results, with the hash if given.
+        """
+        if isinstance(results, ExpressionResult):
+            rolls = results.rolls[0] if len(results.rolls) == 1 else results.rolls
+            text = f"({rolls}, {results.totals}"
+            if results.successes is not None:
+                text += f", {results.successes}/{len(results.totals)} successes"
+            text += ")"
+        else:
+            text = str(results)
+        return text if roll_hash is None else f"({text}, '{roll_hash}')"
+
+    @staticmethod
+    def describe_roll(entry: dict, total: str) -> str:
+        """
+        Formats a logged roll as a single history line.
+
+        Args:
+            entry: The log entry of the roll.
+            total: The totals of the roll, as listed by DiceRollerApp.history.
+
+        Returns:
+            str: The time, user, roll and total of the roll.
+        """
+        roll_data = entry["roll_data"]
+        roll_type = roll_data["type"]
+        if roll_type == "expr":
+            roll = roll_data["expression"]
+        elif roll_type == "rollmany":
+            roll = f"{roll_data['count']}x {roll_data['expression']}"
+        else:
+            modifier = roll_data["modifier"]
+            roll = (
+                f"{roll_data['num_dice']}d{roll_data['sides']}"
+                f"{f'{int(modifier):+d}' if modifier else ''}"
+                f"{'' if roll_type == 'normal' else roll_type}"
+            )
+        rolled_at = entry["time"][:16].replace("T", " ")
+        user = roll_data.get("user") or "?"
+        return f"{rolled_at} {user}: {roll} = {total} ('{entry['hash']}')"
+
+    def chunk_lines(self, lines: Iterable[str]) -> Iterator[str]:
+        """
+        Joins lines into messages of at most MAX_MESSAGE_LENGTH characters,
+            producing each message as soon as it is full.
+
+        Args:
+            lines: The lines of the reply.
+
+        Yields:
+            str: The next message.
+        """
+        chunk: list[str] = []
+        length = 0
+        for line in lines:
+            if chunk and length + len(line) + 1 > self.MAX_MESSAGE_LENGTH:
+                yield "\n".join(chunk)
+                chunk, length = [], 0
+            chunk.append(line[: self.MAX_MESSAGE_LENGTH])
+            length += len(line) + 1
+        if chunk:
+            yield "\n".join(chunk)
+
     async def run(self):
         """
         Asynchronous method that initializes event callbacks
@@ -131,6 +652,8 @@ class MatrixRollBot:
         """
         self.client.add_event_callback(self.message_callback, RoomMessageText)
         self.client.add_event_callback(self.invite_callback, InviteEvent)
+        self.client.add_response_callback(self.sync_callback, SyncResponse)
+        self.client.next_batch = self.logger.load_sync_token()
 
         response = await self.client.login(self.credentials["password"])
         if not isinstance(response, LoginResponse):
@@ -138,18 +661,100 @@ class MatrixRollBot:
         if "password" not in self.credentials:
             return "Password is missing from the credentials file."
 
-        await self.client.sync_forever(timeout=30000)
+        if self.metrics_server is not None:
+            await self.metrics_server.start()
+        persist_task = asyncio.create_task(self.persist_periodically())
+        try:
+            await self.client.sync_forever(timeout=30000)
+        finally:
+            persist_task.cancel()
+            await self.dispatcher.join()
+            await self.outbox.close()
+            if self.shards is not None:
+                await asyncio.to_thread(self.shards.shutdown)
+            self.persist()
+            await asyncio.to_thread(self.writer.close)
+            if self.metrics_server is not None:
+                await self.metrics_server.close()
+
+    def persist(self):
+        """
+        Schedules writes of pending rolls, the watermarks, the metrics file and
+            the token of the latest sync whose messages have all been handled.
+        """
+        self.roll_store.flush()
+        oldest = next(iter(self.unhandled.values()), self._queued)
+        while self.sync_marks and self.sync_marks[0][0] <= oldest:
+            self.logger.save_sync_token(self.sync_marks.popleft()[1])
+        self.logger.persist()
+        if self.metrics_file:
+            self.writer.submit(self.metrics_file, self.write_metrics)
+
+    def write_metrics(self):
+        """
+        Writes the metrics in the Prometheus text format to the metrics file.
+        """
+        with open(self.metrics_file, "w", encoding='utf-8') as file:
+            file.write(REGISTRY.render())
+
+    async def persist_periodically(self):
+        """
+        Asynchronous method that persists the bot state
+            every PERSIST_INTERVAL seconds.
+        """
+        while True:
+            await asyncio.sleep(self.PERSIST_INTERVAL)
+            self.persist()
 
 
-async def main():
+async def main(profiler: Optional[SamplingProfiler] = None):
     """
     Asynchronous main function to initialize and run the MatrixRollBot.
+
+    Args:
+        profiler: Samples the bot's stacks while it runs, if given.
     """
     client = ClientFactory.create_client()
-    logger = BotLogger()
-    bot = MatrixRollBot(client, logger)
-    await bot.run()
+    writer = BackgroundWriter()
+    logger = BotLogger(writer=writer)
+    bot = MatrixRollBot(client, logger, writer)
+    if profiler is not None:
+        profiler.start()
+    try:
+        await bot.run()
+    finally:
+        if profiler is not None:
+            profiler.stop()
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    """
+    Parses the command line of the bot.
+
+    Args:
+        argv: The arguments, defaulting to sys.argv.
+
+    Returns:
+        argparse.Namespace: The parsed arguments.
+    """
+    parser = argparse.ArgumentParser(description="Elemental Dice Bot for Matrix.")
+    parser.add_argument(
+        "--profile",
+        type=float,
+        nargs="?",
+        const=0.0,
+        metavar="SECONDS",
+        help="sample the bot's stacks and write collapsed stacks for flamegraphs "
+        "to profiles/ every minute; stop sampling after SECONDS if given. "
+        f"Also enabled by the {SamplingProfiler.ENV_VARIABLE} environment variable.",
+    )
+    return parser.parse_args(argv)
 
 
 if __name__ == "__main__":
-    asyncio.get_event_loop().run_until_complete(main())
+    arguments = parse_args()
+    if arguments.profile is not None:
+        bot_profiler = SamplingProfiler(duration=arguments.profile or None)
+    else:
+        bot_profiler = SamplingProfiler.from_environment()
+    asyncio.get_event_loop().run_until_complete(main(bot_profiler))
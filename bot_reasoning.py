@@ -13,73 +13,281 @@
 # along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
 
 import re
+from typing import NamedTuple, Optional, Union
 
+DICE_EXPRESSION = (
+    r"(?P<dice>\d{1,3})d(?P<sides>\d{1,4})(?P<modifier>[\+\-]\d{1,3})?"
+    r"\s*(?P<roll_type>(?:dh|dl|kh|kl)\d{0,3}|e|i)?"
+    r"(?:(?P<comparison>[<>]=?)(?P<threshold>\d{1,4}))?"
+)
 
-class BotCommandParser:
+
+class PingCommand(NamedTuple):
+    """The '/ping' command."""
+
+
+class CreditsCommand(NamedTuple):
+    """The '/credits' command."""
+
+
+class RollCommand(NamedTuple):
     """
-    A class to parse bot commands related to dice rolls.
+    The '/roll NdM+B roll_type' command.
 
     Attributes:
-        dice_roll_pattern (re.Pattern): A compiled regex pattern to match
-            dice roll commands.
-        dice_reroll_pattern (re.Pattern): A compiled regex pattern to match
-            dice reroll commands.
-        ROLL_REGEX (re.Pattern): A compiled regex pattern to match
-            '/roll' command.
-        REROLL_REGEX (re.Pattern): A compiled regex pattern to match
-            '/reroll' command with hexadecimal value.
+        num_dice (int): Number of dice to be rolled.
+        sides (int): Number of sides on each dice.
+        modifier (int): Modifier to be added to the sum of the dice rolls.
+        roll_type (str): Type of the roll, as accepted by DiceRollerApp.roll_dice.
+        threshold (int, optional): Lowest exploding or highest imploding value.
     """
 
-    ROLL_REGEX = re.compile(r"/roll")
-    REROLL_REGEX = re.compile(r"/reroll ([a-fA-F0-9]+)")
+    num_dice: int
+    sides: int
+    modifier: int = 0
+    roll_type: str = "normal"
+    threshold: Optional[int] = None
 
-    def __init__(self):
-        """
-        Initializes the BotCommandParser with a compiled regex pattern to
-            match dice roll commands.
-        """
-        self.dice_roll_pattern = re.compile(
-            r"/roll\s+(\d{1,3})d(\d{1,3})([\+\-]\d{1,3})?(dh|dl|kh|kl|e|i)?",
-            re.IGNORECASE,
-        )
-        self.dice_reroll_pattern = re.compile(
-            r"^(/reroll)\s(\w+)$", re.IGNORECASE
-        )
 
-    def parse_roll(self, text: str) -> dict or None:
+class StatsCommand(NamedTuple):
+    """
+    The '/stats NdM+B roll_type' command; its fields match RollCommand.
+
+    Attributes:
+        num_dice (int): Number of dice to be rolled.
+        sides (int): Number of sides on each dice.
+        modifier (int): Modifier to be added to the sum of the dice rolls.
+        roll_type (str): Type of the roll, as accepted by DiceRollerApp.roll_dice.
+        threshold (int, optional): Lowest exploding or highest imploding value.
+    """
+
+    num_dice: int
+    sides: int
+    modifier: int = 0
+    roll_type: str = "normal"
+    threshold: Optional[int] = None
+
+
+class ExpressionCommand(NamedTuple):
+    """
+    The '/roll expression' command with a compound dice expression,
+        e.g. '/roll 2d6+1d4+3' or '/roll (4d6dl)x6'.
+
+    Attributes:
+        expression (str): The dice expression, as accepted by
+            dice_expression.compile_expression.
+    """
+
+    expression: str
+
+
+class RollManyCommand(NamedTuple):
+    """
+    The '/rollmany K expression' command, rolling a dice expression K times.
+
+    Attributes:
+        count (int): Number of times to roll the expression.
+        expression (str): The dice expression, as accepted by
+            dice_expression.compile_expression.
+    """
+
+    count: int
+    expression: str
+
+
+class RerollCommand(NamedTuple):
+    """
+    The '/reroll hash' command.
+
+    Attributes:
+        roll_hash (str): The hash of the roll to repeat.
+    """
+
+    roll_hash: str
+
+
+class AuditCommand(NamedTuple):
+    """
+    The '/audit hash' command, regenerating the results of a logged roll.
+
+    Attributes:
+        roll_hash (str): The hash of the roll to regenerate.
+    """
+
+    roll_hash: str
+
+
+class HistoryCommand(NamedTuple):
+    """
+    The '/history [user] [n]' command, listing the recent rolls of a room.
+
+    Attributes:
+        user (str, optional): Only rolls of this user, given by the local
+            part of the user id, or None for every user.
+        limit (int): Number of rolls to list.
+    """
+
+    user: Optional[str] = None
+    limit: int = 10
+
+
+class MyRollsCommand(NamedTuple):
+    """
+    The '/myrolls [n]' command, listing the sender's recent rolls in a room.
+
+    Attributes:
+        limit (int): Number of rolls to list.
+    """
+
+    limit: int = 10
+
+
+Command = Union[
+    PingCommand,
+    CreditsCommand,
+    RollCommand,
+    ExpressionCommand,
+    RollManyCommand,
+    StatsCommand,
+    RerollCommand,
+    AuditCommand,
+    HistoryCommand,
+    MyRollsCommand,
+]
+
+
+class CommandRouter:
+    """
+    Classifies a message and extracts its command in a single pass.
+
+    Every command grammar is part of one pattern compiled at import time.
+    Messages that do not start with "/" are rejected before any regex runs.
+    A '/roll' whose arguments are not a single NdM+B roll_type term is
+    routed as an ExpressionCommand and parsed by the expression engine.
+
+    Attributes:
+        COMMAND_PATTERN (re.Pattern): Pattern matching every supported command.
+        COMMAND_WORD (re.Pattern): Pattern matching the name of a command
+            that takes arguments, used to report malformed arguments.
+        USAGES (dict): Usage hint of every command that takes arguments.
+    """
+
+    COMMAND_PATTERN = re.compile(
+        r"/(?:"
+        r"(?P<ping>ping)$"
+        r"|(?P<credits>credits)$"
+        r"|(?P<reroll>reroll)\s+(?P<hash>\w+)$"
+        r"|(?P<audit>audit)\s+(?P<audit_hash>\w+)$"
+        r"|(?P<history>history)(?:\s+(?!\d+\s*$)@?(?P<history_user>[^\s:]+)\S*)?"
+        r"(?:\s+(?P<history_limit>\d{1,3}))?\s*$"
+        r"|(?P<myrolls>myrolls)(?:\s+(?P<myrolls_limit>\d{1,3}))?\s*$"
+        rf"|(?P<dice_command>roll|stats)\s+{DICE_EXPRESSION}\s*$"
+        r"|(?P<expression_command>roll)\s+(?P<expression>.+)$"
+        r"|(?P<roll_many>rollmany)\s+(?P<count>\d{1,5})\s+(?P<many_expression>.+)$"
+        r")",
+        re.IGNORECASE,
+    )
+    COMMAND_WORD = re.compile(
+        r"/(roll|rollmany|stats|reroll|audit|history|myrolls)\b", re.IGNORECASE
+    )
+    USAGES: dict[str, str] = {
+        "roll": "Usage: /roll NdM+B roll_type, e.g. /roll 6d10e>=8, or an"
+        " expression such as /roll 2d6+1d4+3, /roll (4d6dl)x6 or /roll 1d20+5 vs 15",
+        "rollmany": "Usage: /rollmany K expression, e.g. /rollmany 200 1d20+5 vs 15",
+        "stats": "Usage: /stats NdM+B roll_type",
+        "reroll": "Usage: /reroll hash",
+        "audit": "Usage: /audit hash",
+        "history": "Usage: /history [user] [n]",
+        "myrolls": "Usage: /myrolls [n]",
+    }
+
+    @staticmethod
+    def threshold(
+        roll_type: str, comparison: Optional[str], value: Optional[str]
+    ) -> Optional[int]:
         """
-        Parse the provided text to extract dice roll components.
+        Converts the comparison after an exploding or imploding roll type,
+            e.g. "e>=8" or "i<3", into its inclusive threshold.
 
         Args:
-            text (str): The text to parse.
+            roll_type (str): The roll type.
+            comparison (str, optional): ">=", ">", "<=" or "<", if given.
+            value (str, optional): The compared value, if given.
 
         Returns:
-            dict: A dictionary containing matched components or None if no match.
+            int: The lowest exploding or highest imploding value, or None
+                for the default threshold.
+
+        Raises:
+            ValueError: If the comparison does not fit the roll type.
         """
-        match = self.dice_roll_pattern.match(text)
-        if match:
-            groups = match.groups()
-        return {
-            "dice": groups[0] or 0,
-            "sides": groups[1] or 0,
-            "modifier": groups[2] or 0,
-            "roll_type": groups[3] or "normal",
-        }
-
-    def parse_reroll(self, text: str) -> str or None:
+        if comparison is None:
+            return None
+        if roll_type == "e" and comparison[0] == ">":
+            return int(value) + (comparison == ">")
+        if roll_type == "i" and comparison[0] == "<":
+            return int(value) - (comparison == "<")
+        raise ValueError(
+            "A threshold follows 'e' as e>=N or e>N, or 'i' as i<=N or i<N"
+        )
+
+    @classmethod
+    def route(cls, text: str) -> Optional[Command]:
         """
-        Parse the provided text to extract reroll hash.
+        Parses a message into a command.
 
         Args:
-            text(str): The text to parse.
+            text (str): The text of the message.
 
         Returns:
-            str: The extracted hash or None if no match.
+            Command: The typed command, or None if the text is not a command.
+
+        Raises:
+            ValueError: If the text names a command but its arguments are malformed.
         """
-        match = self.dice_reroll_pattern.match(text)
-        if match:
-            groups = match.groups()
-        return {
-            "command": groups[0] or 0,
-            "hash": groups[1] or 0,
-        }
+        # pylint: disable=too-many-return-statements
+        # One return per command keeps the routing flat.
+        if text[:1] != "/":
+            return None
+        match = cls.COMMAND_PATTERN.match(text)
+        if match is None:
+            word = cls.COMMAND_WORD.match(text)
+            if word:
+                raise ValueError(cls.USAGES[word.group(1).lower()])
+            return None
+        if match.group("dice_command"):
+            command_class = (
+                RollCommand
+                if match.group("dice_command").lower() == "roll"
+                else StatsCommand
+            )
+            roll_type = (match.group("roll_type") or "normal").lower()
+            return command_class(
+                num_dice=int(match.group("dice")),
+                sides=int(match.group("sides")),
+                modifier=int(match.group("modifier") or 0),
+                roll_type=roll_type,
+                threshold=cls.threshold(
+                    roll_type, match.group("comparison"), match.group("threshold")
+                ),
+            )
+        if match.group("expression_command"):
+            return ExpressionCommand(match.group("expression").strip())
+        if match.group("roll_many"):
+            return RollManyCommand(
+                int(match.group("count")), match.group("many_expression").strip()
+            )
+        if match.group("reroll"):
+            return RerollCommand(match.group("hash"))
+        if match.group("audit"):
+            return AuditCommand(match.group("audit_hash"))
+        if match.group("history"):
+            return HistoryCommand(
+                match.group("history_user"),
+                int(match.group("history_limit") or 10),
+            )
+        if match.group("myrolls"):
+            return MyRollsCommand(int(match.group("myrolls_limit") or 10))
+        if match.group("ping"):
+            return PingCommand()
+        return CreditsCommand()
@@ -13,6 +13,7 @@
 # along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
 
 import random
+from typing import Optional
 
 
 class Die:
@@ -21,6 +22,7 @@ class Die:
 
     Attributes:
         sides (int): Number of sides on the dice.
+        faces (range): All values the dice can show, from 1 to sides.
     """
 
     def __init__(self, sides: int):
@@ -35,6 +37,7 @@ class Die:
         """
         if 2 <= sides <= 1000:
             self.sides: int = sides
+            self.faces: range = range(1, sides + 1)
         else:
             raise ValueError("Number of sides should be between 2 and 1000")
 
@@ -46,3 +49,19 @@ class Die:
             int: A random number representing the result of the dice roll.
         """
         return random.randint(1, self.sides)
+
+    def roll_many(
+        self, count: int, rng: Optional[random.Random] = None
+    ) -> list[int]:
+        """
+        Rolls the dice several times in one batched draw.
+
+        Args:
+            count (int): Number of rolls to make.
+            rng (random.Random, optional): Random generator to draw from.
+                Defaults to the global generator of the random module.
+
+        Returns:
+            list[int]: The results of the individual rolls, in draw order.
+        """
+        return (rng or random).choices(self.faces, k=count)
@@ -0,0 +1,600 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compound dice expressions.
+
+Grammar, case-insensitive and ignoring whitespace:
+
+    expression := sum ["x" INT] ["vs" INT]
+    sum        := term (("+" | "-") term)*
+    term       := ["-"] (dice | INT | "(" sum ")")
+    dice       := [INT] "d" INT [suffix]
+    suffix     := ("kh" | "kl" | "dh" | "dl") [INT]
+                | "e" [(">=" | ">") INT]
+                | "i" [("<=" | "<") INT]
+
+For example "2d6+1d4+3", "(4d6dl)x6", "1d20+5 vs 15", "4d6kh3" or "6d10e>=8".
+"xN" evaluates the sum N times, "vs N" counts the totals of at least N.
+Terms of at least POOL_RATIO dice per side are rolled as a FacePool,
+which stands for their dice in the results.
+"""
+
+import random
+import re
+from collections import Counter
+from functools import lru_cache
+from typing import Callable, Iterator, NamedTuple, Optional
+
+from dice import Die
+from face_pool import POOL_RATIO, FacePool
+from roller import MAX_CHAIN_DEPTH, mark_selection, rerolled_faces, roll_chains
+
+MAX_DICE: int = 1000
+MAX_REPEAT: int = 100
+MAX_LENGTH: int = 200
+MAX_BULK_ROLLS: int = 10000
+MAX_BULK_DICE: int = 1000000
+HISTOGRAM_WIDTH: int = 20
+HISTOGRAM_BARS: int = 20
+
+TOKEN_PATTERN = re.compile(r"\s*(\d+|vs|kh|kl|dh|dl|>=|<=|[-+()dxei<>])")
+
+# A compiled piece of an expression: appends the dice it rolls to the
+# list it is given and returns its value. The dice are drawn from the
+# given generator, or from the random module if it is None.
+Evaluator = Callable[[list, Optional[random.Random]], int]
+
+
+class ExpressionResult(NamedTuple):
+    """
+    The outcome of evaluating a dice expression.
+
+    Attributes:
+        rolls (list): For every repetition, the results of every dice term,
+            with discarded dice replaced by the "KH", "KL", "DH" or "DL" marker,
+            or a FacePool for a term rolled as counts per face.
+        totals (list): The total of every repetition.
+        successes (int, optional): Number of totals reaching the target of
+            a "vs" expression, or None without a target.
+    """
+
+    rolls: list
+    totals: list
+    successes: Optional[int] = None
+
+
+class BulkRollResult(NamedTuple):
+    """
+    Aggregated outcome of rolling a dice expression many times.
+
+    Attributes:
+        count (int): Number of times the expression was rolled.
+        histogram (list): Pairs of a total and the number of times it came up,
+            ordered by total.
+        total (int): Sum of all totals.
+        successes (int, optional): Number of totals reaching the target of
+            a "vs" expression, or None without a target.
+    """
+
+    count: int
+    histogram: list
+    total: int
+    successes: Optional[int] = None
+
+    def lines(self) -> Iterator[str]:
+        """
+        Formats the result one line at a time: the total, the successes
+            and the bars of the histogram. Totals spanning more than
+            HISTOGRAM_BARS values are grouped into at most HISTOGRAM_BARS
+            ranges of equal width.
+
+        Yields:
+            str: The next line of the summary.
+        """
+        rolls = sum(times for _, times in self.histogram)
+        yield f"total {self.total}, mean {self.total / rolls:.2f} over {rolls} results"
+        if self.successes is not None:
+            yield f"successes: {self.successes}/{rolls}"
+        lowest, highest = self.histogram[0][0], self.histogram[-1][0]
+        step = -(-(highest - lowest + 1) // HISTOGRAM_BARS)
+        bins: Counter = Counter()
+        for value, times in self.histogram:
+            bins[lowest + (value - lowest) // step * step] += times
+        most = max(bins.values())
+        labels = {
+            start: str(start) if step == 1 else f"{start}-{start + step - 1}"
+            for start in bins
+        }
+        width = max(len(label) for label in labels.values())
+        for start, times in sorted(bins.items()):
+            bars = "#" * max(1, round(times * HISTOGRAM_WIDTH / most))
+            yield f"{labels[start]:>{width}}: {bars} {times}"
+
+
+class CompiledExpression:
+    """
+    A dice expression parsed once into a tree of closures.
+
+    Attributes:
+        source (str): The normalized text of the expression.
+        repeat (int): Number of times the sum is evaluated.
+        target (int, optional): Target number of a "vs" expression.
+        dice (int): Number of dice rolled per evaluation, before explosions.
+        draws (int): Most values drawn per evaluation: one per die, or one per
+            face for a term rolled as a FacePool, MAX_CHAIN_DEPTH + 1 times
+            for an exploding or imploding term.
+    """
+
+    def __init__(
+        self,
+        source: str,
+        evaluate: Evaluator,
+        repeat: int,
+        target: Optional[int],
+        dice: int,
+        draws: Optional[int] = None,
+    ) -> None:
+        """
+        Initializes the compiled expression.
+
+        Args:
+            source (str): The normalized text of the expression.
+            evaluate (Evaluator): Closure evaluating the sum once.
+            repeat (int): Number of times the sum is evaluated.
+            target (int, optional): Target number of a "vs" expression.
+            dice (int): Number of dice rolled per evaluation.
+            draws (int, optional): Number of values drawn per evaluation.
+                Defaults to the number of dice.
+        """
+        self.source: str = source
+        self.repeat: int = repeat
+        self.target: Optional[int] = target
+        self.dice: int = dice
+        self.draws: int = dice if draws is None else draws
+        self._evaluate: Evaluator = evaluate
+
+    def roll(self, rng: Optional[random.Random] = None) -> ExpressionResult:
+        """
+        Evaluates the expression.
+
+        Args:
+            rng (random.Random, optional): Random generator the dice are
+                drawn from. Defaults to the global generator.
+
+        Returns:
+            ExpressionResult: The dice, totals and successes of the roll.
+        """
+        rolls = []
+        totals = []
+        for _ in range(self.repeat):
+            repetition: list = []
+            totals.append(self._evaluate(repetition, rng))
+            rolls.append(repetition)
+        successes = (
+            None
+            if self.target is None
+            else sum(1 for total in totals if total >= self.target)
+        )
+        return ExpressionResult(rolls, totals, successes)
+
+    def roll_many(
+        self, count: int, rng: Optional[random.Random] = None
+    ) -> BulkRollResult:
+        """
+        Evaluates the expression count times, keeping only the histogram
+            of the totals instead of every die.
+
+        Args:
+            count (int): Number of times to roll the expression.
+            rng (random.Random, optional): Random generator the dice are
+                drawn from. Defaults to the global generator.
+
+        Returns:
+            BulkRollResult: The aggregated totals.
+
+        Raises:
+            ValueError: If count is out of range or the rolls would
+                need too many dice.
+        """
+        if not 1 <= count <= MAX_BULK_ROLLS:
+            raise ValueError(f"Roll count should be between 1 and {MAX_BULK_ROLLS}")
+        if count * self.repeat * self.draws > MAX_BULK_DICE:
+            raise ValueError(f"Bulk rolls may roll at most {MAX_BULK_DICE} dice")
+        histogram: Counter = Counter()
+        evaluate = self._evaluate
+        scratch: list = []
+        for _ in range(count * self.repeat):
+            histogram[evaluate(scratch, rng)] += 1
+            scratch.clear()
+        successes = (
+            None
+            if self.target is None
+            else sum(
+                times for value, times in histogram.items() if value >= self.target
+            )
+        )
+        return BulkRollResult(
+            count,
+            sorted(histogram.items()),
+            sum(value * times for value, times in histogram.items()),
+            successes,
+        )
+
+
+class _Parser:
+    """
+    Recursive descent parser turning a token list into closures.
+
+    Attributes:
+        tokens (list[str]): The tokens of the expression.
+        position (int): Index of the next token.
+        dice (int): Number of dice compiled so far.
+        draws (int): Most values drawn by the dice compiled so far.
+    """
+
+    def __init__(self, tokens: list[str]) -> None:
+        """
+        Initializes the parser.
+
+        Args:
+            tokens (list[str]): The tokens of the expression.
+        """
+        self.tokens: list[str] = tokens
+        self.position: int = 0
+        self.dice: int = 0
+        self.draws: int = 0
+
+    def peek(self) -> Optional[str]:
+        """
+        Returns the next token without consuming it.
+
+        Returns:
+            str: The next token, or None at the end of the expression.
+        """
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def take(self, *expected: str) -> Optional[str]:
+        """
+        Consumes the next token if it is one of the expected ones.
+
+        Args:
+            *expected (str): Accepted tokens.
+
+        Returns:
+            str: The consumed token, or None if the next token differs.
+        """
+        token = self.peek()
+        if token is not None and token in expected:
+            self.position += 1
+            return token
+        return None
+
+    def number(self, description: str) -> int:
+        """
+        Consumes an integer.
+
+        Args:
+            description (str): What the integer is, for the error message.
+
+        Returns:
+            int: The integer.
+
+        Raises:
+            ValueError: If the next token is not an integer.
+        """
+        token = self.peek()
+        if token is None or not token.isdigit():
+            raise ValueError(f"Expected {description} in dice expression")
+        self.position += 1
+        return int(token)
+
+    def parse_expression(self) -> tuple[Evaluator, int, Optional[int]]:
+        """
+        Parses a whole expression.
+
+        Returns:
+            tuple: The sum evaluator, the repetition count and the target.
+
+        Raises:
+            ValueError: If the expression is malformed.
+        """
+        evaluate = self.parse_sum()
+        repeat = 1
+        if self.take("x"):
+            repeat = self.number("a repetition count after 'x'")
+            if not 1 <= repeat <= MAX_REPEAT:
+                raise ValueError(f"Repetitions must be between 1 and {MAX_REPEAT}")
+        target = self.number("a target after 'vs'") if self.take("vs") else None
+        if self.peek() is not None:
+            raise ValueError(f"Unexpected '{self.peek()}' in dice expression")
+        if self.dice * repeat > MAX_DICE:
+            raise ValueError(f"Dice expressions may roll at most {MAX_DICE} dice")
+        return evaluate, repeat, target
+
+    def parse_sum(self) -> Evaluator:
+        """
+        Parses terms joined by "+" and "-".
+
+        Returns:
+            Evaluator: Closure adding up the terms.
+        """
+        terms = [self.parse_term()]
+        while True:
+            operator = self.take("+", "-")
+            if operator is None:
+                break
+            term = self.parse_term()
+            terms.append(term if operator == "+" else _negate(term))
+        if len(terms) == 1:
+            return terms[0]
+        return lambda rolls, rng: sum(term(rolls, rng) for term in terms)
+
+    def parse_term(self) -> Evaluator:
+        """
+        Parses a dice term, a constant or a parenthesized sum.
+
+        Returns:
+            Evaluator: Closure evaluating the term.
+
+        Raises:
+            ValueError: If no term starts at the current token.
+        """
+        if self.take("-"):
+            return _negate(self.parse_term())
+        if self.take("("):
+            inner = self.parse_sum()
+            if not self.take(")"):
+                raise ValueError("Missing ')' in dice expression")
+            return inner
+        token = self.peek()
+        if token == "d":
+            return self.parse_dice(1)
+        if token is not None and token.isdigit():
+            value = self.number("a number")
+            if self.peek() == "d":
+                return self.parse_dice(value)
+            return lambda rolls, rng: value
+        raise ValueError(
+            f"Unexpected '{token}' in dice expression"
+            if token is not None
+            else "Dice expression ends unexpectedly"
+        )
+
+    def parse_dice(self, count: int) -> Evaluator:
+        """
+        Parses "dM" and its optional suffix after the number of dice.
+
+        Args:
+            count (int): Number of dice.
+
+        Returns:
+            Evaluator: Closure rolling the dice.
+
+        Raises:
+            ValueError: If the dice or the suffix are invalid.
+        """
+        self.take("d")
+        die = Die(self.number("the number of sides after 'd'"))
+        if count < 1:
+            raise ValueError("Number of dice should be at least 1")
+        self.dice += count
+        pooled = count >= POOL_RATIO * die.sides
+        drawn = die.sides if pooled else count
+        self.draws += drawn
+
+        selection = self.take("kh", "kl", "dh", "dl")
+        if selection is not None:
+            selected = self.number("a count") if _is_number(self.peek()) else 1
+            if not 1 <= selected <= count:
+                raise ValueError(
+                    f"'{selection}' count should be between 1 and {count}"
+                )
+            return _selection(die, count, selection, selected)
+        if self.peek() in ("e", "i"):
+            self.draws += drawn * MAX_CHAIN_DEPTH
+        if self.take("e"):
+            threshold = None
+            if self.take(">="):
+                threshold = self.number("a threshold after 'e>='")
+            elif self.take(">"):
+                threshold = self.number("a threshold after 'e>'") + 1
+            return _chain(die, count, rerolled_faces(die.sides, "e", threshold))
+        if self.take("i"):
+            threshold = None
+            if self.take("<="):
+                threshold = self.number("a threshold after 'i<='")
+            elif self.take("<"):
+                threshold = self.number("a threshold after 'i<'") - 1
+            return _chain(die, count, rerolled_faces(die.sides, "i", threshold))
+
+        if pooled:
+
+            def roll_pool(rolls: list, rng: Optional[random.Random]) -> int:
+                pool = FacePool.roll(count, die.sides, rng)
+                rolls.append(pool)
+                return pool.total()
+
+            return roll_pool
+
+        def roll_dice(rolls: list, rng: Optional[random.Random]) -> int:
+            results = die.roll_many(count, rng)
+            rolls.append(results)
+            return sum(results)
+
+        return roll_dice
+
+
+def _is_number(token: Optional[str]) -> bool:
+    """
+    Checks whether a token is an integer.
+
+    Args:
+        token (str, optional): The token.
+
+    Returns:
+        bool: True if the token is an integer.
+    """
+    return token is not None and token.isdigit()
+
+
+def _negate(evaluate: Evaluator) -> Evaluator:
+    """
+    Wraps an evaluator to subtract its value instead of adding it.
+
+    Args:
+        evaluate (Evaluator): The evaluator to negate.
+
+    Returns:
+        Evaluator: The negated evaluator.
+    """
+    return lambda rolls, rng: -evaluate(rolls, rng)
+
+
+def _selection(die: Die, count: int, selection: str, selected: int) -> Evaluator:
+    """
+    Builds the evaluator of a keep or drop term.
+
+    Args:
+        die (Die): The die rolled.
+        count (int): Number of dice.
+        selection (str): "kh", "kl", "dh" or "dl".
+        selected (int): Number of dice kept or dropped.
+
+    Returns:
+        Evaluator: Closure rolling the dice and discarding the unselected ones.
+    """
+    if count >= POOL_RATIO * die.sides:
+
+        def roll_pool(rolls: list, rng: Optional[random.Random]) -> int:
+            pool = FacePool.roll(count, die.sides, rng).select(selection, selected)
+            rolls.append(pool)
+            return pool.total()
+
+        return roll_pool
+
+    marker = selection.upper()
+
+    def roll_selection(rolls: list, rng: Optional[random.Random]) -> int:
+        marked = mark_selection(die.roll_many(count, rng), selection, selected)
+        rolls.append(marked)
+        return sum(roll for roll in marked if roll != marker)
+
+    return roll_selection
+
+
+def _chain(die: Die, count: int, rerolled: range) -> Evaluator:
+    """
+    Builds the evaluator of an exploding or imploding term, adding
+        a die for every die showing a rerolled face, for at most
+        MAX_CHAIN_DEPTH added dice per die.
+
+    Args:
+        die (Die): The die rolled.
+        count (int): Number of dice.
+        rerolled (range): Faces that add another die.
+
+    Returns:
+        Evaluator: Closure rolling the dice and their chains.
+    """
+
+    if count >= POOL_RATIO * die.sides:
+
+        def roll_pool_chain(rolls: list, rng: Optional[random.Random]) -> int:
+            pool = FacePool.roll_chains(
+                count, die.sides, rerolled, MAX_CHAIN_DEPTH, rng
+            )
+            rolls.append(pool)
+            return pool.total()
+
+        return roll_pool_chain
+
+    def roll_chain(rolls: list, rng: Optional[random.Random]) -> int:
+        results = roll_chains(die, count, rerolled, rng)
+        rolls.append(results)
+        return sum(results)
+
+    return roll_chain
+
+
+def normalize(source: str) -> str:
+    """
+    Normalizes the text of an expression, so equivalent spellings
+        share a cache entry.
+
+    Args:
+        source (str): The expression as typed.
+
+    Returns:
+        str: The expression in lower case, with single spaces around "vs"
+            and no other whitespace.
+    """
+    compact = "".join(source.lower().split())
+    return compact.replace("vs", " vs ")
+
+
+@lru_cache(maxsize=512)
+def _compile_normalized(source: str) -> CompiledExpression:
+    """
+    Compiles a normalized expression.
+
+    Args:
+        source (str): The normalized expression.
+
+    Returns:
+        CompiledExpression: The compiled expression.
+
+    Raises:
+        ValueError: If the expression is malformed or too large.
+    """
+    tokens = []
+    position = 0
+    while position < len(source):
+        match = TOKEN_PATTERN.match(source, position)
+        if match is None:
+            if not source[position:].strip():
+                break
+            raise ValueError(
+                f"Unexpected '{source[position:].strip()[0]}' in dice expression"
+            )
+        tokens.append(match.group(1))
+        position = match.end()
+    if not tokens:
+        raise ValueError("Empty dice expression")
+    parser = _Parser(tokens)
+    evaluate, repeat, target = parser.parse_expression()
+    return CompiledExpression(
+        source, evaluate, repeat, target, parser.dice, parser.draws
+    )
+
+
+def compile_expression(source: str) -> CompiledExpression:
+    """
+    Compiles a dice expression, reusing the compiled form of
+        expressions seen before.
+
+    Args:
+        source (str): The expression, e.g. "2d6+1d4+3" or "(4d6dl)x6".
+
+    Returns:
+        CompiledExpression: The compiled expression.
+
+    Raises:
+        ValueError: If the expression is malformed or too large.
+    """
+    if len(source) > MAX_LENGTH:
+        raise ValueError(f"Dice expressions may be at most {MAX_LENGTH} characters")
+    return _compile_normalized(normalize(source))
@@ -12,10 +12,23 @@
 # You should have received a copy of the GNU General Public License
 # along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
 
-from typing import Optional
+import random
+from typing import Any, Callable, Optional, Union
 
+from dice_expression import BulkRollResult, ExpressionResult, compile_expression
+from distribution import (
+    ApproximateDistribution,
+    DistributionCache,
+    RollDistribution,
+)
 from logger import RollLogger
-from roller import Roller
+from roll_store import RollStore
+from roller import SELECTIONS, Roller, split_selection
+from roll_streams import RoomStreams, StreamPosition
+from sharding import ShardPool
+
+# Distributions computed by this process when it is a shard worker.
+WORKER_DISTRIBUTIONS: DistributionCache = DistributionCache()
 
 
 class DiceRollerApp:
@@ -23,10 +36,71 @@ class DiceRollerApp:
     A dice roller application that provides functionalities to roll
         dice with various options and reroll based on previous roll logs.
 
+    Every roll draws its dice from its own generator, addressed by the
+    room's stream seed and counter. The log records that position instead
+    of the dice, so a logged roll can be regenerated with replay_roll.
+
+    With shards, dice and distributions are computed in the worker process
+    of the room, while the streams and the roll log stay in this process.
+    Calls then block until the worker is done, so they are made from
+    threads rather than from the event loop.
+
     Attributes:
-        No public attributes.
+        roll_log (Union[RollStore, RollLogger]): Roll log used to log
+            rolls and look them up for rerolls.
+        distribution_cache (DistributionCache): Cache of computed
+            roll distributions.
+        streams (RoomStreams): Random streams of the rooms.
+        shards (ShardPool, optional): Worker processes computing the rolls
+            and distributions, or None to compute them in this process.
+        ROLL_RECORD_KEYS (frozenset): Keys of a log entry's roll data that record
+            how a roll was made rather than what was rolled.
+        SAMPLING_VERSION (int): Version of the way dice are drawn from a stream
+            position, logged with every roll. It must be increased whenever
+            the same position would give other dice, so rolls logged before
+            are refused by /audit instead of being replayed wrongly. Rolls
+            logged without a version count as version 1.
     """
 
+    ROLL_RECORD_KEYS: frozenset = frozenset(
+        ("room", "user", "seed", "counter", "results", "version", "summary")
+    )
+    SAMPLING_VERSION: int = 2
+
+    def __init__(
+        self,
+        roll_log: Optional[Union[RollStore, RollLogger]] = None,
+        distribution_cache: Optional[DistributionCache] = None,
+        streams: Optional[RoomStreams] = None,
+        shards: Optional[ShardPool] = None,
+    ) -> None:
+        """
+        Initializes the application with the given roll log.
+
+        Args:
+            roll_log (Union[RollStore, RollLogger], optional): Roll log
+                shared across commands, usually a RollStore owned by the bot.
+                Defaults to a write-through store over the JSON RollLogger.
+            distribution_cache (DistributionCache, optional): Cache of
+                computed roll distributions. Defaults to a new cache.
+            streams (RoomStreams, optional): Random streams of the rooms.
+                Defaults to new streams.
+            shards (ShardPool, optional): Worker processes computing the
+                rolls and distributions. Defaults to computing them here.
+        """
+        self.roll_log: Union[RollStore, RollLogger] = (
+            RollStore(RollLogger(), flush_threshold=1)
+            if roll_log is None
+            else roll_log
+        )
+        self.distribution_cache: DistributionCache = (
+            DistributionCache()
+            if distribution_cache is None
+            else distribution_cache
+        )
+        self.streams: RoomStreams = RoomStreams() if streams is None else streams
+        self.shards: Optional[ShardPool] = shards
+
     def roll_dice(
         self,
         num_dice: int,
@@ -34,6 +108,8 @@ class DiceRollerApp:
         roll_type: str = "normal",
         modifier: int = 0,
         threshold: Optional[int] = None,
+        room_id: Optional[str] = None,
+        user: Optional[str] = None,
     ) -> tuple[int, int]:
         """
         Rolls dice based on the given parameters and logs the result.
@@ -43,9 +119,12 @@ class DiceRollerApp:
             sides (int): Number of sides on each dice.
             roll_type (str): Type of the roll. Default is "normal". (
                 'normal' - default roll, 'e' - exploding, 'i' - imploding,
-                'dh' - drop_high, 'dl' - drop_low, 'kh' - keep_high, 'kl' - keep_low).
+                'dh' - drop_high, 'dl' - drop_low, 'kh' - keep_high, 'kl' - keep_low,
+                the last four optionally followed by the number of dice, e.g. 'kh3').
             modifier (int): Modifier to be added to the sum of the dice rolls. Default is 0.
             threshold (int, optional): Threshold value for exploding or imploding rolls.
+            room_id (str, optional): The room rolling, whose stream the dice come from.
+            user (str, optional): The user rolling.
 
         Returns:
             tuple: First element contains the results of the dice roll.
@@ -54,44 +133,175 @@ class DiceRollerApp:
         Raises:
             ValueError: If the provided roll type is invalid.
         """
-        roller = Roller(num_dice, sides)
-
-        if roll_type == "normal":
-            results = roller.normal_roll(modifier)
-        elif roll_type == "e":
-            results = roller.exploding_roll(modifier)
-        elif roll_type == "i":
-            results = roller.imploding_roll(modifier)
-        elif roll_type == "dh":
-            results = roller.drop_high(modifier)
-        elif roll_type == "dl":
-            results = roller.drop_low(modifier)
-        elif roll_type == "kh":
-            results = roller.keep_high(modifier)
-        elif roll_type == "kl":
-            results = roller.keep_low(modifier)
-        else:
-            raise ValueError("Invalid roll type")
-
-        roll_data = {
-            "type": roll_type,
-            "num_dice": num_dice,
-            "sides": sides,
-            "modifier": modifier,
-            "threshold": threshold,
-            "results": results,
-        }
-        logger_instance = RollLogger()
-        roll_hash = logger_instance.log_roll(roll_data=roll_data)
+        return self._roll(
+            {
+                "type": roll_type,
+                "num_dice": num_dice,
+                "sides": sides,
+                "modifier": modifier,
+                "threshold": threshold,
+            },
+            room_id,
+            user,
+        )
+
+    def roll_expression(
+        self,
+        expression: str,
+        room_id: Optional[str] = None,
+        user: Optional[str] = None,
+    ) -> tuple[ExpressionResult, str]:
+        """
+        Rolls a compound dice expression and logs the result.
+
+        Compiled expressions are cached by their text, so repeated
+        expressions are not parsed again.
+
+        Args:
+            expression (str): The dice expression, e.g. "2d6+1d4+3".
+            room_id (str, optional): The room rolling, whose stream the dice come from.
+            user (str, optional): The user rolling.
+
+        Returns:
+            tuple: First element contains the results of the expression.
+                   Second element is the hash of the logged roll.
+
+        Raises:
+            ValueError: If the expression is malformed or too large.
+        """
+        compiled = compile_expression(expression)
+        return self._roll(
+            {"type": "expr", "expression": compiled.source}, room_id, user
+        )
+
+    def roll_many(
+        self,
+        count: int,
+        expression: str,
+        room_id: Optional[str] = None,
+        user: Optional[str] = None,
+    ) -> tuple[BulkRollResult, str]:
+        """
+        Rolls a dice expression count times and logs the aggregated
+            result as a single roll.
+
+        Args:
+            count (int): Number of times to roll the expression.
+            expression (str): The dice expression, e.g. "1d20+5 vs 15".
+            room_id (str, optional): The room rolling, whose stream the dice come from.
+            user (str, optional): The user rolling.
+
+        Returns:
+            tuple: First element contains the aggregated results.
+                   Second element is the hash of the logged roll.
+
+        Raises:
+            ValueError: If the expression is malformed or the rolls too large.
+        """
+        compiled = compile_expression(expression)
+        return self._roll(
+            {"type": "rollmany", "expression": compiled.source, "count": count},
+            room_id,
+            user,
+        )
+
+    def _roll(
+        self, roll_data: dict, room_id: Optional[str], user: Optional[str]
+    ) -> tuple[Union[tuple, ExpressionResult, BulkRollResult], str]:
+        """
+        Rolls a roll at the next position of the room's stream and logs
+            its parameters, room, user, position and a summary of its totals.
+
+        Args:
+            roll_data (dict): The parameters of the roll.
+            room_id (str, optional): The room rolling.
+            user (str, optional): The user rolling.
+
+        Returns:
+            tuple: The results of the roll and the hash of the logged roll.
+        """
+        position = self.streams.advance(room_id)
+        results = self._compute(room_id, evaluate_at, roll_data, position)
+        roll_data.update(
+            room=room_id,
+            user=user,
+            seed=position.seed,
+            counter=position.counter,
+            version=self.SAMPLING_VERSION,
+            summary=summarize(roll_data["type"], results),
+        )
+        roll_hash = self.roll_log.log_roll(roll_data=roll_data)
 
         return results, roll_hash
 
-    def reroll_dice(self, roll_hash: str) -> tuple[int, int]:
+    def _compute(
+        self, room_id: Optional[str], function: Callable, *args: Any
+    ) -> Any:
+        """
+        Runs a computation in the worker process of the room,
+            or in this process if there are no shards.
+
+        Args:
+            room_id (str, optional): The room the computation is made for.
+            function (Callable): Module-level function to run.
+            *args: Picklable arguments of the function.
+
+        Returns:
+            Any: The result of the function.
+        """
+        if self.shards is None:
+            return function(*args)
+        return self.shards.submit(room_id, function, *args).result()
+
+    def distribution(
+        self,
+        num_dice: int,
+        sides: int,
+        roll_type: str = "normal",
+        modifier: int = 0,
+        threshold: Optional[int] = None,
+        room_id: Optional[str] = None,
+    ) -> Union[RollDistribution, ApproximateDistribution]:
+        """
+        Computes the outcome distribution of a roll without rolling it.
+
+        Distributions are served from distribution_cache when possible,
+        or from the cache of the room's worker process when sharded.
+
+        Args:
+            num_dice (int): Number of dice to be rolled.
+            sides (int): Number of sides on each dice.
+            roll_type (str): Type of the roll, as accepted by roll_dice.
+            modifier (int): Modifier to be added to the sum of the dice rolls.
+            threshold (int, optional): Threshold value for exploding or imploding rolls.
+            room_id (str, optional): The room asking, whose shard computes
+                the distribution.
+
+        Returns:
+            Union[RollDistribution, ApproximateDistribution]: The distribution,
+                with its mean, variance and percentiles.
+
+        Raises:
+            ValueError: If the roll is invalid or too large to compute.
+        """
+        parameters = (num_dice, sides, roll_type, modifier, threshold)
+        if self.shards is None:
+            return self.distribution_cache.get(*parameters)
+        return self._compute(room_id, distribution_in_worker, *parameters)
+
+    def reroll_dice(
+        self,
+        roll_hash: str,
+        room_id: Optional[str] = None,
+        user: Optional[str] = None,
+    ) -> tuple[int, int]:
         """
         Performs a reroll based on a previously logged roll using its hash.
 
         Args:
             roll_hash (str): The hash of the previously logged roll.
+            room_id (str, optional): The room rolling, whose stream the dice come from.
+            user (str, optional): The user rolling.
 
         Returns:
             tuple: Results of the reroll.
@@ -99,16 +309,209 @@ class DiceRollerApp:
         Raises:
             ValueError: If the roll associated with the provided hash is not found.
         """
-        logger_instance = RollLogger()
-        roll_data = logger_instance.get_roll_by_hash(roll_hash)
+        roll_data = self.roll_log.get_roll_by_hash(roll_hash)
+
+        if not roll_data:
+            raise ValueError("Roll not found")
+
+        parameters = {
+            key: value
+            for key, value in roll_data.items()
+            if key not in self.ROLL_RECORD_KEYS
+        }
+        return self._roll(parameters, room_id, user)
+
+    def replay_roll(
+        self, roll_hash: str
+    ) -> Union[tuple, ExpressionResult, BulkRollResult]:
+        """
+        Regenerates the results of a logged roll from its stream position,
+            so they can be checked without having been stored.
+
+        Args:
+            roll_hash (str): The hash of the logged roll.
+
+        Returns:
+            Union[tuple, ExpressionResult, BulkRollResult]: The results the
+                roll had, in the same form as when it was rolled.
+
+        Raises:
+            ValueError: If the roll is not found, or was made by another
+                version of the sampling algorithm.
+        """
+        roll_data = self.roll_log.get_roll_by_hash(roll_hash)
 
         if not roll_data:
             raise ValueError("Roll not found")
+        return self._replay(roll_data)
 
-        return self.roll_dice(
-            roll_data["num_dice"],
-            roll_data["sides"],
-            roll_data["type"],
-            roll_data["modifier"],
-            roll_data["threshold"],
+    def _replay(
+        self, roll_data: dict
+    ) -> Union[tuple, ExpressionResult, BulkRollResult]:
+        """
+        Regenerates the results of a roll from its logged data.
+
+        Args:
+            roll_data (dict): The logged roll data.
+
+        Returns:
+            Union[tuple, ExpressionResult, BulkRollResult]: The results.
+
+        Raises:
+            ValueError: If the roll was drawn by another version of the
+                sampling algorithm.
+        """
+        if "seed" not in roll_data:
+            return roll_data["results"]
+        if roll_data.get("version", 1) != self.SAMPLING_VERSION:
+            raise ValueError(
+                "This roll was made by another version of the dice roller"
+                " and cannot be replayed"
+            )
+
+        position = StreamPosition(roll_data["seed"], roll_data["counter"])
+        return self._compute(roll_data.get("room"), evaluate_at, roll_data, position)
+
+    def history(
+        self,
+        room_id: Optional[str] = None,
+        user: Optional[str] = None,
+        limit: int = 10,
+    ) -> list[tuple[dict, str]]:
+        """
+        Lists the most recent rolls with the totals they had.
+
+        The totals are read from the summary logged with each roll. Rolls
+            logged without one are replayed, except bulk rolls, whose replay
+            would take too long.
+
+        Args:
+            room_id (str, optional): Only rolls made in this room.
+            user (str, optional): Only rolls made by this user.
+            limit (int): Maximum number of rolls.
+
+        Returns:
+            list: Pairs of a log entry and the totals of its roll, or "?"
+                if they are unknown, newest first.
+        """
+        rolls = []
+        for entry in self.roll_log.history(room_id, user, limit):
+            roll_data = entry["roll_data"]
+            summary = roll_data.get("summary")
+            if self.replayed_by_history(roll_data):
+                try:
+                    summary = summarize(roll_data["type"], self._replay(roll_data))
+                except ValueError:
+                    pass
+            rolls.append((entry, summary or "?"))
+        return rolls
+
+    @staticmethod
+    def replayed_by_history(roll_data: dict) -> bool:
+        """
+        Tells whether history replays a roll to find its totals.
+
+        Args:
+            roll_data (dict): The logged roll data.
+
+        Returns:
+            bool: Whether the roll was logged without a summary and is
+                not a bulk roll.
+        """
+        return roll_data.get("summary") is None and roll_data["type"] != "rollmany"
+
+
+def summarize(
+    roll_type: str, results: Union[tuple, list, ExpressionResult, BulkRollResult]
+) -> str:
+    """
+    Formats the totals of a roll, as listed by /history.
+
+    Args:
+        roll_type (str): The type of the roll.
+        results: The results of the roll, or their JSON form from an old log.
+
+    Returns:
+        str: The total, or the totals of the repetitions of an expression.
+    """
+    if roll_type == "expr":
+        return ", ".join(str(total) for total in results[1])
+    if roll_type == "rollmany":
+        return str(results[2])
+    return str(results[1][0])
+
+
+def evaluate(
+    roll_data: dict, rng: random.Random
+) -> Union[tuple, ExpressionResult, BulkRollResult]:
+    """
+    Computes the results of a roll from its parameters.
+
+    Args:
+        roll_data (dict): The parameters of the roll.
+        rng (random.Random): Random generator the dice are drawn from.
+
+    Returns:
+        Union[tuple, ExpressionResult, BulkRollResult]: The results.
+
+    Raises:
+        ValueError: If the parameters describe an invalid roll.
+    """
+    roll_type = roll_data["type"]
+    if roll_type == "expr":
+        return compile_expression(roll_data["expression"]).roll(rng)
+    if roll_type == "rollmany":
+        return compile_expression(roll_data["expression"]).roll_many(
+            roll_data["count"], rng
         )
+
+    roller = Roller(roll_data["num_dice"], roll_data["sides"], rng)
+    modifier = roll_data["modifier"]
+    threshold = roll_data["threshold"]
+    if roll_type == "normal":
+        return roller.normal_roll(modifier)
+    if roll_type == "e":
+        return roller.exploding_roll(threshold, modifier)
+    if roll_type == "i":
+        return roller.imploding_roll(threshold, modifier)
+    selection, count = split_selection(roll_type)
+    if selection in SELECTIONS:
+        return roller.select(selection, count, modifier)
+    raise ValueError("Invalid roll type")
+
+
+def evaluate_at(
+    roll_data: dict, position: StreamPosition
+) -> Union[tuple, ExpressionResult, BulkRollResult]:
+    """
+    Computes the results of a roll at a position of its room's stream.
+
+    Args:
+        roll_data (dict): The parameters of the roll.
+        position (StreamPosition): The position the dice are drawn from.
+
+    Returns:
+        Union[tuple, ExpressionResult, BulkRollResult]: The results.
+
+    Raises:
+        ValueError: If the parameters describe an invalid roll.
+    """
+    return evaluate(roll_data, position.generator())
+
+
+def distribution_in_worker(
+    *parameters,
+) -> Union[RollDistribution, ApproximateDistribution]:
+    """
+    Computes a distribution through the cache of this worker process.
+
+    Args:
+        *parameters: The arguments of DistributionCache.get.
+
+    Returns:
+        Union[RollDistribution, ApproximateDistribution]: The distribution.
+
+    Raises:
+        ValueError: If the roll is invalid or too large to compute.
+    """
+    return WORKER_DISTRIBUTIONS.get(*parameters)
@@ -0,0 +1,118 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+from nio import MatrixRoom
+
+logger = logging.getLogger(__name__)
+
+
+class RoomDispatcher:
+    """
+    Dispatches room events to a handler through one queue per room.
+
+    Events of the same room are handled one at a time, in the order they
+    were dispatched, while different rooms are handled concurrently by at
+    most max_workers workers. A worker handles up to burst events before
+    giving its slot to the next waiting room, so one busy room cannot
+    starve the others. Once a room's queue is full, dispatch waits, which
+    slows down the sync loop instead of buffering without limit.
+
+    Attributes:
+        handler (Callable): Coroutine function called with the room and event.
+        queue_size (int): Maximum number of queued events per room.
+        burst (int): Number of events a worker handles per slot.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[MatrixRoom, Any], Awaitable[None]],
+        queue_size: int = 100,
+        max_workers: int = 32,
+        burst: int = 10,
+    ) -> None:
+        """
+        Initializes the dispatcher.
+
+        Args:
+            handler (Callable): Coroutine function called with the room
+                and event of every dispatched event.
+            queue_size (int): Maximum number of queued events per room.
+            max_workers (int): Maximum number of rooms handled concurrently.
+            burst (int): Number of events a worker handles per slot.
+        """
+        self.handler: Callable[[MatrixRoom, Any], Awaitable[None]] = handler
+        self.queue_size: int = queue_size
+        self.burst: int = burst
+        self._slots: asyncio.Semaphore = asyncio.Semaphore(max_workers)
+        self._queues: dict[str, asyncio.Queue] = {}
+        self._workers: dict[str, asyncio.Task] = {}
+
+    async def dispatch(self, room: MatrixRoom, event: Any) -> None:
+        """
+        Queues an event for its room, waiting while the room's queue is full.
+
+        Args:
+            room (MatrixRoom): The room in which the event occurred.
+            event: The event to handle.
+        """
+        queue = self._queues.get(room.room_id)
+        if queue is None:
+            queue = self._queues[room.room_id] = asyncio.Queue(self.queue_size)
+        await queue.put((room, event))
+        if room.room_id not in self._workers:
+            self._workers[room.room_id] = asyncio.create_task(
+                self._work(room.room_id, queue)
+            )
+
+    @property
+    def idle(self) -> bool:
+        """bool: Whether every dispatched event has been handled."""
+        return not self._workers
+
+    async def join(self) -> None:
+        """
+        Waits until every queued event has been handled.
+        """
+        while self._workers:
+            await asyncio.gather(*self._workers.values())
+
+    async def _work(self, room_id: str, queue: asyncio.Queue) -> None:
+        """
+        Handles the queued events of a room until its queue is empty.
+
+        Args:
+            room_id (str): Id of the room.
+            queue (asyncio.Queue): Queue of the room's events.
+        """
+        try:
+            while not queue.empty():
+                async with self._slots:
+                    for _ in range(self.burst):
+                        if queue.empty():
+                            break
+                        room, event = queue.get_nowait()
+                        try:
+                            await self.handler(room, event)
+                        except Exception:  # pylint: disable=broad-except
+                            logger.exception(
+                                "Failed to handle event in %s", room_id
+                            )
+                        finally:
+                            queue.task_done()
+        finally:
+            del self._workers[room_id]
@@ -0,0 +1,815 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import random
+import time
+from collections import OrderedDict
+from decimal import MAX_EMAX, MAX_PREC, MIN_EMIN, Context, Decimal
+from fractions import Fraction
+from math import comb, sqrt
+from statistics import NormalDist, fmean, pvariance
+from typing import Optional, Union
+
+from dice import Die
+from roller import MAX_CHAIN_DEPTH, SELECTIONS, rerolled_faces, split_selection
+
+# A polynomial over the outcomes of a roll: the lowest outcome and the
+# integer weight of every outcome from there on.
+Polynomial = tuple[int, list[int]]
+
+EXACT_BIT_BUDGET: int = 1 << 25
+
+# Dice drawn, and the smallest number of rolls taken, to approximate
+# a keep or drop roll too large for an exact distribution.
+SAMPLED_DICE: int = 1 << 18
+MIN_SAMPLES: int = 100
+SAMPLE_SEED: int = 0
+
+# Decimal context in which products of any size are exact.
+EXACT_CONTEXT: Context = Context(prec=MAX_PREC, Emax=MAX_EMAX, Emin=MIN_EMIN)
+
+
+class Distribution:
+    """
+    Base class for the outcome distribution of a roll expression.
+
+    Subclasses provide mean, variance, minimum, maximum, probability
+        and percentile; this class adds the derived values and the summary.
+
+    Attributes:
+        exact (bool): Whether the distribution is exact or approximated.
+        SUMMARY_PERCENTILES (tuple): Percentiles listed by summary.
+    """
+
+    exact: bool = True
+    SUMMARY_PERCENTILES: tuple[int, ...] = (5, 25, 50, 75, 95)
+
+    @property
+    def minimum(self) -> int:
+        """int: The lowest possible outcome."""
+        raise NotImplementedError
+
+    @property
+    def maximum(self) -> int:
+        """int: The highest possible outcome."""
+        raise NotImplementedError
+
+    @property
+    def mean(self) -> float:
+        """float: Expected value of the roll."""
+        raise NotImplementedError
+
+    @property
+    def variance(self) -> float:
+        """float: Variance of the roll."""
+        raise NotImplementedError
+
+    @property
+    def stddev(self) -> float:
+        """float: Standard deviation of the roll."""
+        return sqrt(self.variance)
+
+    def percentile(self, percent: float) -> int:
+        """
+        Returns the smallest outcome reached by at least the given share of rolls.
+
+        Args:
+            percent (float): Percentile between 0 and 100.
+
+        Returns:
+            int: The outcome at the given percentile.
+        """
+        raise NotImplementedError
+
+    def summary(self) -> str:
+        """
+        Builds a one-line, human-readable description of the distribution.
+
+        Returns:
+            str: Mean, standard deviation, range and percentiles.
+        """
+        percentiles = ", ".join(
+            f"p{percent} {self.percentile(percent)}"
+            for percent in self.SUMMARY_PERCENTILES
+        )
+        approximation = "" if self.exact else " (approximated)"
+        return (
+            f"mean {self.mean:.2f}, sd {self.stddev:.2f}, "
+            f"range {self.minimum}-{self.maximum}, {percentiles}"
+            f"{approximation}"
+        )
+
+
+class RollDistribution(Distribution):
+    """
+    Exact outcome distribution of a roll.
+
+    Attributes:
+        offset (int): The lowest possible outcome.
+        weights (list[int]): Number of equally likely ways to reach every
+            outcome from offset upwards.
+        total (int): Sum of all weights.
+    """
+
+    def __init__(self, offset: int, weights: list[int]) -> None:
+        """
+        Initializes the distribution from outcome weights.
+
+        Args:
+            offset (int): The lowest possible outcome.
+            weights (list[int]): Weight of every outcome from offset upwards.
+        """
+        first = next(i for i, weight in enumerate(weights) if weight)
+        last = len(weights) - next(
+            i for i, weight in enumerate(reversed(weights)) if weight
+        )
+        self.offset: int = offset + first
+        self.weights: list[int] = weights[first:last]
+        self.total: int = sum(self.weights)
+
+    @property
+    def minimum(self) -> int:
+        """int: The lowest possible outcome."""
+        return self.offset
+
+    @property
+    def maximum(self) -> int:
+        """int: The highest possible outcome."""
+        return self.offset + len(self.weights) - 1
+
+    @property
+    def mean(self) -> float:
+        """float: Expected value of the roll."""
+        moment = sum(i * weight for i, weight in enumerate(self.weights))
+        return self.offset + float(Fraction(moment, self.total))
+
+    @property
+    def variance(self) -> float:
+        """float: Variance of the roll."""
+        first = sum(i * weight for i, weight in enumerate(self.weights))
+        second = sum(i * i * weight for i, weight in enumerate(self.weights))
+        return float(
+            Fraction(second * self.total - first * first, self.total**2)
+        )
+
+    def probability(self, value: int) -> float:
+        """
+        Returns the probability of rolling exactly the given value.
+
+        Args:
+            value (int): The outcome to look up.
+
+        Returns:
+            float: Probability of the outcome.
+        """
+        index = value - self.offset
+        if 0 <= index < len(self.weights):
+            return float(Fraction(self.weights[index], self.total))
+        return 0.0
+
+    def percentile(self, percent: float) -> int:
+        """
+        Returns the smallest outcome reached by at least the given share of rolls.
+
+        Args:
+            percent (float): Percentile between 0 and 100.
+
+        Returns:
+            int: The outcome at the given percentile.
+        """
+        target = Fraction(percent) / 100 * self.total
+        cumulative = 0
+        for index, weight in enumerate(self.weights):
+            cumulative += weight
+            if cumulative >= target:
+                return self.offset + index
+        return self.maximum
+
+    def shifted(self, modifier: int) -> "RollDistribution":
+        """
+        Returns the distribution with a flat modifier added to every outcome.
+
+        Args:
+            modifier (int): Value added to every outcome.
+
+        Returns:
+            RollDistribution: The shifted distribution sharing the weights.
+        """
+        shifted = RollDistribution.__new__(RollDistribution)
+        shifted.offset = self.offset + modifier
+        shifted.weights = self.weights
+        shifted.total = self.total
+        return shifted
+
+
+class ApproximateDistribution(Distribution):
+    """
+    Normal approximation of the outcomes of a roll.
+
+    Used when the exact polynomial would be too large to compute quickly.
+        The mean and variance of a sum of dice are still exact; those of
+        a keep or drop roll are estimated from a sample of rolls. With no
+        variance, every roll is taken to give the rounded mean.
+    """
+
+    exact: bool = False
+
+    def __init__(
+        self, mean: float, variance: float, minimum: int, maximum: int
+    ) -> None:
+        """
+        Initializes the approximation.
+
+        Args:
+            mean (float): Exact expected value of the roll.
+            variance (float): Exact variance of the roll.
+            minimum (int): The lowest possible outcome.
+            maximum (int): The highest possible outcome.
+        """
+        self._normal: NormalDist = NormalDist(mean, sqrt(variance))
+        self._minimum: int = minimum
+        self._maximum: int = maximum
+
+    @property
+    def minimum(self) -> int:
+        """int: The lowest possible outcome."""
+        return self._minimum
+
+    @property
+    def maximum(self) -> int:
+        """int: The highest possible outcome."""
+        return self._maximum
+
+    @property
+    def mean(self) -> float:
+        """float: Expected value of the roll."""
+        return self._normal.mean
+
+    @property
+    def variance(self) -> float:
+        """float: Variance of the roll."""
+        return self._normal.variance
+
+    def probability(self, value: int) -> float:
+        """
+        Returns the approximate probability of rolling exactly the given value.
+
+        Args:
+            value (int): The outcome to look up.
+
+        Returns:
+            float: Probability of the outcome.
+        """
+        if not self.minimum <= value <= self.maximum:
+            return 0.0
+        if not self._normal.stdev:
+            return float(value == round(self.mean))
+        return self._normal.cdf(value + 0.5) - self._normal.cdf(value - 0.5)
+
+    def percentile(self, percent: float) -> int:
+        """
+        Returns the approximate outcome at the given percentile.
+
+        Args:
+            percent (float): Percentile between 0 and 100.
+
+        Returns:
+            int: The outcome at the given percentile.
+        """
+        if percent <= 0:
+            return self.minimum
+        if percent >= 100:
+            return self.maximum
+        if not self._normal.stdev:
+            return min(max(round(self.mean), self.minimum), self.maximum)
+        value = round(self._normal.inv_cdf(percent / 100))
+        return min(max(value, self.minimum), self.maximum)
+
+    def shifted(self, modifier: int) -> "ApproximateDistribution":
+        """
+        Returns the approximation with a flat modifier added to every outcome.
+
+        Args:
+            modifier (int): Value added to every outcome.
+
+        Returns:
+            ApproximateDistribution: The shifted approximation.
+        """
+        return ApproximateDistribution(
+            self.mean + modifier,
+            self.variance,
+            self.minimum + modifier,
+            self.maximum + modifier,
+        )
+
+
+def convolve(first: Polynomial, second: Polynomial) -> Polynomial:
+    """
+    Multiplies two outcome polynomials.
+
+    The weights are packed as decimal digits into two Decimals with enough
+        room per coefficient (Kronecker substitution), so the product is
+        computed by a single multiplication. Unlike int, whose Karatsuba
+        multiplication is slow on numbers this large, decimal multiplies
+        large operands with a number-theoretic transform.
+
+    Args:
+        first (Polynomial): The first polynomial.
+        second (Polynomial): The second polynomial.
+
+    Returns:
+        Polynomial: The product of both polynomials.
+    """
+    bound = max(first[1]) * sum(second[1])
+    width = len(str(bound))
+    product = EXACT_CONTEXT.multiply(
+        _pack(first[1], width), _pack(second[1], width)
+    )
+    size = len(first[1]) + len(second[1]) - 1
+    digits = format(product, "f").zfill(size * width)
+    return first[0] + second[0], [
+        int(digits[i - width:i]) for i in range(size * width, 0, -width)
+    ]
+
+
+def power(polynomial: Polynomial, exponent: int) -> Polynomial:
+    """
+    Raises an outcome polynomial to a power by repeated squaring.
+
+    Args:
+        polynomial (Polynomial): The polynomial, e.g. a single die.
+        exponent (int): The power, e.g. the number of dice. At least 1.
+
+    Returns:
+        Polynomial: The polynomial raised to the given power.
+    """
+    result: Optional[Polynomial] = None
+    while exponent:
+        if exponent & 1:
+            result = (
+                polynomial if result is None else convolve(result, polynomial)
+            )
+        exponent >>= 1
+        if exponent:
+            polynomial = convolve(polynomial, polynomial)
+    return result
+
+
+def _pack(weights: list[int], width: int) -> Decimal:
+    """
+    Packs weights into one Decimal, width digits per weight.
+
+    Args:
+        weights (list[int]): The weights to pack, lowest first.
+        width (int): Number of digits reserved per weight.
+
+    Returns:
+        Decimal: The packed weights.
+    """
+    return EXACT_CONTEXT.create_decimal(
+        "".join(str(weight).zfill(width) for weight in reversed(weights))
+    )
+
+
+def _add(
+    accumulator: list[int], polynomial: Polynomial, shift: int, sign: int = 1
+) -> None:
+    """
+    Adds a polynomial, shifted by the given amount, into an accumulator
+        whose index 0 stands for the outcome 0.
+
+    Args:
+        accumulator (list[int]): Weights of the outcomes 0 and upwards.
+        polynomial (Polynomial): The polynomial to add.
+        shift (int): Amount added to every outcome of the polynomial.
+        sign (int): 1 to add the polynomial, -1 to subtract it.
+    """
+    start = polynomial[0] + shift
+    for index, weight in enumerate(polynomial[1], start):
+        accumulator[index] += sign * weight
+
+
+def _cost(num_dice: int, die: Polynomial) -> int:
+    """
+    Estimates the size in bits of the polynomial of num_dice such dice.
+
+    Args:
+        num_dice (int): Number of dice.
+        die (Polynomial): Outcome polynomial of a single die.
+
+    Returns:
+        int: Number of outcomes times the bits needed per weight.
+    """
+    outcomes = num_dice * (len(die[1]) - 1) + 1
+    return outcomes * num_dice * sum(die[1]).bit_length()
+
+
+def _keep_cost(num_dice: int, sides: int, kept: int) -> int:
+    """
+    Estimates the work of _keep in the units of _cost.
+
+    Every face takes about num_dice^2 / 2 shifts and additions of integers
+        packing kept * sides + 1 weights. Those run some 250 times faster
+        per bit than the work of power and _drop_one, hence the division
+        by 256.
+
+    Args:
+        num_dice (int): Number of dice in the pool.
+        sides (int): Number of sides on each die.
+        kept (int): Number of dice kept.
+
+    Returns:
+        int: The estimated work.
+    """
+    width = num_dice * sides.bit_length()
+    steps = sides * (num_dice + 1) * (num_dice + 2) // 2
+    return steps * width * (kept * sides + 1) >> 8
+
+
+def single_die(
+    sides: int, roll_type: str = "normal", threshold: Optional[int] = None
+) -> Polynomial:
+    """
+    Builds the outcome polynomial of a single die of the given roll type.
+
+    Exploding and imploding chains are truncated after MAX_CHAIN_DEPTH
+        extra dice; the last die of a truncated chain is not rerolled.
+
+    Args:
+        sides (int): Number of sides on the die.
+        roll_type (str): "normal", "e" (exploding) or "i" (imploding).
+        threshold (int, optional): Threshold for exploding or imploding dice.
+
+    Returns:
+        Polynomial: The outcome polynomial of the die.
+
+    Raises:
+        ValueError: If the threshold is out of range.
+    """
+    faces = Die(sides).faces
+    plain: Polynomial = (1, [1] * sides)
+    if roll_type not in ("e", "i"):
+        return plain
+    rerolled = rerolled_faces(sides, roll_type, threshold)
+    kept: Polynomial = (1, [int(face not in rerolled) for face in faces])
+    chain: Polynomial = (rerolled[0], [1] * len(rerolled))
+
+    accumulator = [0] * (sides * (MAX_CHAIN_DEPTH + 1) + 1)
+    prefix: Polynomial = (0, [1])
+    for depth in range(MAX_CHAIN_DEPTH):
+        scale = sides ** (MAX_CHAIN_DEPTH - depth)
+        term = convolve(prefix, kept)
+        _add(accumulator, (term[0], [weight * scale for weight in term[1]]), 0)
+        prefix = convolve(prefix, chain)
+    _add(accumulator, convolve(prefix, plain), 0)
+    return 0, accumulator
+
+
+def _drop_one(num_dice: int, sides: int, highest: bool) -> Polynomial:
+    """
+    Builds the outcome polynomial of a pool with its highest
+        or lowest die dropped.
+
+    For every face v, the pools whose highest (lowest) die is exactly v
+        are all pools within 1..v (v..sides) minus those within 1..v-1
+        (v+1..sides); their sums are shifted down by the dropped v.
+
+    Args:
+        num_dice (int): Number of dice in the pool.
+        sides (int): Number of sides on each die.
+        highest (bool): True to drop the highest die, False for the lowest.
+
+    Returns:
+        Polynomial: The outcome polynomial of the remaining dice.
+    """
+    accumulator = [0] * (num_dice * sides + 1)
+    for value in Die(sides).faces:
+        if highest:
+            within, beyond = (1, [1] * value), (1, [1] * (value - 1))
+        else:
+            within = (value, [1] * (sides - value + 1))
+            beyond = (value + 1, [1] * (sides - value))
+        _add(accumulator, power(within, num_dice), -value)
+        if beyond[1]:
+            _add(accumulator, power(beyond, num_dice), -value, -1)
+    return 0, accumulator
+
+
+def _keep(num_dice: int, sides: int, kept: int, highest: bool) -> Polynomial:
+    """
+    Builds the outcome polynomial of the sum of the highest
+        or lowest kept dice of a pool, by dynamic programming
+        over the order statistics of the pool.
+
+    The faces are visited from the kept end of the die. For every number
+        of dice showing the faces visited so far, a polynomial packed into
+        one big integer counts the ways those dice can show them, by the
+        sum of the ones kept: the first kept dice visited. Giving the next
+        face to some of the remaining dice chooses them among those dice
+        and adds the face once for every one of them that is still kept.
+    This costs O(sides * num_dice^2) big-integer operations whatever the
+        number of kept dice.
+
+    Args:
+        num_dice (int): Number of dice in the pool.
+        sides (int): Number of sides on each die.
+        kept (int): Number of dice kept, from 1 to num_dice.
+        highest (bool): True to keep the highest dice, False for the lowest.
+
+    Returns:
+        Polynomial: The outcome polynomial of the kept dice.
+    """
+    width = (sides ** num_dice).bit_length()
+    states = [1] + [0] * num_dice
+    faces = range(sides, 0, -1) if highest else range(1, sides + 1)
+    for value in faces:
+        last = value == faces[-1]
+        visited = [0] * (num_dice + 1)
+        for assigned, packed in enumerate(states):
+            if not packed:
+                continue
+            remaining = num_dice - assigned
+            open_slots = max(kept - assigned, 0)
+            for count in range(remaining if last else 0, remaining + 1):
+                shift = width * value * min(count, open_slots)
+                visited[assigned + count] += (comb(remaining, count) * packed) << shift
+        states = visited
+    packed = states[num_dice]
+    mask = (1 << width) - 1
+    return 0, [
+        (packed >> (width * total)) & mask for total in range(kept * sides + 1)
+    ]
+
+
+def _sampled_selection(
+    num_dice: int, sides: int, kept: int, highest: bool
+) -> ApproximateDistribution:
+    """
+    Approximates the sum of the highest or lowest kept dice of a pool
+        from a sample of rolls, for pools too large for _keep.
+
+    About SAMPLED_DICE dice are drawn, from a fixed seed so that a roll
+        always gets the same approximation.
+
+    Args:
+        num_dice (int): Number of dice in the pool.
+        sides (int): Number of sides on each die.
+        kept (int): Number of dice kept, from 1 to num_dice.
+        highest (bool): True to keep the highest dice, False for the lowest.
+
+    Returns:
+        ApproximateDistribution: The approximation.
+    """
+    rng = random.Random(SAMPLE_SEED)
+    faces = range(1, sides + 1)
+    totals = []
+    for _ in range(max(SAMPLED_DICE // num_dice, MIN_SAMPLES)):
+        pool = sorted(rng.choices(faces, k=num_dice))
+        totals.append(sum(pool[-kept:] if highest else pool[:kept]))
+    return ApproximateDistribution(
+        fmean(totals), pvariance(totals), kept, kept * sides
+    )
+
+
+def compute_distribution(
+    num_dice: int,
+    sides: int,
+    roll_type: str = "normal",
+    modifier: int = 0,
+    threshold: Optional[int] = None,
+) -> Union[RollDistribution, ApproximateDistribution]:
+    """
+    Computes the outcome distribution of a roll without simulating it.
+
+    Sums of independent dice ("normal", "e", "i") are computed by raising
+        the polynomial of a single die to the number of dice. When the
+        polynomial of several dice would exceed EXACT_BIT_BUDGET, the exact
+        mean and variance are reported with a normal approximation of the
+        percentiles.
+    Keep and drop rolls are computed exactly over the order statistics
+        of the pool, by whichever of _keep and _drop_one is estimated
+        to be cheaper. When both would exceed EXACT_BIT_BUDGET, the mean
+        and variance are estimated from a sample of rolls instead.
+
+    Args:
+        num_dice (int): Number of dice to be rolled.
+        sides (int): Number of sides on each dice.
+        roll_type (str): Type of the roll, as accepted by DiceRollerApp.roll_dice.
+        modifier (int): Modifier to be added to the sum of the dice rolls.
+        threshold (int, optional): Threshold value for exploding or imploding rolls.
+
+    Returns:
+        Union[RollDistribution, ApproximateDistribution]: The distribution.
+
+    Raises:
+        ValueError: If the roll is invalid.
+    """
+    if num_dice < 1:
+        raise ValueError("Number of dice should be at least 1")
+    if roll_type in ("normal", "e", "i"):
+        die = single_die(sides, roll_type, threshold)
+        if num_dice > 1 and _cost(num_dice, die) > EXACT_BIT_BUDGET:
+            single = RollDistribution(*die)
+            return ApproximateDistribution(
+                num_dice * single.mean + modifier,
+                num_dice * single.variance,
+                num_dice * single.minimum + modifier,
+                num_dice * single.maximum + modifier,
+            )
+        offset, weights = power(die, num_dice)
+        return RollDistribution(offset + modifier, weights)
+
+    selection, count = split_selection(roll_type)
+    if selection not in SELECTIONS:
+        raise ValueError("Invalid roll type")
+    if not 1 <= count <= num_dice:
+        raise ValueError(f"'{selection}' count should be between 1 and {num_dice}")
+    if count == num_dice and selection[0] == "d":
+        return RollDistribution(modifier, [sides ** num_dice])
+    kept = count if selection[0] == "k" else num_dice - count
+    cost = _keep_cost(num_dice, sides, kept)
+    highest = selection in ("kh", "dl")
+    if selection in ("dh", "dl") and count == 1:
+        drop_cost = sides * _cost(num_dice, single_die(sides))
+        if drop_cost < cost and drop_cost <= EXACT_BIT_BUDGET:
+            offset, weights = _drop_one(num_dice, sides, selection == "dh")
+            return RollDistribution(offset + modifier, weights)
+    if cost > EXACT_BIT_BUDGET:
+        return _sampled_selection(num_dice, sides, kept, highest).shifted(modifier)
+    offset, weights = _keep(num_dice, sides, kept, highest)
+    return RollDistribution(offset + modifier, weights)
+
+
+class DistributionCache:
+    """
+    Least recently used cache of roll distributions.
+
+    Entries are keyed by the normalized roll (number of dice, sides,
+    roll type and effective threshold). The modifier only shifts the
+    outcomes, so it is left out of the key and applied on the way out:
+    "1d20+5" and "1d20-1" share one entry.
+
+    Attributes:
+        max_entries (int): Maximum number of cached distributions.
+        max_bytes (int): Approximate memory bound for all cached weights.
+        ttl (float, optional): Seconds an entry stays valid, None for no expiry.
+        hits (int): Number of lookups served from the cache.
+        misses (int): Number of lookups that computed a distribution.
+        size (int): Approximate memory used by the cached weights in bytes.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        max_bytes: int = 16 * 1024 * 1024,
+        ttl: Optional[float] = None,
+    ) -> None:
+        """
+        Initializes an empty cache.
+
+        Args:
+            max_entries (int): Maximum number of cached distributions.
+            max_bytes (int): Approximate memory bound for all cached weights.
+            ttl (float, optional): Seconds an entry stays valid.
+                Defaults to no expiry.
+        """
+        self.max_entries: int = max_entries
+        self.max_bytes: int = max_bytes
+        self.ttl: Optional[float] = ttl
+        self.hits: int = 0
+        self.misses: int = 0
+        self.size: int = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def __len__(self) -> int:
+        """
+        Returns the number of cached distributions.
+
+        Returns:
+            int: Number of entries.
+        """
+        return len(self._entries)
+
+    @staticmethod
+    def normalize(
+        num_dice: int,
+        sides: int,
+        roll_type: str = "normal",
+        threshold: Optional[int] = None,
+    ) -> tuple:
+        """
+        Builds the cache key of a roll.
+
+        Args:
+            num_dice (int): Number of dice to be rolled.
+            sides (int): Number of sides on each dice.
+            roll_type (str): Type of the roll.
+            threshold (int, optional): Threshold value for exploding or imploding rolls.
+
+        Returns:
+            tuple: Number of dice, sides, roll type and effective threshold.
+        """
+        roll_type = roll_type.lower()
+        selection, count = split_selection(roll_type)
+        if selection in SELECTIONS:
+            roll_type = selection if count == 1 else f"{selection}{count}"
+        if roll_type == "e":
+            threshold = sides if threshold is None else threshold
+        elif roll_type == "i":
+            threshold = 1 if threshold is None else threshold
+        else:
+            threshold = None
+        return num_dice, sides, roll_type, threshold
+
+    def get(
+        self,
+        num_dice: int,
+        sides: int,
+        roll_type: str = "normal",
+        modifier: int = 0,
+        threshold: Optional[int] = None,
+    ) -> Union[RollDistribution, ApproximateDistribution]:
+        """
+        Returns the distribution of a roll, computing it on a cache miss.
+
+        Args:
+            num_dice (int): Number of dice to be rolled.
+            sides (int): Number of sides on each dice.
+            roll_type (str): Type of the roll.
+            modifier (int): Modifier to be added to the sum of the dice rolls.
+            threshold (int, optional): Threshold value for exploding or imploding rolls.
+
+        Returns:
+            Union[RollDistribution, ApproximateDistribution]: The distribution.
+
+        Raises:
+            ValueError: If the roll is invalid or too large to compute.
+        """
+        key = self.normalize(num_dice, sides, roll_type, threshold)
+        cached = self._entries.get(key)
+        if cached is not None:
+            distribution, size, expires = cached
+            if expires is None or expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return distribution.shifted(modifier)
+            self._evict(key)
+
+        self.misses += 1
+        distribution = compute_distribution(*key[:3], 0, key[3])
+        size = self._estimate_size(distribution)
+        if size <= self.max_bytes and self.max_entries > 0:
+            expires = None if self.ttl is None else time.monotonic() + self.ttl
+            self._entries[key] = (distribution, size, expires)
+            self.size += size
+            while (
+                len(self._entries) > self.max_entries
+                or self.size > self.max_bytes
+            ):
+                self._evict(next(iter(self._entries)))
+        return distribution.shifted(modifier)
+
+    def clear(self) -> None:
+        """
+        Drops all cached distributions; the counters are kept.
+        """
+        self._entries.clear()
+        self.size = 0
+
+    def _evict(self, key: tuple) -> None:
+        """
+        Removes a single entry from the cache.
+
+        Args:
+            key (tuple): Key of the entry to remove.
+        """
+        self.size -= self._entries.pop(key)[1]
+
+    @staticmethod
+    def _estimate_size(
+        distribution: Union[RollDistribution, ApproximateDistribution]
+    ) -> int:
+        """
+        Estimates the memory held by a distribution's weights.
+
+        Args:
+            distribution: The distribution to measure.
+
+        Returns:
+            int: Approximate size in bytes.
+        """
+        if not distribution.exact:
+            return 64
+        per_weight = 36 + distribution.total.bit_length() // 8
+        return 64 + len(distribution.weights) * per_weight
@@ -0,0 +1,266 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import random
+from typing import NamedTuple, Optional
+
+# A pool is sampled as counts per face once it has this many dice per side,
+# where one binomial draw per face becomes cheaper than one draw per die.
+POOL_RATIO: int = 16
+
+
+def binomial(n: int, p: float, rng: Optional[random.Random] = None) -> int:
+    """
+    Draws the number of successes among n trials of probability p.
+
+    Small means are drawn by counting geometric waiting times, large ones
+    by Hormann's transformed rejection with squeeze (BTRS), so a draw costs
+    a few random numbers whatever n is. The algorithm is fixed here rather
+    than taken from the random module, so a seeded generator gives the
+    same draws on every Python version.
+
+    Args:
+        n (int): Number of trials.
+        p (float): Probability of success of each trial, from 0 to 1.
+        rng (random.Random, optional): Random generator to draw from.
+            Defaults to the global generator of the random module.
+
+    Returns:
+        int: Number of successes, from 0 to n.
+    """
+    uniform = (rng or random).random
+    if n <= 0 or p <= 0.0:
+        return 0
+    if p >= 1.0:
+        return n
+    if p > 0.5:
+        return n - binomial(n, 1.0 - p, rng)
+    if n * p < 10.0:
+        successes = trials = 0
+        log_q = math.log(1.0 - p)
+        while True:
+            trials += math.floor(math.log(1.0 - uniform()) / log_q) + 1
+            if trials > n:
+                return successes
+            successes += 1
+
+    spq = math.sqrt(n * p * (1.0 - p))
+    b = 1.15 + 2.53 * spq
+    a = -0.0873 + 0.0248 * b + 0.01 * p
+    c = n * p + 0.5
+    v_r = 0.92 - 4.2 / b
+    alpha = (2.83 + 5.1 / b) * spq
+    log_odds = math.log(p / (1.0 - p))
+    mode = math.floor((n + 1) * p)
+    h = math.lgamma(mode + 1) + math.lgamma(n - mode + 1)
+    while True:
+        u = uniform() - 0.5
+        v = uniform()
+        us = 0.5 - abs(u)
+        k = math.floor((2.0 * a / us + b) * u + c)
+        if k < 0 or k > n:
+            continue
+        if us >= 0.07 and v <= v_r:
+            return k
+        v *= alpha / (a / (us * us) + b)
+        if math.log(v) <= (
+            h - math.lgamma(k + 1) - math.lgamma(n - k + 1) + (k - mode) * log_odds
+        ):
+            return k
+
+
+class FacePool(NamedTuple):
+    """
+    A pool of identical dice stored as the number of dice showing each face.
+
+    Drawing, summing and selecting dice all work on the counts, so they
+    cost O(sides) whatever the number of dice.
+
+    Attributes:
+        counts (tuple): Number of counted dice showing each face, from 1.
+        discarded (tuple): Number of dropped or unkept dice showing each face,
+            empty if no dice were discarded.
+        marker (str, optional): "DH", "DL", "KH" or "KL", naming how the
+            discarded dice were discarded.
+    """
+
+    counts: tuple
+    discarded: tuple = ()
+    marker: Optional[str] = None
+
+    @classmethod
+    def roll(
+        cls, count: int, sides: int, rng: Optional[random.Random] = None
+    ) -> "FacePool":
+        """
+        Rolls a pool with a single multinomial draw, as a chain of
+            binomial draws conditioned on the dice not yet assigned.
+
+        Args:
+            count (int): Number of dice.
+            sides (int): Number of sides of each die.
+            rng (random.Random, optional): Random generator to draw from.
+
+        Returns:
+            FacePool: The rolled pool.
+        """
+        counts = []
+        remaining = count
+        for faces_left in range(sides, 1, -1):
+            drawn = binomial(remaining, 1.0 / faces_left, rng)
+            counts.append(drawn)
+            remaining -= drawn
+        counts.append(remaining)
+        return cls(tuple(counts))
+
+    @classmethod
+    def roll_chains(
+        cls,
+        count: int,
+        sides: int,
+        rerolled: range,
+        max_depth: int,
+        rng: Optional[random.Random] = None,
+    ) -> "FacePool":
+        """
+        Rolls a pool where every die showing a rerolled face adds another
+            die, for at most max_depth added dice per die. Every wave of
+            added dice is drawn as one pool, so a roll costs
+            O(sides * max_depth) at worst.
+
+        Args:
+            count (int): Number of dice.
+            sides (int): Number of sides of each die.
+            rerolled (range): Faces that add another die.
+            max_depth (int): Most dice added to the chain of a die.
+            rng (random.Random, optional): Random generator to draw from.
+
+        Returns:
+            FacePool: All rolled dice.
+        """
+        pool = wave = cls.roll(count, sides, rng)
+        for _ in range(max_depth):
+            pending = sum(wave.counts[face - 1] for face in rerolled)
+            if not pending:
+                break
+            wave = cls.roll(pending, sides, rng)
+            pool = pool.merge(wave)
+        return pool
+
+    def dice(self) -> int:
+        """
+        Returns:
+            int: Number of counted dice.
+        """
+        return sum(self.counts)
+
+    def merge(self, other: "FacePool") -> "FacePool":
+        """
+        Combines the counted dice of two pools of the same dice.
+
+        Args:
+            other (FacePool): The other pool.
+
+        Returns:
+            FacePool: A pool of the dice of both.
+        """
+        return FacePool(tuple(map(sum, zip(self.counts, other.counts))))
+
+    def __repr__(self) -> str:
+        """
+        Formats the pool as the number of dice per face, e.g. "[1x3, 2x4]",
+            followed by the discarded dice.
+
+        Returns:
+            str: The formatted pool.
+        """
+        text = _format_counts(self.counts)
+        if self.marker is not None:
+            text += f" {self.marker} {_format_counts(self.discarded)}"
+        return text
+
+    def total(self) -> int:
+        """
+        Returns:
+            int: Sum of the counted dice.
+        """
+        return sum(face * times for face, times in enumerate(self.counts, 1))
+
+    def count_at_least(self, value: int) -> int:
+        """
+        Counts the counted dice showing at least a value.
+
+        Args:
+            value (int): The lowest value counted.
+
+        Returns:
+            int: Number of dice.
+        """
+        return sum(self.counts[max(value, 1) - 1:])
+
+    def count_at_most(self, value: int) -> int:
+        """
+        Counts the counted dice showing at most a value.
+
+        Args:
+            value (int): The highest value counted.
+
+        Returns:
+            int: Number of dice.
+        """
+        return sum(self.counts[:max(value, 0)])
+
+    def select(self, selection: str, selected: int) -> "FacePool":
+        """
+        Keeps or drops the highest or lowest dice.
+
+        Args:
+            selection (str): "kh", "kl", "dh" or "dl".
+            selected (int): Number of dice kept or dropped.
+
+        Returns:
+            FacePool: The pool counting only the remaining dice, with the
+                others as its discarded dice.
+        """
+        highest = selection in ("kh", "dh")
+        picked = [0] * len(self.counts)
+        faces = range(len(self.counts))
+        if highest:
+            faces = reversed(faces)
+        left = selected
+        for face in faces:
+            if not left:
+                break
+            picked[face] = min(self.counts[face], left)
+            left -= picked[face]
+        rest = [times - chosen for times, chosen in zip(self.counts, picked)]
+        if selection[0] == "k":
+            return FacePool(tuple(picked), tuple(rest), selection.upper())
+        return FacePool(tuple(rest), tuple(picked), selection.upper())
+
+
+def _format_counts(counts: tuple) -> str:
+    """
+    Formats counts per face, leaving out faces no die shows.
+
+    Args:
+        counts (tuple): Number of dice showing each face, from 1.
+
+    Returns:
+        str: The faces and their counts, e.g. "[1x3, 2x4]".
+    """
+    return "[" + ", ".join(
+        f"{face}x{times}" for face, times in enumerate(counts, 1) if times
+    ) + "]"
@@ -0,0 +1,21 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+"""
+Local fake homeserver and end-to-end load test, runnable with "python -m loadtest".
+"""
+
+from loadtest.fake_homeserver import FakeHomeserver
+from loadtest.load_generator import LoadGenerator
+
+__all__ = ["FakeHomeserver", "LoadGenerator"]
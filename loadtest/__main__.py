@@ -0,0 +1,79 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import argparse
+import asyncio
+import json
+
+from loadtest.load_generator import LoadGenerator
+
+
+def main() -> None:
+    """
+    Runs the end-to-end load test and prints the report as JSON.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m loadtest",
+        description="Load-test the bot against a local fake homeserver.",
+    )
+    parser.add_argument(
+        "--rooms", type=int, default=10,
+        help="number of rooms receiving traffic (default: 10)",
+    )
+    parser.add_argument(
+        "--rate", type=float, default=5.0,
+        help="messages per second per room (default: 5)",
+    )
+    parser.add_argument(
+        "--duration", type=float, default=10.0,
+        help="seconds of traffic (default: 10)",
+    )
+    parser.add_argument(
+        "--roll-share", type=float, default=0.3,
+        help="share of /roll commands in the traffic (default: 0.3)",
+    )
+    parser.add_argument(
+        "--reroll-share", type=float, default=0.1,
+        help="share of /reroll commands in the traffic (default: 0.1)",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0,
+        help="seed of the message mix (default: 0)",
+    )
+    parser.add_argument(
+        "--shards", type=int, default=0,
+        help="worker processes computing the rolls (default: 0, none)",
+    )
+    parser.add_argument(
+        "--reply-window", type=float, default=None,
+        help="seconds the bot holds replies to a busy room for "
+        "(default: the bot's default; 0 sends every reply at once)",
+    )
+    args = parser.parse_args()
+
+    generator = LoadGenerator(
+        rooms=args.rooms,
+        rate=args.rate,
+        duration=args.duration,
+        roll_share=args.roll_share,
+        reroll_share=args.reroll_share,
+        seed=args.seed,
+        shards=args.shards,
+        reply_window=args.reply_window,
+    )
+    print(json.dumps(asyncio.run(generator.run()), indent=2))
+
+
+if __name__ == "__main__":
+    main()
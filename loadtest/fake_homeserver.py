@@ -0,0 +1,228 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import time
+from typing import Callable, Optional
+
+from aiohttp import web
+
+
+class FakeHomeserver:
+    """
+    In-process stand-in for the parts of a Matrix homeserver the bot uses.
+
+    It serves /login, /sync, /join and /send under both the r0 and v3 client
+    API prefixes. Messages are injected with inject_message and delivered to
+    the bot through long-polling /sync; whatever the bot sends is passed to
+    the on_send callback.
+
+    Attributes:
+        user_id (str): The user id returned on login.
+        host (str): Interface the server listens on.
+        port (int): Port the server listens on; 0 picks a free port.
+        joined_rooms (set): Rooms the bot is a member of.
+        on_send (Callable, optional): Called with the arrival time, room id
+            and content of every message the bot sends.
+    """
+
+    API_PREFIXES: tuple[str, ...] = ("/_matrix/client/r0", "/_matrix/client/v3")
+
+    def __init__(
+        self,
+        user_id: str = "@dicebot:localhost",
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        """
+        Initializes the fake homeserver.
+
+        Args:
+            user_id (str): The user id returned on login.
+            host (str): Interface to listen on.
+            port (int): Port to listen on; 0 picks a free port.
+        """
+        self.user_id: str = user_id
+        self.host: str = host
+        self.port: int = port
+        self.joined_rooms: set[str] = set()
+        self.on_send: Optional[Callable[[float, str, dict], None]] = None
+        self._events: list[tuple[str, dict]] = []
+        self._new_events: Optional[asyncio.Event] = None
+        self._runner: Optional[web.AppRunner] = None
+        self._event_counter: int = 0
+        self._closing: bool = False
+
+    @property
+    def url(self) -> str:
+        """str: Base URL of the running server."""
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self) -> str:
+        """
+        Starts serving.
+
+        Returns:
+            str: Base URL of the server, to be used as the homeserver.
+        """
+        self._new_events = asyncio.Event()
+        self._closing = False
+        app = web.Application()
+        for prefix in self.API_PREFIXES:
+            app.router.add_post(f"{prefix}/login", self._login)
+            app.router.add_get(f"{prefix}/sync", self._sync)
+            app.router.add_post(f"{prefix}/join/{{room_id}}", self._join)
+            app.router.add_post(
+                f"{prefix}/rooms/{{room_id}}/join", self._join
+            )
+            app.router.add_put(
+                f"{prefix}/rooms/{{room_id}}/send/{{event_type}}/{{txn_id}}",
+                self._send,
+            )
+        app.router.add_route("*", "/{tail:.*}", self._unrecognized)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return self.url
+
+    async def close(self) -> None:
+        """
+        Stops serving.
+        """
+        if self._runner is not None:
+            self._closing = True
+            self._new_events.set()
+            await self._runner.cleanup()
+            self._runner = None
+
+    def inject_message(self, room_id: str, sender: str, body: str) -> str:
+        """
+        Adds a text message to a room, to be delivered by the next sync.
+
+        Args:
+            room_id (str): The room the message is sent to.
+            sender (str): User id of the sender.
+            body (str): Text of the message.
+
+        Returns:
+            str: The event id of the message.
+        """
+        self.joined_rooms.add(room_id)
+        self._event_counter += 1
+        event_id = f"$event{self._event_counter}"
+        self._events.append(
+            (
+                room_id,
+                {
+                    "type": "m.room.message",
+                    "event_id": event_id,
+                    "sender": sender,
+                    "origin_server_ts": int(time.time() * 1000),
+                    "content": {"msgtype": "m.text", "body": body},
+                },
+            )
+        )
+        self._new_events.set()
+        return event_id
+
+    async def _login(self, _request: web.Request) -> web.Response:
+        """
+        Accepts any login.
+        """
+        return web.json_response(
+            {
+                "user_id": self.user_id,
+                "device_id": "FAKEDEVICE",
+                "access_token": "fake-access-token",
+            }
+        )
+
+    async def _sync(self, request: web.Request) -> web.Response:
+        """
+        Returns the events after the since token, waiting up to the
+            requested timeout for new ones.
+        """
+        since = request.query.get("since", "s0")
+        position = int(since[1:]) if since[1:].isdigit() else 0
+        timeout = int(request.query.get("timeout", "0")) / 1000
+        if position >= len(self._events) and timeout and not self._closing:
+            self._new_events.clear()
+            try:
+                await asyncio.wait_for(self._new_events.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        events = self._events[position:]
+        timelines: dict[str, list[dict]] = {
+            room_id: [] for room_id in self.joined_rooms
+        }
+        for room_id, event in events:
+            timelines[room_id].append(event)
+        return web.json_response(
+            {
+                "next_batch": f"s{position + len(events)}",
+                "rooms": {
+                    "join": {
+                        room_id: {
+                            "timeline": {
+                                "events": timeline,
+                                "limited": False,
+                                "prev_batch": since,
+                            },
+                            "state": {"events": []},
+                            "ephemeral": {"events": []},
+                            "account_data": {"events": []},
+                        }
+                        for room_id, timeline in timelines.items()
+                    },
+                    "invite": {},
+                    "leave": {},
+                },
+                "to_device": {"events": []},
+                "presence": {"events": []},
+                "account_data": {"events": []},
+                "device_lists": {"changed": [], "left": []},
+                "device_one_time_keys_count": {},
+            }
+        )
+
+    async def _join(self, request: web.Request) -> web.Response:
+        """
+        Joins the bot to a room.
+        """
+        room_id = request.match_info["room_id"]
+        self.joined_rooms.add(room_id)
+        return web.json_response({"room_id": room_id})
+
+    async def _send(self, request: web.Request) -> web.Response:
+        """
+        Records a message sent by the bot.
+        """
+        received = time.perf_counter()
+        content = await request.json()
+        if self.on_send is not None:
+            self.on_send(received, request.match_info["room_id"], content)
+        self._event_counter += 1
+        return web.json_response({"event_id": f"$event{self._event_counter}"})
+
+    async def _unrecognized(self, _request: web.Request) -> web.Response:
+        """
+        Answers every other endpoint like a homeserver that lacks it.
+        """
+        return web.json_response(
+            {"errcode": "M_UNRECOGNIZED", "error": "Unrecognized request"},
+            status=404,
+        )
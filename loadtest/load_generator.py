@@ -0,0 +1,260 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+from typing import Any, Optional
+
+from nio import AsyncClient
+
+from bot import MatrixRollBot
+from logger import BotLogger
+from loadtest.fake_homeserver import FakeHomeserver
+
+CHATTER: tuple[str, ...] = (
+    "I attack the goblin with my sword",
+    "lol",
+    "brb, pizza",
+    "who's turn is it?",
+)
+ROLLS: tuple[str, ...] = ("/roll 1d20+5", "/roll 4d6dl", "/roll 2d6e", "/roll 8d6")
+
+
+class LoadGenerator:
+    """
+    Drives a MatrixRollBot connected to a FakeHomeserver with generated
+        room traffic and measures command-to-reply latency.
+
+    Every generated message has its own sender, so a reply is matched to
+    its command by the user name it starts with.
+
+    Attributes:
+        rooms (int): Number of rooms receiving traffic.
+        rate (float): Messages per second sent to each room.
+        duration (float): Seconds of traffic.
+        roll_share (float): Share of messages that are /roll commands.
+        reroll_share (float): Share of messages that are /reroll commands.
+        drain_timeout (float): Seconds to wait for outstanding replies.
+        seed (int): Seed of the message mix.
+    """
+
+    REPLY_USER = re.compile(r"(lt\d+)\b")
+    ROLL_HASH = re.compile(r"'([0-9a-f]{32})'")
+
+    def __init__(
+        self,
+        rooms: int = 10,
+        rate: float = 5.0,
+        duration: float = 10.0,
+        roll_share: float = 0.3,
+        reroll_share: float = 0.1,
+        drain_timeout: float = 10.0,
+        seed: int = 0,
+        shards: int = 0,
+        reply_window: Optional[float] = None,
+    ) -> None:
+        """
+        Initializes the load generator.
+
+        Args:
+            rooms (int): Number of rooms receiving traffic.
+            rate (float): Messages per second sent to each room.
+            duration (float): Seconds of traffic.
+            roll_share (float): Share of messages that are /roll commands.
+            reroll_share (float): Share of messages that are /reroll commands.
+            drain_timeout (float): Seconds to wait for outstanding replies.
+            seed (int): Seed of the message mix.
+            shards (int): Number of worker processes of the bot, 0 for none.
+            reply_window (float, optional): Seconds the bot holds replies
+                to a busy room for, or None for the bot's default.
+        """
+        self.rooms: int = rooms
+        self.rate: float = rate
+        self.duration: float = duration
+        self.roll_share: float = roll_share
+        self.reroll_share: float = reroll_share
+        self.drain_timeout: float = drain_timeout
+        self.seed: int = seed
+        self.shards: int = shards
+        self.reply_window: Optional[float] = reply_window
+        self._sent_at: dict[str, float] = {}
+        self._latencies: list[float] = []
+        self._hashes: list[str] = []
+        self._replied: Optional[asyncio.Event] = None
+        self._messages: int = 0
+        self._sends: int = 0
+
+    def _on_send(self, received: float, _room_id: str, content: dict) -> None:
+        """
+        Matches a reply of the bot to the commands it answers.
+
+        Args:
+            received (float): perf_counter time the reply arrived.
+            _room_id (str): Room the reply was sent to.
+            content (dict): Content of the reply.
+        """
+        self._sends += 1
+        body = content.get("body", "")
+        for user in self.REPLY_USER.findall(body):
+            sent = self._sent_at.pop(user, None)
+            if sent is not None:
+                self._latencies.append(received - sent)
+        self._hashes.extend(self.ROLL_HASH.findall(body))
+        del self._hashes[:-100]
+        if not self._sent_at:
+            self._replied.set()
+
+    def _next_message(self, rng: random.Random) -> tuple[str, bool]:
+        """
+        Picks the next message of the mix.
+
+        Args:
+            rng (random.Random): Random source of the mix.
+
+        Returns:
+            tuple: The message and whether the bot should reply to it.
+        """
+        draw = rng.random()
+        if draw < self.roll_share:
+            return rng.choice(ROLLS), True
+        if draw < self.roll_share + self.reroll_share and self._hashes:
+            return f"/reroll {rng.choice(self._hashes)}", True
+        return rng.choice(CHATTER), False
+
+    async def _flood_room(
+        self, server: FakeHomeserver, room_id: str, rng: random.Random
+    ) -> None:
+        """
+        Sends messages to one room at the configured rate.
+
+        Args:
+            server (FakeHomeserver): Server the messages are injected into.
+            room_id (str): The room to flood.
+            rng (random.Random): Random source of the mix.
+        """
+        interval = 1 / self.rate
+        deadline = time.perf_counter() + self.duration
+        next_send = time.perf_counter() + rng.random() * interval
+        while next_send < deadline:
+            await asyncio.sleep(max(0.0, next_send - time.perf_counter()))
+            self._messages += 1
+            user = f"lt{self._messages}"
+            body, expects_reply = self._next_message(rng)
+            if expects_reply:
+                self._sent_at[user] = time.perf_counter()
+                self._replied.clear()
+            server.inject_message(room_id, f"@{user}:localhost", body)
+            next_send += interval
+
+    async def run(self) -> dict[str, Any]:
+        """
+        Runs the load test against a bot in a temporary working directory,
+            so its credentials and roll log do not touch the real ones.
+
+        Returns:
+            dict: Messages sent, commands answered, bot messages, throughput and
+                latency percentiles in milliseconds.
+        """
+        self._replied = asyncio.Event()
+        server = FakeHomeserver()
+        server.on_send = self._on_send
+        homeserver = await server.start()
+        room_ids = [f"!room{index}:localhost" for index in range(self.rooms)]
+        for room_id in room_ids:
+            server.joined_rooms.add(room_id)
+
+        previous = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                with open("credentials.txt", "w", encoding='utf-8') as file:
+                    file.write(
+                        f"username: {server.user_id}\n"
+                        "password: load-test\n"
+                        f"homeserver: {homeserver}\n"
+                    )
+                    if self.shards:
+                        file.write(f"shards: {self.shards}\n")
+                    if self.reply_window is not None:
+                        file.write(f"reply_window: {self.reply_window}\n")
+                client = AsyncClient(homeserver=homeserver, user=server.user_id)
+                bot = MatrixRollBot(client, BotLogger())
+                bot_task = asyncio.create_task(bot.run())
+                await client.synced.wait()
+
+                rng = random.Random(self.seed)
+                started = time.perf_counter()
+                await asyncio.gather(
+                    *(
+                        self._flood_room(
+                            server, room_id, random.Random(rng.random())
+                        )
+                        for room_id in room_ids
+                    )
+                )
+                if self._sent_at:
+                    try:
+                        await asyncio.wait_for(
+                            self._replied.wait(), self.drain_timeout
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+                elapsed = time.perf_counter() - started
+
+                bot_task.cancel()
+                await asyncio.gather(bot_task, return_exceptions=True)
+                await client.close()
+            finally:
+                os.chdir(previous)
+                await server.close()
+        return self._report(elapsed)
+
+    def _report(self, elapsed: float) -> dict[str, Any]:
+        """
+        Summarizes the measured latencies.
+
+        Args:
+            elapsed (float): Seconds from the first message to the last reply.
+
+        Returns:
+            dict: The load test report.
+        """
+        latencies = sorted(latency * 1000 for latency in self._latencies)
+        percentiles = (
+            statistics.quantiles(latencies, n=100, method="inclusive")
+            if len(latencies) > 1
+            else latencies * 99
+        )
+        return {
+            "rooms": self.rooms,
+            "rate_per_room": self.rate,
+            "duration_s": self.duration,
+            "messages": self._messages,
+            "commands_answered": len(latencies),
+            "commands_unanswered": len(self._sent_at),
+            "messages_sent": self._sends,
+            "elapsed_s": elapsed,
+            "throughput_messages_per_s": self._messages / elapsed,
+            "throughput_replies_per_s": len(latencies) / elapsed,
+            "latency_ms": {
+                "p50": percentiles[49] if percentiles else None,
+                "p99": percentiles[98] if percentiles else None,
+                "max": latencies[-1] if latencies else None,
+            },
+        }
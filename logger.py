@@ -12,11 +12,29 @@
 # You should have received a copy of the GNU General Public License
 # along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
 
+import os
 import json
+import mmap
+import struct
+import sqlite3
 import hashlib
 import datetime
+import threading
+from collections import deque
+from collections.abc import Sequence
 from typing import Optional, Union
 
+from persistence import BackgroundWriter
+from roll_codec import (
+    RECORD_LENGTH,
+    complete_length,
+    decode_entry,
+    frame,
+    is_log_entry,
+    iter_records,
+    read_json_log,
+)
+
 
 class RollLogger:
     """
@@ -24,15 +42,29 @@ class RollLogger:
 
     Attributes:
         LOG_FILE (str): Name of the file where logs are stored.
+        MAX_LOGS (int): Default number of most recent rolls that are kept.
+        INDEXED (bool): Whether get_roll_by_hash and history are served by
+            an index over the whole log rather than a scan of logs.
+        LAZY (bool): Whether logs decodes entries only as they are read,
+            so that they are looked up in the log instead of being loaded.
+        max_logs (int): Number of most recent rolls kept by this instance.
         logs (list): List containing the logs.
     """
 
     LOG_FILE: str = "dice_rolls.json"
+    MAX_LOGS: int = 500
+    INDEXED: bool = False
+    LAZY: bool = False
 
-    def __init__(self) -> None:
+    def __init__(self, max_logs: Optional[int] = None) -> None:
         """
         Initializes a new instance of the Logger class and loads existing logs.
+
+        Args:
+            max_logs (int, optional): Number of most recent rolls to keep.
+                Defaults to MAX_LOGS.
         """
+        self.max_logs: int = self.MAX_LOGS if max_logs is None else max_logs
         self.logs: list[
             dict[str, Union[str, list[str, str]]]
         ] = self.load_logs()
@@ -62,6 +94,20 @@ class RollLogger:
         with open(self.LOG_FILE, "w", encoding='utf-8') as file:
             json.dump(self.logs, file)
 
+    def append_logs(self, entries: list[dict]) -> None:
+        """
+        Adds already built log entries, trims the logs to max_logs
+            and persists them.
+
+        Args:
+            entries (list): Log entries as produced by log_roll.
+        """
+        self.logs.extend(entries)
+        overflow = len(self.logs) - self.max_logs
+        if overflow > 0:
+            del self.logs[:overflow]
+        self.save_logs()
+
     def log_roll(self, roll_data: dict[str, str]) -> str:
         """
         Logs a new dice roll.
@@ -73,16 +119,24 @@ class RollLogger:
             str: A unique hash generated based on the current timestamp,
                 representing the logged roll.
         """
+        entry = self.make_log_entry(roll_data)
+        self.append_logs([entry])
+        return entry["hash"]
+
+    @staticmethod
+    def make_log_entry(roll_data: dict[str, str]) -> dict:
+        """
+        Builds a log entry for a roll, stamped with the current time.
+
+        Args:
+            roll_data (dict): Data related to the dice roll.
+
+        Returns:
+            dict: The entry with its "hash", "time" and "roll_data" keys.
+        """
         current_time = datetime.datetime.now().isoformat()
         roll_hash = hashlib.md5(current_time.encode()).hexdigest()
-
-        if len(self.logs) >= 500:
-            self.logs.pop(0)
-        self.logs.append(
-            {"hash": roll_hash, "time": current_time, "roll_data": roll_data}
-        )
-        self.save_logs()
-        return roll_hash
+        return {"hash": roll_hash, "time": current_time, "roll_data": roll_data}
 
     def get_roll_by_hash(self, roll_hash: str) -> Optional[dict[str, str]]:
         """
@@ -100,40 +154,887 @@ class RollLogger:
                 return log["roll_data"]
         return None
 
+    def history(
+        self,
+        room: Optional[str] = None,
+        user: Optional[str] = None,
+        limit: int = 10,
+    ) -> list[dict]:
+        """
+        Retrieves the most recent log entries, optionally of one room or user.
+
+        Args:
+            room (str, optional): Only entries of rolls made in this room.
+            user (str, optional): Only entries of rolls made by this user.
+            limit (int): Maximum number of entries.
+
+        Returns:
+            list[dict]: The matching entries, newest first.
+        """
+        matches = []
+        for log in reversed(self.logs):
+            if len(matches) >= limit:
+                break
+            if not isinstance(log, dict) or "roll_data" not in log:
+                continue
+            roll_data = log["roll_data"]
+            if room is not None and roll_data.get("room") != room:
+                continue
+            if user is not None and roll_data.get("user") != user:
+                continue
+            matches.append(log)
+        return matches
+
+
+class JsonlRollLogger(RollLogger):
+    """
+    Roll logger backed by an append-only JSON-lines journal.
+
+    Every roll is appended to the journal as a single line, so logging
+    a roll writes only that roll instead of the whole history. Once the
+    journal holds compact_interval lines more than max_logs, it is
+    rewritten with only the most recent max_logs entries.
+
+    Attributes:
+        LOG_FILE (str): Name of the journal file.
+        LEGACY_LOG_FILE (str): JSON log imported when no journal exists yet.
+        COMPACT_INTERVAL (int): Default number of surplus journal lines
+            tolerated before compaction.
+        compact_interval (int): Surplus lines tolerated by this instance.
+        journal_lines (int): Number of lines currently in the journal.
+    """
+
+    LOG_FILE: str = "dice_rolls.jsonl"
+    LEGACY_LOG_FILE: str = RollLogger.LOG_FILE
+    COMPACT_INTERVAL: int = 100
+
+    def __init__(
+        self,
+        max_logs: Optional[int] = None,
+        compact_interval: Optional[int] = None,
+    ) -> None:
+        """
+        Initializes the journal logger and loads the most recent entries.
+
+        Args:
+            max_logs (int, optional): Number of most recent rolls to keep.
+            compact_interval (int, optional): Surplus journal lines tolerated
+                before compaction. Defaults to COMPACT_INTERVAL.
+        """
+        self.compact_interval: int = (
+            self.COMPACT_INTERVAL
+            if compact_interval is None
+            else compact_interval
+        )
+        self.journal_lines: int = 0
+        super().__init__(max_logs)
+        if self.journal_lines > self.max_logs + self.compact_interval:
+            self.compact()
+
+    def load_logs(self) -> list:
+        """
+        Loads the most recent entries from the journal.
+
+        Lines that cannot be decoded, such as one torn by a crash
+            in the middle of a write, are skipped.
+        If the journal does not exist yet, the legacy JSON log is imported.
+
+        Returns:
+            list: Up to max_logs most recent log entries.
+        """
+        recent: deque = deque(maxlen=self.max_logs)
+        try:
+            with open(self.LOG_FILE, "r", encoding='utf-8') as file:
+                for line in file:
+                    self.journal_lines += 1
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(entry, dict):
+                        recent.append(entry)
+        except FileNotFoundError:
+            return self._import_legacy_logs()
+        return list(recent)
+
+    def _import_legacy_logs(self) -> list:
+        """
+        Imports entries from the legacy JSON log into a new journal.
+
+        Returns:
+            list: Up to max_logs most recent entries of the legacy log.
+        """
+        try:
+            with open(self.LEGACY_LOG_FILE, "r", encoding='utf-8') as file:
+                data = json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return []
+        if not isinstance(data, list):
+            return []
+        entries = [entry for entry in data if is_log_entry(entry)]
+        self.logs = entries[-self.max_logs:] if self.max_logs else []
+        self.save_logs()
+        return self.logs
+
+    def save_logs(self) -> None:
+        """
+        Rewrites the journal with the current logs.
+
+        The journal is written to a temporary file first and then swapped in,
+            so a crash never leaves a half-written journal behind.
+        """
+        temp_file = f"{self.LOG_FILE}.tmp"
+        with open(temp_file, "w", encoding='utf-8') as file:
+            for entry in self.logs:
+                file.write(json.dumps(entry) + "\n")
+        os.replace(temp_file, self.LOG_FILE)
+        self.journal_lines = len(self.logs)
+
+    def compact(self) -> None:
+        """
+        Drops journal lines that fell out of the max_logs window.
+        """
+        self.save_logs()
+
+    def append_logs(self, entries: list[dict]) -> None:
+        """
+        Appends entries to the journal, compacting it when needed.
+
+        Args:
+            entries (list): Log entries as produced by log_roll.
+        """
+        self.logs.extend(entries)
+        overflow = len(self.logs) - self.max_logs
+        if overflow > 0:
+            del self.logs[:overflow]
+        with open(self.LOG_FILE, "a", encoding='utf-8') as file:
+            file.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        self.journal_lines += len(entries)
+        if self.journal_lines > self.max_logs + self.compact_interval:
+            self.compact()
+
+
+class BinaryRollLogger(JsonlRollLogger):
+    """
+    Roll logger backed by an append-only journal of binary records.
+
+    It works like JsonlRollLogger, but every entry is stored in the
+    compact format of roll_codec: packed dice, bitmasks for discarded
+    dice, binary hashes and integer timestamps.
+
+    Attributes:
+        LOG_FILE (str): Name of the journal file.
+        LEGACY_LOG_FILE (str): JSON-lines journal imported when no binary
+            journal exists yet.
+    """
+
+    LOG_FILE: str = "dice_rolls.bin"
+    LEGACY_LOG_FILE: str = JsonlRollLogger.LOG_FILE
+
+    def load_logs(self) -> list:
+        """
+        Loads the most recent entries from the journal.
+
+        A record torn by a crash in the middle of a write is cut from
+            the journal, so that the next records are appended after the
+            last complete one.
+        If the journal does not exist yet, the JSON-lines journal is imported.
+
+        Returns:
+            list: Up to max_logs most recent log entries.
+        """
+        try:
+            with open(self.LOG_FILE, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return self._import_legacy_logs()
+        length = complete_length(data)
+        if length < len(data):
+            os.truncate(self.LOG_FILE, length)
+        recent: deque = deque(maxlen=self.max_logs)
+        for entry in iter_records(data):
+            self.journal_lines += 1
+            recent.append(entry)
+        return list(recent)
+
+    def _import_legacy_logs(self) -> list:
+        """
+        Imports entries from the JSON-lines journal into a new binary journal.
+
+        Returns:
+            list: Up to max_logs most recent entries of the JSON-lines journal.
+        """
+        try:
+            entries = read_json_log(self.LEGACY_LOG_FILE)
+        except FileNotFoundError:
+            return []
+        self.logs = entries[-self.max_logs:] if self.max_logs else []
+        self.save_logs()
+        return self.logs
+
+    def save_logs(self) -> None:
+        """
+        Rewrites the journal with the current logs, through a temporary file.
+        """
+        temp_file = f"{self.LOG_FILE}.tmp"
+        try:
+            with open(temp_file, "wb") as file:
+                file.write(b"".join(frame(entry) for entry in self.logs))
+        except BaseException:
+            os.remove(temp_file)
+            raise
+        os.replace(temp_file, self.LOG_FILE)
+        self.journal_lines = len(self.logs)
+
+    def append_logs(self, entries: list[dict]) -> None:
+        """
+        Appends entries to the journal, compacting it when needed.
+
+        Args:
+            entries (list): Log entries as produced by log_roll.
+        """
+        self.logs.extend(entries)
+        overflow = len(self.logs) - self.max_logs
+        if overflow > 0:
+            del self.logs[:overflow]
+        with open(self.LOG_FILE, "ab") as file:
+            file.write(b"".join(frame(entry) for entry in entries))
+        self.journal_lines += len(entries)
+        if self.journal_lines > self.max_logs + self.compact_interval:
+            self.compact()
+
+
+class RingView(Sequence):
+    """
+    Read-only sequence of the entries in a ring buffer, oldest first.
+
+    Entries are decoded only when they are read, and the number of
+    entries is read from the header on every access.
+
+    Attributes:
+        ring (RingRollLogger): The ring buffer logger.
+    """
+
+    def __init__(self, ring: "RingRollLogger") -> None:
+        """
+        Initializes the view.
+
+        Args:
+            ring (RingRollLogger): The ring buffer logger.
+        """
+        self.ring: RingRollLogger = ring
+
+    def __len__(self) -> int:
+        """
+        Returns:
+            int: Number of entries held by the ring buffer.
+        """
+        return min(self.ring.written(), self.ring.max_logs)
+
+    def __getitem__(self, index):
+        """
+        Decodes an entry, or a list of entries for a slice.
+
+        Args:
+            index (Union[int, slice]): Position from the oldest entry.
+
+        Returns:
+            Union[dict, list]: The entry or entries.
+
+        Raises:
+            IndexError: If the index is out of range.
+        """
+        written = self.ring.written()
+        length = min(written, self.ring.max_logs)
+        if isinstance(index, slice):
+            return [
+                self.ring.read_slot((written - length + position) % self.ring.max_logs)
+                for position in range(*index.indices(length))
+            ]
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError("ring buffer index out of range")
+        return self.ring.read_slot((written - length + index) % self.ring.max_logs)
+
+
+class RingRollLogger(RollLogger):
+    """
+    Roll logger backed by a memory-mapped ring buffer of fixed-width slots.
+
+    The file holds a header with the number of rolls ever written,
+    followed by max_logs slots of SLOT_SIZE bytes, each holding one entry
+    in the binary format of roll_codec. A new roll overwrites the oldest
+    slot in place before the header's count is advanced, so logging a roll
+    writes a single slot and a slot torn by a crash is never referenced.
+    Nothing is parsed at startup: logs is a view decoding slots as they are
+    read, and since the count is read from the header on every access,
+    other processes mapping the same file see new rolls as they are logged.
+
+    Attributes:
+        LOG_FILE (str): Name of the ring buffer file.
+        LEGACY_LOG_FILE (str): JSON-lines journal imported when no ring
+            buffer exists yet.
+        SLOT_SIZE (int): Size of a slot in bytes, its length prefix included.
+        DIGEST_SIZE (int): Size in bytes of the hash at the start of an entry.
+        MAGIC (bytes): Signature at the start of the file.
+        HEADER (struct.Struct): Layout of the header: signature, slot size,
+            number of slots and number of rolls ever written.
+        logs (RingView): The entries held by the ring buffer, oldest first.
+    """
+
+    LOG_FILE: str = "dice_rolls.ring"
+    LEGACY_LOG_FILE: str = JsonlRollLogger.LOG_FILE
+    SLOT_SIZE: int = 1024
+    DIGEST_SIZE: int = hashlib.md5().digest_size
+    MAGIC: bytes = b"DICERING"
+    HEADER: struct.Struct = struct.Struct("<8sIIQ")
+    LAZY: bool = True
+
+    def load_logs(self) -> RingView:
+        """
+        Maps the ring buffer file, creating it if it does not exist
+            or was made with another slot size or number of slots.
+
+        When the file is created, the most recent entries of the
+        JSON-lines journal or of the previous ring buffer are carried over.
+
+        Returns:
+            RingView: The entries held by the ring buffer.
+        """
+        self._map: Optional[mmap.mmap] = None
+        try:
+            file = open(self.LOG_FILE, "r+b")
+        except FileNotFoundError:
+            self._create(self._legacy_entries())
+            return RingView(self)
+        with file:
+            header = file.read(self.HEADER.size)
+            if len(header) == self.HEADER.size and self.HEADER.unpack(
+                header
+            )[:3] == (self.MAGIC, self.SLOT_SIZE, self.max_logs):
+                self._map = mmap.mmap(file.fileno(), 0)
+                return RingView(self)
+        entries = self._read_foreign_ring(header)
+        self._create(entries)
+        return RingView(self)
+
+    def _legacy_entries(self) -> list[dict]:
+        """
+        Reads the entries of the JSON-lines journal, if there is one.
+
+        Returns:
+            list[dict]: The entries, oldest first.
+        """
+        try:
+            return read_json_log(self.LEGACY_LOG_FILE)
+        except FileNotFoundError:
+            return []
+
+    def _read_foreign_ring(self, header: bytes) -> list[dict]:
+        """
+        Reads the entries of a ring buffer made with another layout.
+
+        Args:
+            header (bytes): The header of the file.
+
+        Returns:
+            list[dict]: The entries, oldest first, or none if the file
+                is not a ring buffer.
+        """
+        if len(header) < self.HEADER.size:
+            return []
+        magic, slot_size, slots, written = self.HEADER.unpack(header)
+        if magic != self.MAGIC or not slots:
+            return []
+        with open(self.LOG_FILE, "rb") as file:
+            data = file.read()
+        entries = []
+        for position in range(max(written - slots, 0), written):
+            offset = self.HEADER.size + position % slots * slot_size
+            (length,) = RECORD_LENGTH.unpack_from(data, offset)
+            offset += RECORD_LENGTH.size
+            entries.append(decode_entry(data[offset:offset + length]))
+        return entries
+
+    def _create(self, entries: list[dict]) -> None:
+        """
+        Writes a new ring buffer file holding the given entries and maps it.
+
+        Args:
+            entries (list[dict]): The entries, oldest first. Entries that do
+                not fit in a slot are left out.
+        """
+        if self._map is not None:
+            self._map.close()
+        records = []
+        for entry in entries:
+            try:
+                records.append(self._slot(entry))
+            except ValueError:
+                continue
+        records = records[-self.max_logs:] if self.max_logs else []
+        temp_file = f"{self.LOG_FILE}.tmp"
+        with open(temp_file, "wb") as file:
+            file.write(
+                self.HEADER.pack(
+                    self.MAGIC, self.SLOT_SIZE, self.max_logs, len(records)
+                )
+            )
+            file.write(b"".join(records))
+            file.truncate(self.HEADER.size + self.max_logs * self.SLOT_SIZE)
+        os.replace(temp_file, self.LOG_FILE)
+        with open(self.LOG_FILE, "r+b") as file:
+            self._map = (
+                mmap.mmap(file.fileno(), 0) if self.max_logs else None
+            )
+
+    def _slot(self, entry: dict) -> bytes:
+        """
+        Encodes an entry as the contents of a slot.
+
+        Args:
+            entry (dict): The log entry.
+
+        Returns:
+            bytes: The length-prefixed record, padded to SLOT_SIZE.
+
+        Raises:
+            ValueError: If the record does not fit in a slot.
+        """
+        record = frame(entry)
+        if len(record) > self.SLOT_SIZE:
+            raise ValueError("Roll too large for a log slot")
+        return record.ljust(self.SLOT_SIZE, b"\0")
+
+    def written(self) -> int:
+        """
+        Returns:
+            int: Number of rolls ever written to the ring buffer.
+        """
+        if self._map is None:
+            return 0
+        return self.HEADER.unpack_from(self._map)[3]
+
+    def read_slot(self, slot: int) -> dict:
+        """
+        Decodes the entry held by a slot.
+
+        Args:
+            slot (int): Number of the slot.
+
+        Returns:
+            dict: The entry.
+        """
+        offset = self.HEADER.size + slot * self.SLOT_SIZE
+        (length,) = RECORD_LENGTH.unpack_from(self._map, offset)
+        offset += RECORD_LENGTH.size
+        return decode_entry(self._map[offset:offset + length])
+
+    def save_logs(self) -> None:
+        """
+        Rewrites the ring buffer with the current logs.
+
+        The view is kept as it is; logs replaced by a list are written
+        out and replaced by a view again.
+        """
+        if not isinstance(self.logs, RingView):
+            self._create(list(self.logs))
+            self.logs = RingView(self)
+        elif self._map is not None:
+            self._map.flush()
+
+    def append_logs(self, entries: list[dict]) -> None:
+        """
+        Writes entries over the oldest slots, then advances the count.
+
+        Args:
+            entries (list): Log entries as produced by log_roll. Entries
+                that do not fit in a slot are left out.
+        """
+        if self._map is None:
+            return
+        slots = []
+        for entry in entries:
+            try:
+                slots.append(self._slot(entry))
+            except ValueError:
+                continue
+        written = self.written()
+        for slot in slots[-self.max_logs:]:
+            offset = self.HEADER.size + written % self.max_logs * self.SLOT_SIZE
+            self._map[offset:offset + self.SLOT_SIZE] = slot
+            written += 1
+        self._map[:self.HEADER.size] = self.HEADER.pack(
+            self.MAGIC, self.SLOT_SIZE, self.max_logs, written
+        )
+
+    def get_roll_by_hash(self, roll_hash: str) -> Optional[dict[str, str]]:
+        """
+        Retrieves a roll from the ring buffer based on its hash, comparing
+            the binary hashes in the slots and decoding only the match.
+
+        Args:
+            roll_hash (str): The hash of the roll to be retrieved.
+
+        Returns:
+            dict: The roll data associated with the provided hash.
+                None if the roll is not found, or if roll_hash is not
+                a complete hash.
+        """
+        if len(roll_hash) != 2 * self.DIGEST_SIZE:
+            return None
+        try:
+            digest = bytes.fromhex(roll_hash)
+        except ValueError:
+            return None
+        start = self.HEADER.size + RECORD_LENGTH.size
+        for slot in range(len(self.logs)):
+            offset = start + slot * self.SLOT_SIZE
+            if self._map[offset:offset + self.DIGEST_SIZE] == digest:
+                return self.read_slot(slot)["roll_data"]
+        return None
+
+
+class SqliteRollLogger(RollLogger):
+    """
+    Roll logger backed by an SQLite database in WAL mode.
+
+    Every roll is kept, or the most recent retention rolls if a retention
+    is set. Each batch of entries is inserted in a single transaction, and
+    indexes on hash, room, user and time keep lookups and history queries
+    independent of the size of the log. logs holds only the max_logs most
+    recent entries, which RollStore serves from memory.
+
+    Every thread uses its own connection, so the background writer can
+    insert while the event loop reads.
+
+    Attributes:
+        LOG_FILE (str): Name of the database file.
+        LEGACY_LOG_FILE (str): JSON-lines journal imported into a new database.
+        retention (int, optional): Number of most recent rolls kept in the
+            database, or None to keep every roll.
+    """
+
+    LOG_FILE: str = "dice_rolls.sqlite3"
+    LEGACY_LOG_FILE: str = JsonlRollLogger.LOG_FILE
+    INDEXED: bool = True
+    SCHEMA: tuple[str, ...] = (
+        "CREATE TABLE IF NOT EXISTS rolls ("
+        " id INTEGER PRIMARY KEY,"
+        " hash TEXT NOT NULL,"
+        " time TEXT NOT NULL,"
+        " room TEXT,"
+        " user TEXT,"
+        " roll_data TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS rolls_hash ON rolls (hash)",
+        "CREATE INDEX IF NOT EXISTS rolls_room ON rolls (room, user, id)",
+        "CREATE INDEX IF NOT EXISTS rolls_user ON rolls (user, id)",
+        "CREATE INDEX IF NOT EXISTS rolls_time ON rolls (time)",
+    )
+
+    def __init__(
+        self, max_logs: Optional[int] = None, retention: Optional[int] = None
+    ) -> None:
+        """
+        Opens the database, creating it if needed, and loads
+            the most recent entries.
+
+        Args:
+            max_logs (int, optional): Number of most recent rolls kept in logs.
+            retention (int, optional): Number of most recent rolls kept in
+                the database. Defaults to keeping every roll.
+        """
+        self.retention: Optional[int] = retention
+        self._local: threading.local = threading.local()
+        super().__init__(max_logs)
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Returns the calling thread's connection, opening it on first use.
+
+        Returns:
+            sqlite3.Connection: The connection.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.LOG_FILE, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def load_logs(self) -> list:
+        """
+        Creates the schema if needed and loads the most recent entries.
+        If the database is new, the JSON-lines journal is imported.
+
+        Returns:
+            list: Up to max_logs most recent log entries, oldest first.
+        """
+        connection = self._connection()
+        with connection:
+            for statement in self.SCHEMA:
+                connection.execute(statement)
+        if connection.execute("SELECT 1 FROM rolls LIMIT 1").fetchone() is None:
+            self._import_legacy_logs()
+        rows = connection.execute(
+            "SELECT hash, time, roll_data FROM rolls ORDER BY id DESC LIMIT ?",
+            (self.max_logs,),
+        ).fetchall()
+        return [self._entry(row) for row in reversed(rows)]
+
+    def _import_legacy_logs(self) -> None:
+        """
+        Inserts every entry of the JSON-lines journal.
+        """
+        entries = []
+        try:
+            with open(self.LEGACY_LOG_FILE, "r", encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if is_log_entry(entry):
+                        entries.append(entry)
+        except FileNotFoundError:
+            return
+        self._insert(entries)
+
+    @staticmethod
+    def _entry(row: tuple) -> dict:
+        """
+        Builds a log entry from a database row.
+
+        Args:
+            row (tuple): The hash, time and JSON roll data of a roll.
+
+        Returns:
+            dict: The entry with its "hash", "time" and "roll_data" keys.
+        """
+        return {"hash": row[0], "time": row[1], "roll_data": json.loads(row[2])}
+
+    def _insert(self, entries: list[dict]) -> None:
+        """
+        Inserts entries in a single transaction and applies the retention.
+
+        Args:
+            entries (list): Log entries as produced by log_roll.
+        """
+        connection = self._connection()
+        with connection:
+            connection.executemany(
+                "INSERT INTO rolls (hash, time, room, user, roll_data)"
+                " VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        entry["hash"],
+                        entry["time"],
+                        entry["roll_data"].get("room"),
+                        entry["roll_data"].get("user"),
+                        json.dumps(entry["roll_data"]),
+                    )
+                    for entry in entries
+                ],
+            )
+            if self.retention is not None:
+                connection.execute(
+                    "DELETE FROM rolls"
+                    " WHERE id <= (SELECT MAX(id) FROM rolls) - ?",
+                    (self.retention,),
+                )
+
+    def save_logs(self) -> None:
+        """
+        Inserts the entries of logs that are not in the database yet.
+        """
+        connection = self._connection()
+        stored = {
+            row[0]
+            for row in connection.execute(
+                "SELECT hash FROM rolls ORDER BY id DESC LIMIT ?",
+                (len(self.logs),),
+            )
+        }
+        self._insert(
+            [
+                entry
+                for entry in self.logs
+                if isinstance(entry, dict) and entry.get("hash") not in stored
+            ]
+        )
+
+    def append_logs(self, entries: list[dict]) -> None:
+        """
+        Inserts entries in a single transaction.
+
+        Args:
+            entries (list): Log entries as produced by log_roll.
+        """
+        self.logs.extend(entries)
+        overflow = len(self.logs) - self.max_logs
+        if overflow > 0:
+            del self.logs[:overflow]
+        self._insert(entries)
+
+    def get_roll_by_hash(self, roll_hash: str) -> Optional[dict[str, str]]:
+        """
+        Retrieves a roll from the database based on its hash.
+
+        Args:
+            roll_hash (str): The hash of the roll to be retrieved.
+
+        Returns:
+            dict: The roll data associated with the provided hash.
+                None if the roll is not found.
+        """
+        row = (
+            self._connection()
+            .execute(
+                "SELECT roll_data FROM rolls WHERE hash = ?"
+                " ORDER BY id DESC LIMIT 1",
+                (roll_hash,),
+            )
+            .fetchone()
+        )
+        return json.loads(row[0]) if row else None
+
+    def history(
+        self,
+        room: Optional[str] = None,
+        user: Optional[str] = None,
+        limit: int = 10,
+    ) -> list[dict]:
+        """
+        Retrieves the most recent log entries, optionally of one room or user,
+            through the room and user indexes.
+
+        Args:
+            room (str, optional): Only entries of rolls made in this room.
+            user (str, optional): Only entries of rolls made by this user.
+            limit (int): Maximum number of entries.
+
+        Returns:
+            list[dict]: The matching entries, newest first.
+        """
+        conditions = []
+        parameters: list = []
+        if room is not None:
+            conditions.append("room = ?")
+            parameters.append(room)
+        if user is not None:
+            conditions.append("user = ?")
+            parameters.append(user)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._connection().execute(
+            f"SELECT hash, time, roll_data FROM rolls{where}"
+            " ORDER BY id DESC LIMIT ?",
+            (*parameters, limit),
+        )
+        return [self._entry(row) for row in rows]
+
+
+ROLL_LOGGERS: dict[str, type[RollLogger]] = {
+    "json": RollLogger,
+    "jsonl": JsonlRollLogger,
+    "binary": BinaryRollLogger,
+    "ring": RingRollLogger,
+    "sqlite": SqliteRollLogger,
+}
+
+
+def create_roll_logger(name: str) -> RollLogger:
+    """
+    Creates the roll log backend of the given name.
+
+    Args:
+        name (str): Name of the backend, a key of ROLL_LOGGERS.
+
+    Returns:
+        RollLogger: The backend.
+
+    Raises:
+        ValueError: If no backend has that name.
+    """
+    backend = ROLL_LOGGERS.get(name)
+    if backend is None:
+        raise ValueError(
+            f"Unknown roll_log '{name}', expected one of: {', '.join(ROLL_LOGGERS)}"
+        )
+    return backend()
+
 
 class BotLogger:
     """
-    BotLogger is used to log the timestamp of the bot last response.
+    BotLogger keeps the watermarks of the last handled messages
+        and the Matrix sync token the bot resumes from.
+
+    Both are read from their files once and then kept in memory; updating
+    them does not touch the disk. persist writes them out, through the
+    BackgroundWriter if the logger has one, and is meant to be called
+    periodically rather than per event.
+
+    Every room has its own watermark, since rooms are handled concurrently
+    and a busy room may still have queued messages older than the last
+    message handled in another room. The global watermark is the latest of
+    them and applies to rooms without a watermark of their own.
 
     Attributes:
-        timestamp_file (str): The name of the file where the timestamp
-            of the last response is stored.
+        timestamp_file (str): The name of the file where the timestamps
+            of the last handled messages are stored.
+        sync_token_file (str): The name of the file where the sync token
+            is stored.
+        writer (BackgroundWriter, optional): Writer performing the file writes,
+            or None to write on the calling thread.
     """
 
     def __init__(
-        self, timestamp_file: str = "last_response_timestamp.txt"
+        self,
+        timestamp_file: str = "last_response_timestamp.txt",
+        writer: Optional[BackgroundWriter] = None,
+        sync_token_file: str = "sync_token.txt",
     ) -> None:
         """
-        Initializes the BotLogger object with an optional file to store the timestamp.
+        Initializes the BotLogger object with optional files to store
+            the timestamps and the sync token.
 
         Args:
-            timestamp_file (str), optional: name of the file to store the timestamp.
+            timestamp_file (str), optional: name of the file to store the timestamps.
+            writer (BackgroundWriter), optional: writer performing the file writes.
+            sync_token_file (str), optional: name of the file to store the sync token.
         """
         self.timestamp_file: str = timestamp_file
+        self.sync_token_file: str = sync_token_file
+        self.writer: Optional[BackgroundWriter] = writer
+        self._last_timestamp: Optional[datetime.datetime] = None
+        self._initial_timestamp: Optional[datetime.datetime] = None
+        self._room_timestamps: dict[str, datetime.datetime] = {}
+        self._sync_token: Optional[str] = None
 
-    def save_timestamp(self) -> None:
+    def save_timestamp(
+        self,
+        timestamp: Optional[datetime.datetime] = None,
+        room_id: Optional[str] = None,
+    ) -> None:
         """
-        Saves the current timestamp to a file.
+        Advances the in-memory watermarks; they never move backwards.
 
-        Raises:
-            IOError: If the file cannot be written to.
+        Args:
+            timestamp (datetime.datetime, optional): Time of the handled
+                message. Defaults to the current time.
+            room_id (str, optional): The room of the handled message,
+                whose watermark is advanced with the global one.
         """
-        with open(self.timestamp_file, "w", encoding='utf-8') as file:
-            file.write(str(datetime.datetime.now()))
+        timestamp = timestamp or datetime.datetime.now()
+        if timestamp > self.get_last_timestamp():
+            self._last_timestamp = timestamp
+        if room_id is not None and timestamp > self.track_room(room_id):
+            self._room_timestamps[room_id] = timestamp
 
     def get_last_timestamp(self) -> datetime.datetime:
         """
-        Reads and returns the last timestamp from the file.
+        Returns the global watermark, reading the file only once.
 
         Returns:
             datetime.datetime: The last timestamp from the file.
@@ -142,9 +1043,118 @@ class BotLogger:
         Raises:
             IOError: If the file cannot be read from.
         """
+        if self._last_timestamp is None:
+            self._read_timestamps()
+        return self._last_timestamp
+
+    def track_room(self, room_id: str) -> datetime.datetime:
+        """
+        Returns the watermark of a room. A room without one starts at the
+            global watermark read from the file, and is written out with
+            the others from then on, so its queued messages are handled
+            after a restart even if other rooms got further.
+
+        Args:
+            room_id (str): The room.
+
+        Returns:
+            datetime.datetime: Time of the last handled message of the room.
+        """
+        watermark = self._room_timestamps.get(room_id)
+        if watermark is None:
+            self.get_last_timestamp()
+            watermark = self._room_timestamps[room_id] = self._initial_timestamp
+        return watermark
+
+    def _read_timestamps(self) -> None:
+        """
+        Reads the watermarks from the file: a JSON object with the global
+            "default" and the "rooms" watermarks, or a single timestamp as
+            written by earlier versions. A missing or invalid file gives
+            1900-01-01.
+        """
+        initial = datetime.datetime(year=1900, month=1, day=1)
+        rooms: dict[str, datetime.datetime] = {}
         try:
             with open(self.timestamp_file, "r", encoding='utf-8') as file:
-                last_timestamp = file.read().strip()
-                return datetime.datetime.fromisoformat(last_timestamp)
-        except (FileNotFoundError, ValueError):
-            return datetime.datetime(year=1900, month=1, day=1)
+                text = file.read().strip()
+            if text.startswith("{"):
+                data = json.loads(text)
+                initial = datetime.datetime.fromisoformat(data["default"])
+                rooms = {
+                    room_id: datetime.datetime.fromisoformat(timestamp)
+                    for room_id, timestamp in data.get("rooms", {}).items()
+                }
+            else:
+                initial = datetime.datetime.fromisoformat(text)
+        except (FileNotFoundError, ValueError, KeyError, TypeError):
+            pass
+        self._initial_timestamp = self._last_timestamp = initial
+        self._room_timestamps = rooms
+
+    def save_sync_token(self, token: Optional[str]) -> None:
+        """
+        Remembers the sync token to resume from; persist writes it out.
+
+        Args:
+            token (str, optional): The next_batch token of a handled sync.
+        """
+        if token:
+            self._sync_token = token
+
+    def load_sync_token(self) -> Optional[str]:
+        """
+        Returns the sync token, reading it from the file only once.
+
+        Returns:
+            str: The stored sync token, or None if there is none.
+        """
+        if self._sync_token is None:
+            try:
+                with open(self.sync_token_file, "r", encoding='utf-8') as file:
+                    self._sync_token = file.read().strip() or None
+            except FileNotFoundError:
+                return None
+        return self._sync_token
+
+    def persist(self) -> None:
+        """
+        Writes the watermarks and the sync token to their files.
+
+        Raises:
+            IOError: If a file cannot be written to
+                and the logger has no writer.
+        """
+        writes = {
+            self.timestamp_file: json.dumps(
+                {
+                    "default": self.get_last_timestamp().isoformat(),
+                    "rooms": {
+                        room_id: timestamp.isoformat()
+                        for room_id, timestamp in self._room_timestamps.items()
+                    },
+                }
+            )
+        }
+        if self._sync_token:
+            writes[self.sync_token_file] = self._sync_token
+        for file_name, content in writes.items():
+            if self.writer is None:
+                self._write(file_name, content)
+            else:
+                self.writer.submit(
+                    file_name,
+                    lambda name=file_name, text=content: self._write(name, text),
+                )
+
+    @staticmethod
+    def _write(file_name: str, content: str) -> None:
+        """
+        Writes text to a file.
+
+        Args:
+            file_name (str): The file to write.
+            content (str): The text to write.
+        """
+        with open(file_name, "w", encoding='utf-8') as file:
+            file.write(content)
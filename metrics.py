@@ -0,0 +1,481 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+)
+
+
+class Metric:
+    """
+    Base class of a named metric with one optional label.
+
+    Attributes:
+        name (str): Metric name in the Prometheus exposition format.
+        documentation (str): Help text of the metric.
+        label (str, optional): Name of the label the values are split by.
+        KIND (str): Prometheus metric type.
+    """
+
+    KIND: str = "untyped"
+
+    def __init__(
+        self, name: str, documentation: str, label: Optional[str] = None
+    ) -> None:
+        """
+        Initializes the metric.
+
+        Args:
+            name (str): Metric name.
+            documentation (str): Help text of the metric.
+            label (str, optional): Name of the label the values are split by.
+        """
+        self.name: str = name
+        self.documentation: str = documentation
+        self.label: Optional[str] = label
+        self._lock: threading.Lock = threading.Lock()
+
+    def _labels(self, value: Optional[str], extra: str = "") -> str:
+        """
+        Formats the label set of a sample.
+
+        Args:
+            value (str, optional): Value of the metric's label.
+            extra (str): Additional label pairs, already formatted.
+
+        Returns:
+            str: The label set in braces, or an empty string.
+        """
+        pairs = [extra] if extra else []
+        if self.label is not None and value is not None:
+            escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+            pairs.insert(0, f'{self.label}="{escaped}"')
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> list[str]:
+        """
+        Returns the sample lines of the metric.
+
+        Returns:
+            list[str]: Lines in the Prometheus exposition format.
+        """
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """
+        Renders the metric with its help and type lines.
+
+        Returns:
+            str: The metric in the Prometheus exposition format.
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.KIND}",
+        ]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    """
+    A monotonically increasing count, optionally split by a label.
+    """
+
+    KIND: str = "counter"
+
+    def __init__(
+        self, name: str, documentation: str, label: Optional[str] = None
+    ) -> None:
+        """
+        Initializes the counter at zero.
+
+        Args:
+            name (str): Metric name.
+            documentation (str): Help text of the metric.
+            label (str, optional): Name of the label the values are split by.
+        """
+        super().__init__(name, documentation, label)
+        self._values: dict[Optional[str], float] = {}
+
+    def inc(self, label_value: Optional[str] = None, amount: float = 1) -> None:
+        """
+        Increases the counter.
+
+        Args:
+            label_value (str, optional): Value of the metric's label.
+            amount (float): Amount to add.
+        """
+        with self._lock:
+            self._values[label_value] = (
+                self._values.get(label_value, 0) + amount
+            )
+
+    def value(self, label_value: Optional[str] = None) -> float:
+        """
+        Returns the current count.
+
+        Args:
+            label_value (str, optional): Value of the metric's label.
+
+        Returns:
+            float: The count.
+        """
+        return self._values.get(label_value, 0)
+
+    def samples(self) -> list[str]:
+        """
+        Returns the sample lines of the counter.
+
+        Returns:
+            list[str]: One line per label value.
+        """
+        with self._lock:
+            values = sorted(self._values.items(), key=lambda item: item[0] or "")
+        return [
+            f"{self.name}{self._labels(label_value)} {count}"
+            for label_value, count in values
+        ]
+
+
+class Gauge(Metric):
+    """
+    A value that goes up and down, either set directly or read
+        from a function at render time.
+    """
+
+    KIND: str = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        function: Optional[Callable[[], float]] = None,
+    ) -> None:
+        """
+        Initializes the gauge at zero.
+
+        Args:
+            name (str): Metric name.
+            documentation (str): Help text of the metric.
+            function (Callable, optional): Called at render time for the value.
+        """
+        super().__init__(name, documentation)
+        self.function: Optional[Callable[[], float]] = function
+        self._value: float = 0
+
+    def set(self, value: float) -> None:
+        """
+        Sets the gauge.
+
+        Args:
+            value (float): The new value.
+        """
+        self._value = value
+
+    def value(self) -> float:
+        """
+        Returns the current value.
+
+        Returns:
+            float: The value.
+        """
+        return self.function() if self.function else self._value
+
+    def samples(self) -> list[str]:
+        """
+        Returns the sample line of the gauge.
+
+        Returns:
+            list[str]: The single sample line.
+        """
+        return [f"{self.name} {self.value()}"]
+
+
+class Histogram(Metric):
+    """
+    Distribution of observed values in cumulative buckets,
+        optionally split by a label.
+
+    Attributes:
+        buckets (tuple): Upper bounds of the buckets, ascending.
+    """
+
+    KIND: str = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label: Optional[str] = None,
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        """
+        Initializes an empty histogram.
+
+        Args:
+            name (str): Metric name.
+            documentation (str): Help text of the metric.
+            label (str, optional): Name of the label the values are split by.
+            buckets (tuple): Upper bounds of the buckets, ascending.
+        """
+        super().__init__(name, documentation, label)
+        self.buckets: tuple[float, ...] = buckets
+        self._counts: dict[Optional[str], list[int]] = {}
+        self._sums: dict[Optional[str], float] = {}
+
+    def observe(self, value: float, label_value: Optional[str] = None) -> None:
+        """
+        Records an observation.
+
+        Args:
+            value (float): The observed value.
+            label_value (str, optional): Value of the metric's label.
+        """
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(label_value)
+            if counts is None:
+                counts = self._counts[label_value] = [0] * (len(self.buckets) + 1)
+            counts[index] += 1
+            self._sums[label_value] = self._sums.get(label_value, 0) + value
+
+    @contextmanager
+    def time(self, label_value: Optional[str] = None) -> Iterator[None]:
+        """
+        Observes the duration of the enclosed block in seconds.
+
+        Args:
+            label_value (str, optional): Value of the metric's label.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, label_value)
+
+    def count(self, label_value: Optional[str] = None) -> int:
+        """
+        Returns the number of observations.
+
+        Args:
+            label_value (str, optional): Value of the metric's label.
+
+        Returns:
+            int: The number of observations.
+        """
+        return sum(self._counts.get(label_value, ()))
+
+    def samples(self) -> list[str]:
+        """
+        Returns the bucket, sum and count lines of the histogram.
+
+        Returns:
+            list[str]: The sample lines for every label value.
+        """
+        with self._lock:
+            snapshot = {
+                label_value: (list(counts), self._sums[label_value])
+                for label_value, counts in self._counts.items()
+            }
+        lines = []
+        for label_value, (counts, total) in sorted(
+            snapshot.items(), key=lambda item: item[0] or ""
+        ):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                upper = "+Inf" if bound == float("inf") else repr(bound)
+                bucket_label = self._labels(label_value, f'le="{upper}"')
+                lines.append(f"{self.name}_bucket{bucket_label} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(label_value)} {total}")
+            lines.append(
+                f"{self.name}_count{self._labels(label_value)} {cumulative}"
+            )
+        return lines
+
+
+class MetricsRegistry:
+    """
+    A collection of metrics rendered together.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes an empty registry.
+        """
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """
+        Adds a metric to the registry.
+
+        Args:
+            metric (Metric): The metric to add.
+
+        Returns:
+            Metric: The same metric, for assignment at definition.
+
+        Raises:
+            ValueError: If a metric with the same name is already registered.
+        """
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[Metric]:
+        """
+        Looks up a metric by name.
+
+        Args:
+            name (str): The metric name.
+
+        Returns:
+            Metric: The metric, or None if it is not registered.
+        """
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """
+        Renders every metric.
+
+        Returns:
+            str: All metrics in the Prometheus text exposition format.
+        """
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+class MetricsServer:
+    """
+    Minimal HTTP server answering every GET request with the rendered registry.
+
+    Attributes:
+        registry (MetricsRegistry): The metrics to expose.
+        host (str): Interface to listen on.
+        port (int): Port to listen on.
+    """
+
+    def __init__(
+        self, registry: MetricsRegistry, host: str = "127.0.0.1", port: int = 9464
+    ) -> None:
+        """
+        Initializes the server.
+
+        Args:
+            registry (MetricsRegistry): The metrics to expose.
+            host (str): Interface to listen on. Defaults to localhost only.
+            port (int): Port to listen on.
+        """
+        self.registry: MetricsRegistry = registry
+        self.host: str = host
+        self.port: int = port
+        self._server: Optional[asyncio.base_events.Server] = None
+
+    async def start(self) -> None:
+        """
+        Starts listening.
+        """
+        self._server = await asyncio.start_server(
+            self._handle, self.host, self.port
+        )
+
+    async def close(self) -> None:
+        """
+        Stops listening.
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """
+        Answers a single HTTP request and closes the connection.
+
+        Args:
+            reader (asyncio.StreamReader): The request stream.
+            writer (asyncio.StreamWriter): The response stream.
+        """
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()).strip():
+                pass
+            if request_line.startswith(b"GET "):
+                status, body = "200 OK", self.registry.render().encode()
+            else:
+                status, body = "405 Method Not Allowed", b""
+            writer.write(
+                f"HTTP/1.1 {status}\r\n"
+                "Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+REGISTRY: MetricsRegistry = MetricsRegistry()
+
+COMMANDS: Counter = REGISTRY.register(
+    Counter("dicebot_commands_total", "Commands handled, by command.", "command")
+)
+ROLLS: Counter = REGISTRY.register(
+    Counter("dicebot_rolls_total", "Rolls made, by roll type.", "roll_type")
+)
+RATE_LIMITED: Counter = REGISTRY.register(
+    Counter(
+        "dicebot_rate_limited_total",
+        "Commands rejected by the rate limits, by exhausted limit.",
+        "limit",
+    )
+)
+MESSAGES: Counter = REGISTRY.register(
+    Counter(
+        "dicebot_messages_total",
+        "Replies built, and messages sent for them once coalesced.",
+        "kind",
+    )
+)
+STAGE_SECONDS: Histogram = REGISTRY.register(
+    Histogram(
+        "dicebot_stage_seconds",
+        "Time spent in each stage of the command pipeline.",
+        "stage",
+    )
+)
+SYNC_LAG_SECONDS: Gauge = REGISTRY.register(
+    Gauge(
+        "dicebot_sync_lag_seconds",
+        "Delay between the server timestamp of the last handled message "
+        "and its handling.",
+    )
+)
+ROLL_LOG_ENTRIES: Gauge = REGISTRY.register(
+    Gauge("dicebot_roll_log_entries", "Rolls held in the roll store.")
+)
+ROLL_LOG_PENDING: Gauge = REGISTRY.register(
+    Gauge("dicebot_roll_log_pending", "Rolls not yet written to the roll log.")
+)
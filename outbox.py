@@ -0,0 +1,153 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+from typing import Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class RoomOutbox:
+    """
+    Coalesces the replies sent to a room within a short window into one message.
+
+    The first reply to a quiet room is sent at once and opens a window of
+    window seconds. Replies put during the window are held and sent together,
+    one per line, when it ends, which opens the next window; the room is
+    quiet again once a window ends with nothing held. Held replies are also
+    sent early when the next one would make the message longer than
+    max_length. Every reply keeps its own line, starting with the user
+    it answers, and replies of a room are sent in the order they were put.
+
+    Attributes:
+        send (Callable): Coroutine function sending a message to a room,
+            called with the room id and the body of the message.
+        window (float): Seconds replies are held for, or 0 to send every
+            reply at once.
+        max_length (int): Length above which held replies are not joined.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[str, str], Awaitable[None]],
+        window: float = 0.25,
+        max_length: int = 4000,
+    ) -> None:
+        """
+        Initializes the outbox.
+
+        Args:
+            send (Callable): Coroutine function sending a message to a room.
+            window (float): Seconds replies are held for, or 0 to send
+                every reply at once.
+            max_length (int): Length above which held replies are not joined.
+        """
+        self.send: Callable[[str, str], Awaitable[None]] = send
+        self.window: float = window
+        self.max_length: int = max_length
+        self._held: dict[str, list[str]] = {}
+        self._held_length: dict[str, int] = {}
+        self._windows: dict[str, asyncio.Task] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._closing: asyncio.Event = asyncio.Event()
+
+    async def put(self, room_id: str, message: str) -> None:
+        """
+        Sends a reply to a room, or holds it until the room's window ends.
+
+        Args:
+            room_id (str): Id of the room.
+            message (str): The reply.
+        """
+        if self.window <= 0 or self._closing.is_set():
+            await self._send(room_id, [message])
+            return
+        if room_id not in self._windows:
+            self._windows[room_id] = asyncio.create_task(self._hold(room_id))
+            await self._send(room_id, [message])
+            return
+        held = self._held.setdefault(room_id, [])
+        length = self._held_length.get(room_id, 0) + len(message) + 1
+        if held and length > self.max_length + 1:
+            # Hold the reply before sending the others, so that the window
+            # still sends it if it ends while they are being sent.
+            overflow = self._take(room_id)
+            self._held[room_id] = [message]
+            self._held_length[room_id] = len(message) + 1
+            await self._send(room_id, overflow)
+            return
+        held.append(message)
+        self._held_length[room_id] = length
+
+    async def close(self) -> None:
+        """
+        Sends every held reply and waits for the windows to end. Replies
+            put afterwards are sent at once.
+        """
+        self._closing.set()
+        while self._windows:
+            await asyncio.gather(*self._windows.values())
+
+    def _take(self, room_id: str) -> list[str]:
+        """
+        Removes the held replies of a room.
+
+        Args:
+            room_id (str): Id of the room.
+
+        Returns:
+            list[str]: The held replies, in the order they were put.
+        """
+        self._held_length.pop(room_id, None)
+        return self._held.pop(room_id, [])
+
+    async def _hold(self, room_id: str) -> None:
+        """
+        Sends the replies held in each window of a room, until a window
+            ends with nothing held or the outbox is closed.
+
+        Args:
+            room_id (str): Id of the room.
+        """
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self._closing.wait(), self.window)
+                except asyncio.TimeoutError:
+                    pass
+                held = self._take(room_id)
+                if not held:
+                    return
+                try:
+                    await self._send(room_id, held)
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Failed to send replies to %s", room_id)
+        finally:
+            del self._windows[room_id]
+
+    async def _send(self, room_id: str, messages: list[str]) -> None:
+        """
+        Sends replies to a room as one message, after the messages
+            already being sent to it.
+
+        Args:
+            room_id (str): Id of the room.
+            messages (list[str]): The replies.
+        """
+        lock = self._locks.get(room_id)
+        if lock is None:
+            lock = self._locks[room_id] = asyncio.Lock()
+        async with lock:
+            await self.send(room_id, "\n".join(messages))
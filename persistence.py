@@ -0,0 +1,116 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWriter:
+    """
+    Runs blocking file writes on a dedicated thread.
+
+    Writes are submitted under a key. A write that is still waiting when
+    another one with the same key is submitted is replaced by it, so bursts
+    of updates to the same file collapse into a single write of the latest
+    state. Writes run in submission order of their keys.
+
+    Attributes:
+        name (str): Name of the writer thread.
+    """
+
+    def __init__(self, name: str = "background-writer") -> None:
+        """
+        Initializes the writer and starts its thread.
+
+        Args:
+            name (str): Name of the writer thread.
+        """
+        self.name: str = name
+        self._pending: dict[str, Callable[[], None]] = {}
+        self._condition: threading.Condition = threading.Condition()
+        self._busy: bool = False
+        self._closed: bool = False
+        self._thread: threading.Thread = threading.Thread(
+            target=self._run, name=name, daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, key: str, write: Callable[[], None]) -> None:
+        """
+        Schedules a write, replacing a pending write with the same key.
+
+        Args:
+            key (str): Identifies what is written, usually the file name.
+            write (Callable): Function performing the write.
+
+        Raises:
+            RuntimeError: If the writer has been closed.
+        """
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("The writer has been closed")
+            self._pending[key] = write
+            self._condition.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Blocks until every write submitted so far has been performed.
+
+        Args:
+            timeout (float, optional): Maximum number of seconds to wait.
+
+        Returns:
+            bool: True if all writes were performed, False on timeout.
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: not self._pending and not self._busy, timeout
+            )
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Performs the remaining writes and stops the writer thread.
+
+        Args:
+            timeout (float, optional): Maximum number of seconds to wait.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        """
+        Performs submitted writes until the writer is closed.
+        """
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._pending or self._closed
+                )
+                if not self._pending:
+                    return
+                writes, self._pending = self._pending, {}
+                self._busy = True
+            for key, write in writes.items():
+                try:
+                    write()
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Failed to write %s", key)
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
@@ -0,0 +1,181 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from types import FrameType
+from typing import Optional
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that samples the stacks of every thread
+        from a daemon thread and writes them as collapsed stacks.
+
+    Each snapshot file holds one line per distinct stack, the frames
+    joined by semicolons from the thread down to the innermost call and
+    followed by the number of samples, the input format of flamegraph.pl
+    and speedscope. Sampling only reads the interpreter's frames, so the
+    profiled code runs unmodified and the overhead is bounded by the
+    sampling interval.
+
+    Attributes:
+        output_dir (str): Directory the snapshots are written to.
+        interval (float): Seconds between samples.
+        snapshot_interval (float): Seconds between snapshot files.
+        duration (float, optional): Seconds after which sampling stops,
+            or None to sample until stop is called.
+        stacks (Counter): Samples per collapsed stack since the last snapshot.
+    """
+
+    ENV_VARIABLE: str = "DICEBOT_PROFILE"
+
+    def __init__(
+        self,
+        output_dir: str = "profiles",
+        interval: float = 0.005,
+        snapshot_interval: float = 60.0,
+        duration: Optional[float] = None,
+    ) -> None:
+        """
+        Initializes the profiler.
+
+        Args:
+            output_dir (str): Directory the snapshots are written to.
+            interval (float): Seconds between samples.
+            snapshot_interval (float): Seconds between snapshot files.
+            duration (float, optional): Seconds after which sampling stops.
+                Defaults to sampling until stop is called.
+        """
+        self.output_dir: str = output_dir
+        self.interval: float = interval
+        self.snapshot_interval: float = snapshot_interval
+        self.duration: Optional[float] = duration
+        self.stacks: Counter = Counter()
+        self._stop: threading.Event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_environment(cls) -> Optional["SamplingProfiler"]:
+        """
+        Creates a profiler if the DICEBOT_PROFILE environment variable is set.
+
+        The variable holds the profiling window in seconds; any other
+        non-empty value profiles until shutdown.
+
+        Returns:
+            SamplingProfiler: The profiler, or None if the variable is unset.
+        """
+        value = os.environ.get(cls.ENV_VARIABLE, "").strip()
+        if not value or value == "0":
+            return None
+        try:
+            duration: Optional[float] = float(value)
+        except ValueError:
+            duration = None
+        return cls(duration=duration)
+
+    def start(self) -> None:
+        """
+        Starts sampling.
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops sampling and writes the last snapshot.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def snapshot(self) -> Optional[str]:
+        """
+        Writes the samples collected since the last snapshot.
+
+        Returns:
+            str: Path of the written file, or None if there were no samples.
+        """
+        stacks, self.stacks = self.stacks, Counter()
+        if not stacks:
+            return None
+        path = os.path.join(
+            self.output_dir,
+            f"stacks-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}.txt",
+        )
+        with open(path, "w", encoding='utf-8') as file:
+            for stack, count in stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        return path
+
+    def sample(self) -> None:
+        """
+        Records the current stack of every thread except the profiler's own.
+        """
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own = threading.get_ident()
+        # The only way to read the stacks of other threads.
+        for ident, frame in sys._current_frames().items():  # pylint: disable=protected-access
+            if ident != own:
+                self.stacks[self._collapse(names.get(ident, str(ident)), frame)] += 1
+
+    @staticmethod
+    def _collapse(thread_name: str, frame: Optional[FrameType]) -> str:
+        """
+        Formats a stack as a single collapsed line.
+
+        Args:
+            thread_name (str): Name of the thread, used as the root frame.
+            frame (FrameType, optional): The innermost frame of the thread.
+
+        Returns:
+            str: The frames from the root down, joined by semicolons.
+        """
+        frames = []
+        while frame is not None:
+            code = frame.f_code
+            frames.append(
+                f"{code.co_name} ({os.path.basename(code.co_filename)}"
+                f":{code.co_firstlineno})"
+            )
+            frame = frame.f_back
+        frames.append(thread_name)
+        return ";".join(reversed(frames))
+
+    def _run(self) -> None:
+        """
+        Samples until stopped or until the profiling window has passed,
+            writing a snapshot every snapshot_interval seconds.
+        """
+        started = time.monotonic()
+        next_snapshot = started + self.snapshot_interval
+        while not self._stop.wait(self.interval):
+            self.sample()
+            now = time.monotonic()
+            if now >= next_snapshot:
+                self.snapshot()
+                next_snapshot = now + self.snapshot_interval
+            if self.duration is not None and now - started >= self.duration:
+                break
+        self.snapshot()
@@ -0,0 +1,274 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import re
+import time
+from collections import Counter
+from typing import Callable, Optional
+
+from face_pool import POOL_RATIO
+
+# Dice terms and the repetitions of /rollmany and of grouped expressions,
+# found without parsing the command.
+DICE_TERM = re.compile(r"(\d{1,9})d(\d{1,9})(e|i)?", re.IGNORECASE)
+ROLL_MANY = re.compile(r"/rollmany\s+(\d{1,9})", re.IGNORECASE)
+REPEAT = re.compile(r"\)\s*x\s*(\d{1,9})", re.IGNORECASE)
+# Commands whose arguments are a hash or a user name rather than dice.
+REPLAY = re.compile(r"/(?:reroll|audit|history|myrolls)\b", re.IGNORECASE)
+
+
+def command_cost(
+    body: str, dice_per_token: int = 100, chain_weight: int = 2
+) -> float:
+    """
+    Estimates the cost of a message in tokens, without parsing it.
+
+    A command costs one token, plus one per dice_per_token dice drawn:
+        pools of at least POOL_RATIO dice per side count as the number of
+        faces they are drawn by, exploding and imploding dice count
+        chain_weight times, and the dice are multiplied by the repetitions
+        of /rollmany and of groups such as "(4d6dl)x6". Commands replaying
+        logged rolls cost one token here, the rolls they replay being
+        charged once they are looked up.
+
+    Args:
+        body (str): The text of the message.
+        dice_per_token (int): Dice drawn for one token.
+        chain_weight (int): Weight of an exploding or imploding die.
+
+    Returns:
+        float: The cost, or 0 if the message is not a command.
+    """
+    if body[:1] != "/":
+        return 0.0
+    if REPLAY.match(body):
+        return 1.0
+    dice = 0
+    for count, sides, chain in DICE_TERM.findall(body):
+        drawn = min(int(count), POOL_RATIO * max(int(sides), 1))
+        dice += drawn * (chain_weight if chain else 1)
+    roll_many = ROLL_MANY.match(body)
+    if roll_many:
+        dice *= int(roll_many.group(1))
+    for repeat in REPEAT.findall(body):
+        dice *= int(repeat)
+    return 1.0 + dice / dice_per_token
+
+
+def roll_cost(
+    roll_data: dict, dice_per_token: int = 100, chain_weight: int = 2
+) -> float:
+    """
+    Estimates the cost in tokens of repeating a logged roll, as
+        command_cost does for the command that made it.
+
+    Args:
+        roll_data (dict): The logged data of the roll.
+        dice_per_token (int): Dice drawn for one token.
+        chain_weight (int): Weight of an exploding or imploding die.
+
+    Returns:
+        float: The cost.
+    """
+    roll_type = roll_data.get("type")
+    if roll_type == "rollmany":
+        body = f"/rollmany {roll_data['count']} {roll_data['expression']}"
+    elif roll_type == "expr":
+        body = f"/roll {roll_data['expression']}"
+    else:
+        chain = roll_type if roll_type in ("e", "i") else ""
+        body = f"/roll {roll_data['num_dice']}d{roll_data['sides']}{chain}"
+    return command_cost(body, dice_per_token, chain_weight)
+
+
+class TokenBucket:
+    """
+    Tokens refilled at a constant rate up to a capacity.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        capacity (float): Largest number of tokens, the allowed burst.
+        tokens (float): Tokens left at the time of the last update.
+        updated (float): Time of the last update.
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float) -> None:
+        """
+        Initializes a full bucket.
+
+        Args:
+            rate (float): Tokens added per second.
+            capacity (float): Largest number of tokens.
+            now (float): The current time.
+        """
+        self.rate: float = rate
+        self.capacity: float = capacity
+        self.tokens: float = capacity
+        self.updated: float = now
+
+    def refill(self, now: float) -> float:
+        """
+        Adds the tokens accrued since the last update.
+
+        Args:
+            now (float): The current time.
+
+        Returns:
+            float: Tokens available now.
+        """
+        accrued = (now - self.updated) * self.rate
+        self.tokens = min(self.capacity, self.tokens + accrued)
+        self.updated = now
+        return self.tokens
+
+
+class RateLimiter:
+    """
+    Token-bucket limits on the commands of each user and of each room.
+
+    A command is allowed when both the bucket of its sender and the bucket
+    of its room hold its cost, which is then taken from both; a rejected
+    command takes nothing. A cost above a bucket's capacity takes the whole
+    bucket, so an expensive command is allowed once the bucket is full.
+    A limit with a rate of 0 is disabled.
+
+    Rejected commands are counted per room and sender and reported in one
+    notice per room at most every notice_interval seconds.
+
+    Attributes:
+        user_rate (float): Tokens a user regains per second.
+        user_burst (float): Capacity of the bucket of a user.
+        room_rate (float): Tokens a room regains per second.
+        room_burst (float): Capacity of the bucket of a room.
+        notice_interval (float): Seconds between notices to a room,
+            or 0 for no notices.
+        clock (Callable): Returns the current time in seconds.
+        MAX_BUCKETS (int): Number of buckets above which full ones are dropped.
+    """
+
+    MAX_BUCKETS: int = 10000
+
+    def __init__(
+        self,
+        user_rate: float = 0.0,
+        user_burst: float = 10.0,
+        room_rate: float = 0.0,
+        room_burst: float = 30.0,
+        notice_interval: float = 10.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        """
+        Initializes the limiter.
+
+        Args:
+            user_rate (float): Tokens a user regains per second, 0 for no limit.
+            user_burst (float): Capacity of the bucket of a user.
+            room_rate (float): Tokens a room regains per second, 0 for no limit.
+            room_burst (float): Capacity of the bucket of a room.
+            notice_interval (float): Seconds between notices to a room,
+                or 0 for no notices.
+            clock (Callable): Returns the current time in seconds.
+        """
+        self.user_rate: float = user_rate
+        self.user_burst: float = user_burst
+        self.room_rate: float = room_rate
+        self.room_burst: float = room_burst
+        self.notice_interval: float = notice_interval
+        self.clock: Callable[[], float] = clock
+        self._users: dict[str, TokenBucket] = {}
+        self._rooms: dict[str, TokenBucket] = {}
+        self._rejected: dict[str, Counter] = {}
+        self._noticed: dict[str, float] = {}
+
+    @property
+    def enabled(self) -> bool:
+        """bool: Whether any limit is set."""
+        return self.user_rate > 0 or self.room_rate > 0
+
+    def allow(self, room_id: str, user: str, cost: float) -> Optional[str]:
+        """
+        Takes the cost of a command from the buckets of its sender and room.
+
+        Args:
+            room_id (str): The room the command was sent to.
+            user (str): The sender of the command.
+            cost (float): The cost of the command.
+
+        Returns:
+            str: None if the command is allowed, otherwise the exhausted
+                limit, "user" or "room".
+        """
+        now = self.clock()
+        buckets = []
+        for limit, rate, burst, pool, key in (
+            ("user", self.user_rate, self.user_burst, self._users, user),
+            ("room", self.room_rate, self.room_burst, self._rooms, room_id),
+        ):
+            if rate <= 0:
+                continue
+            bucket = pool.get(key)
+            if bucket is None:
+                if len(pool) >= self.MAX_BUCKETS:
+                    self._prune(pool, now)
+                bucket = pool[key] = TokenBucket(rate, burst, now)
+            if bucket.refill(now) < min(cost, bucket.capacity):
+                return limit
+            buckets.append(bucket)
+        for bucket in buckets:
+            bucket.tokens -= min(cost, bucket.capacity)
+        return None
+
+    def reject(self, room_id: str, user: str) -> Optional[str]:
+        """
+        Records a rejected command and builds the notice of the room,
+            if one is due.
+
+        Args:
+            room_id (str): The room the command was sent to.
+            user (str): The name of the sender shown in the notice.
+
+        Returns:
+            str: The notice listing the senders of the commands rejected
+                since the last notice, or None if no notice is due.
+        """
+        if self.notice_interval <= 0:
+            return None
+        rejected = self._rejected.setdefault(room_id, Counter())
+        rejected[user] += 1
+        now = self.clock()
+        noticed = self._noticed.get(room_id)
+        if noticed is not None and now - noticed < self.notice_interval:
+            return None
+        self._noticed[room_id] = now
+        del self._rejected[room_id]
+        return "Slow down! Ignored commands: " + ", ".join(
+            f"{name} x{count}" for name, count in rejected.most_common()
+        )
+
+    @staticmethod
+    def _prune(pool: dict[str, TokenBucket], now: float) -> None:
+        """
+        Drops the buckets that have refilled, as new ones would be full too.
+
+        Args:
+            pool (dict): The buckets by user or room.
+            now (float): The current time.
+        """
+        for key in [
+            key for key, bucket in pool.items()
+            if bucket.refill(now) >= bucket.capacity
+        ]:
+            del pool[key]
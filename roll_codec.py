@@ -0,0 +1,487 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compact binary encoding of roll log entries.
+
+A record is the entry's 16-byte binary hash, its time as microseconds
+since 1970-01-01 (naive, like the ISO time it replaces), the roll type
+and a bitmask of the roll data fields that follow, each in a fixed-width
+or length-prefixed form. The results of a dice pool are packed as one or
+two bytes per die, with a bitmask marking the dice replaced by a "DH",
+"DL", "KH" or "KL" marker. Results of other shapes, and any field this
+format does not know, are stored as JSON. The version of the sampling
+algorithm and the summary of the totals follow last, as records written
+before they were logged lack them.
+"""
+
+import argparse
+import datetime
+import json
+import struct
+from array import array
+from functools import lru_cache
+from typing import Iterator, Optional
+
+EPOCH: datetime.datetime = datetime.datetime(1970, 1, 1)
+MARKERS: tuple[str, ...] = ("DH", "DL", "KH", "KL")
+
+RECORD_LENGTH = struct.Struct("<I")
+HEADER = struct.Struct("<16sqI")
+POOL_HEADER = struct.Struct("<IBBqi")
+
+# Roll data fields in bit order, with their fixed-width format,
+# or None for length-prefixed UTF-8 text.
+FIELDS: tuple[tuple[str, Optional[struct.Struct]], ...] = (
+    ("num_dice", struct.Struct("<I")),
+    ("sides", struct.Struct("<I")),
+    ("modifier", struct.Struct("<q")),
+    ("threshold", struct.Struct("<q")),
+    ("seed", struct.Struct("<Q")),
+    ("counter", struct.Struct("<Q")),
+    ("count", struct.Struct("<I")),
+    ("room", None),
+    ("user", None),
+    ("expression", None),
+)
+FIELD_NAMES: frozenset = frozenset(name for name, _ in FIELDS)
+TEXT_LENGTH = struct.Struct("<H")
+BLOB_LENGTH = struct.Struct("<I")
+VERSION = struct.Struct("<H")
+
+RESULTS_BIT: int = 1 << len(FIELDS)
+EXTRA_BIT: int = RESULTS_BIT << 1
+VERSION_BIT: int = EXTRA_BIT << 1
+SUMMARY_BIT: int = VERSION_BIT << 1
+NONE_SHIFT: int = 16
+NONE_MASK: int = (RESULTS_BIT - 1) << NONE_SHIFT
+
+RESULTS_POOL: int = 0
+RESULTS_JSON: int = 1
+BIG_ENDIAN: bool = struct.pack("=H", 1) != struct.pack("<H", 1)
+
+
+def _pack_text(text: str, prefix: struct.Struct = TEXT_LENGTH) -> bytes:
+    """
+    Encodes text as its UTF-8 length followed by its bytes.
+
+    Args:
+        text (str): The text.
+        prefix (struct.Struct): Format of the length.
+
+    Returns:
+        bytes: The encoded text.
+    """
+    data = text.encode()
+    return prefix.pack(len(data)) + data
+
+
+def _unpack_text(
+    buffer: bytes, offset: int, prefix: struct.Struct = TEXT_LENGTH
+) -> tuple[str, int]:
+    """
+    Decodes length-prefixed text.
+
+    Args:
+        buffer (bytes): The record.
+        offset (int): Position of the length prefix.
+        prefix (struct.Struct): Format of the length.
+
+    Returns:
+        tuple: The text and the offset after it.
+    """
+    (length,) = prefix.unpack_from(buffer, offset)
+    offset += prefix.size
+    return buffer[offset:offset + length].decode(), offset + length
+
+
+def _is_pool(results) -> bool:
+    """
+    Checks whether results have the shape of a dice pool roll:
+        the dice or markers, then the total and the modifier.
+
+    Args:
+        results: The results of a roll.
+
+    Returns:
+        bool: True if the results can be packed as a pool.
+    """
+    if not (isinstance(results, (list, tuple)) and len(results) == 2):
+        return False
+    dice, totals = results
+    return (
+        isinstance(dice, (list, tuple))
+        and isinstance(totals, (list, tuple))
+        and len(totals) == 2
+        and all(isinstance(total, int) for total in totals)
+        and len({die for die in dice if isinstance(die, str)}) <= 1
+        and all(
+            die in MARKERS
+            if isinstance(die, str)
+            else isinstance(die, int) and 0 <= die < 1 << 16
+            for die in dice
+        )
+    )
+
+
+def _pack_pool(results) -> bytes:
+    """
+    Packs the results of a dice pool roll.
+
+    Args:
+        results: The dice or markers, then the total and the modifier.
+
+    Returns:
+        bytes: The packed results.
+    """
+    dice, (total, modifier) = results
+    marker = next((die for die in dice if isinstance(die, str)), MARKERS[0])
+    values = array("H", (0 if isinstance(die, str) else die for die in dice))
+    width = 1 if max(values, default=0) < 256 else 2
+    if width == 1:
+        values = array("B", values)
+    elif BIG_ENDIAN:
+        values.byteswap()
+    mask = bytearray((len(dice) + 7) // 8)
+    for index, die in enumerate(dice):
+        if isinstance(die, str):
+            mask[index >> 3] |= 1 << (index & 7)
+    return (
+        POOL_HEADER.pack(
+            len(dice), width, MARKERS.index(marker), total, modifier
+        )
+        + bytes(mask)
+        + values.tobytes()
+    )
+
+
+def _unpack_pool(buffer: bytes, offset: int) -> tuple[list, int]:
+    """
+    Unpacks the results of a dice pool roll.
+
+    Args:
+        buffer (bytes): The record.
+        offset (int): Position of the packed results.
+
+    Returns:
+        tuple: The results and the offset after them.
+    """
+    count, width, marker_index, total, modifier = POOL_HEADER.unpack_from(
+        buffer, offset
+    )
+    offset += POOL_HEADER.size
+    mask_length = (count + 7) // 8
+    mask = buffer[offset:offset + mask_length]
+    offset += mask_length
+    values = array("B" if width == 1 else "H")
+    values.frombytes(buffer[offset:offset + count * width])
+    if width == 2 and BIG_ENDIAN:
+        values.byteswap()
+    offset += count * width
+    dice: list = values.tolist()
+    if any(mask):
+        marker = MARKERS[marker_index]
+        for index in range(count):
+            if mask[index >> 3] >> (index & 7) & 1:
+                dice[index] = marker
+    return [dice, [total, modifier]], offset
+
+
+@lru_cache(maxsize=256)
+def _layout(present: int) -> tuple[tuple[tuple[str, ...], Optional[struct.Struct]], ...]:
+    """
+    Plans the decoding of the roll data fields marked in a presence mask.
+
+    Consecutive fixed-width fields are merged into a single struct, so
+    records of the same shape decode with few unpack calls.
+
+    Args:
+        present (int): The presence mask of a record.
+
+    Returns:
+        tuple: Steps of field names with the struct reading them, or None
+            for a text field. Fields stored as None form a last step
+            with a struct of zero size.
+    """
+    steps: list = []
+    missing: list = []
+    for bit, (name, field) in enumerate(FIELDS):
+        if not present >> bit & 1:
+            continue
+        if present >> (bit + NONE_SHIFT) & 1:
+            missing.append(name)
+        elif field is None:
+            steps.append(((name,), None))
+        elif steps and steps[-1][1] is not None:
+            names, merged = steps[-1]
+            steps[-1] = (
+                names + (name,),
+                struct.Struct(merged.format + field.format[1:]),
+            )
+        else:
+            steps.append(((name,), field))
+    if missing:
+        steps.append((tuple(missing), struct.Struct("<")))
+    return tuple(steps)
+
+
+def encode_entry(entry: dict) -> bytes:
+    """
+    Encodes a roll log entry.
+
+    Args:
+        entry (dict): The entry with its "hash", "time" and "roll_data" keys.
+
+    Returns:
+        bytes: The record, without its length prefix.
+    """
+    roll_data = entry["roll_data"]
+    moment = datetime.datetime.fromisoformat(entry["time"])
+    microseconds = (moment - EPOCH) // datetime.timedelta(microseconds=1)
+
+    present = 0
+    body = [_pack_text(roll_data.get("type", ""))]
+    for bit, (name, field) in enumerate(FIELDS):
+        if name not in roll_data:
+            continue
+        value = roll_data[name]
+        present |= 1 << bit
+        if value is None:
+            present |= 1 << (bit + NONE_SHIFT)
+        elif field is None:
+            body.append(_pack_text(value))
+        else:
+            body.append(field.pack(int(value)))
+    if "results" in roll_data:
+        present |= RESULTS_BIT
+        results = roll_data["results"]
+        if _is_pool(results):
+            body.append(bytes((RESULTS_POOL,)) + _pack_pool(results))
+        else:
+            body.append(
+                bytes((RESULTS_JSON,))
+                + _pack_text(json.dumps(results), BLOB_LENGTH)
+            )
+    version = roll_data.get("version")
+    packed_version = isinstance(version, int) and 0 <= version < 1 << 16
+    summary = roll_data.get("summary")
+    packed_summary = isinstance(summary, str) and len(summary) < 1 << 14
+    extra = {
+        key: value
+        for key, value in roll_data.items()
+        if key not in FIELD_NAMES
+        and key not in ("type", "results")
+        and not (key == "version" and packed_version)
+        and not (key == "summary" and packed_summary)
+    }
+    if extra:
+        present |= EXTRA_BIT
+        body.append(_pack_text(json.dumps(extra), BLOB_LENGTH))
+    if packed_version:
+        present |= VERSION_BIT
+        body.append(VERSION.pack(version))
+    if packed_summary:
+        present |= SUMMARY_BIT
+        body.append(_pack_text(summary))
+    header = HEADER.pack(bytes.fromhex(entry["hash"]), microseconds, present)
+    return header + b"".join(body)
+
+
+def decode_entry(buffer: bytes) -> dict:
+    """
+    Decodes a record produced by encode_entry.
+
+    Args:
+        buffer (bytes): The record, without its length prefix.
+
+    Returns:
+        dict: The entry with its "hash", "time" and "roll_data" keys.
+    """
+    digest, microseconds, present = HEADER.unpack_from(buffer)
+    offset = HEADER.size
+    roll_type, offset = _unpack_text(buffer, offset)
+    roll_data: dict = {"type": roll_type}
+    for names, field in _layout(present & (RESULTS_BIT - 1 | NONE_MASK)):
+        if field is None:
+            roll_data[names[0]], offset = _unpack_text(buffer, offset)
+        elif field.size:
+            roll_data.update(zip(names, field.unpack_from(buffer, offset)))
+            offset += field.size
+        else:
+            roll_data.update(dict.fromkeys(names))
+    if present & RESULTS_BIT:
+        kind = buffer[offset]
+        offset += 1
+        if kind == RESULTS_POOL:
+            roll_data["results"], offset = _unpack_pool(buffer, offset)
+        else:
+            text, offset = _unpack_text(buffer, offset, BLOB_LENGTH)
+            roll_data["results"] = json.loads(text)
+    if present & EXTRA_BIT:
+        text, offset = _unpack_text(buffer, offset, BLOB_LENGTH)
+        roll_data.update(json.loads(text))
+    if present & VERSION_BIT:
+        (roll_data["version"],) = VERSION.unpack_from(buffer, offset)
+        offset += VERSION.size
+    if present & SUMMARY_BIT:
+        roll_data["summary"], offset = _unpack_text(buffer, offset)
+    moment = EPOCH + datetime.timedelta(microseconds=microseconds)
+    return {"hash": digest.hex(), "time": moment.isoformat(), "roll_data": roll_data}
+
+
+def frame(entry: dict) -> bytes:
+    """
+    Encodes an entry as a length-prefixed record.
+
+    Args:
+        entry (dict): The roll log entry.
+
+    Returns:
+        bytes: The length prefix followed by the record.
+    """
+    record = encode_entry(entry)
+    return RECORD_LENGTH.pack(len(record)) + record
+
+
+def iter_records(data: bytes) -> Iterator[dict]:
+    """
+    Decodes consecutive length-prefixed records. A truncated last record,
+        such as one torn by a crash in the middle of a write, is ignored.
+
+    Args:
+        data (bytes): The records.
+
+    Yields:
+        dict: The decoded entries, in order.
+    """
+    view = memoryview(data)
+    offset = 0
+    while offset + RECORD_LENGTH.size <= len(data):
+        (length,) = RECORD_LENGTH.unpack_from(view, offset)
+        offset += RECORD_LENGTH.size
+        if offset + length > len(data):
+            return
+        yield decode_entry(bytes(view[offset:offset + length]))
+        offset += length
+
+
+def complete_length(data: bytes) -> int:
+    """
+    Measures the complete records at the start of the data, without
+        decoding them.
+
+    Args:
+        data (bytes): The records.
+
+    Returns:
+        int: Length of the data up to the end of the last complete record.
+    """
+    offset = 0
+    while offset + RECORD_LENGTH.size <= len(data):
+        (length,) = RECORD_LENGTH.unpack_from(data, offset)
+        if offset + RECORD_LENGTH.size + length > len(data):
+            break
+        offset += RECORD_LENGTH.size + length
+    return offset
+
+
+def is_log_entry(entry) -> bool:
+    """
+    Checks that an entry of a JSON roll log can be encoded.
+
+    Args:
+        entry: A decoded JSON value.
+
+    Returns:
+        bool: Whether the entry is a dict with a 32-digit hex hash,
+            an ISO time and a dict of roll data.
+    """
+    if not isinstance(entry, dict):
+        return False
+    roll_hash, moment = entry.get("hash"), entry.get("time")
+    if not isinstance(roll_hash, str) or len(roll_hash) != 32:
+        return False
+    if not isinstance(moment, str) or not isinstance(entry.get("roll_data"), dict):
+        return False
+    try:
+        bytes.fromhex(roll_hash)
+        datetime.datetime.fromisoformat(moment)
+    except ValueError:
+        return False
+    return True
+
+
+def read_json_log(path: str) -> list[dict]:
+    """
+    Reads the entries of a JSON or JSON-lines roll log.
+
+    Args:
+        path (str): The log file; a ".jsonl" extension selects JSON lines.
+
+    Returns:
+        list[dict]: The entries that have a hash, time and roll data;
+            malformed ones, like the template of the shipped log, are skipped.
+    """
+    with open(path, "r", encoding='utf-8') as file:
+        if path.endswith(".jsonl"):
+            entries = []
+            for line in file:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        else:
+            entries = json.load(file)
+    if not isinstance(entries, list):
+        return []
+    return [entry for entry in entries if is_log_entry(entry)]
+
+
+def convert_json_log(source: str, destination: str) -> int:
+    """
+    Converts a JSON or JSON-lines roll log to the binary format.
+
+    Args:
+        source (str): The JSON log.
+        destination (str): The binary log to write.
+
+    Returns:
+        int: Number of converted entries.
+    """
+    entries = read_json_log(source)
+    with open(destination, "wb") as file:
+        for entry in entries:
+            file.write(frame(entry))
+    return len(entries)
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    """
+    Converts a roll log from the command line.
+
+    Args:
+        argv (list, optional): The arguments, defaulting to sys.argv.
+    """
+    parser = argparse.ArgumentParser(
+        description="Convert a JSON or JSON-lines roll log to the binary format."
+    )
+    parser.add_argument("source", help="dice_rolls.json or dice_rolls.jsonl")
+    parser.add_argument("destination", help="binary log to write, e.g. dice_rolls.bin")
+    arguments = parser.parse_args(argv)
+    count = convert_json_log(arguments.source, arguments.destination)
+    print(f"Converted {count} rolls to {arguments.destination}")
+
+
+if __name__ == "__main__":
+    main()
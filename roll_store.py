@@ -0,0 +1,191 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+from collections import deque
+from typing import Optional
+
+from logger import RollLogger
+from metrics import STAGE_SECONDS
+from persistence import BackgroundWriter
+
+
+class RollStore:
+    """
+    Long-lived in-memory store of the most recent rolls.
+
+    The store loads the roll log once and then serves every lookup from
+    memory: a hash index answers get_roll_by_hash in constant time and
+    a bounded deque keeps the eviction order. The entries of a lazy
+    backend, such as the ring buffer, are not loaded: the store holds the
+    rolls logged since it started and looks older ones up in the backend.
+    New rolls are written behind to the backend in batches, either once
+    flush_threshold rolls are pending or whenever flush is called. With
+    a BackgroundWriter the writes run on the writer's thread and never
+    block the caller.
+    Rolls may be logged and looked up from several threads.
+
+    Attributes:
+        backend (RollLogger): Roll log the store persists to.
+        entries (deque): Most recent log entries, oldest first.
+        index (dict): Log entries keyed by their hash.
+        pending (list): Entries not yet written to the backend.
+        flush_threshold (int): Number of pending entries that triggers
+            a write to the backend.
+        writer (BackgroundWriter, optional): Writer performing the backend
+            writes, or None to write on the calling thread.
+    """
+
+    def __init__(
+        self,
+        backend: RollLogger,
+        max_logs: Optional[int] = None,
+        flush_threshold: int = 50,
+        writer: Optional[BackgroundWriter] = None,
+    ) -> None:
+        """
+        Initializes the store from the entries already held by the backend,
+            unless the backend is lazy.
+
+        Args:
+            backend (RollLogger): Roll log to load from and persist to.
+            max_logs (int, optional): Number of most recent rolls to keep.
+                Defaults to the backend's max_logs.
+            flush_threshold (int): Number of pending entries that triggers
+                a write to the backend. 1 makes the store write-through.
+            writer (BackgroundWriter, optional): Writer performing the
+                backend writes. Defaults to writing on the calling thread.
+        """
+        self.backend: RollLogger = backend
+        self.entries: deque = deque(
+            (
+                log
+                for log in ([] if backend.LAZY else backend.logs)
+                if isinstance(log, dict) and "hash" in log
+            ),
+            maxlen=backend.max_logs if max_logs is None else max_logs,
+        )
+        self.index: dict[str, dict] = {
+            log["hash"]: log for log in self.entries
+        }
+        self.pending: list[dict] = []
+        self.flush_threshold: int = flush_threshold
+        self.writer: Optional[BackgroundWriter] = writer
+        self._pending_lock: threading.Lock = threading.Lock()
+        self._entries_lock: threading.Lock = threading.Lock()
+
+    def log_roll(self, roll_data: dict[str, str]) -> str:
+        """
+        Logs a new dice roll, evicting the oldest one if the store is full.
+
+        Args:
+            roll_data (dict): Data related to the dice roll.
+
+        Returns:
+            str: The hash representing the logged roll.
+        """
+        entry = self.backend.make_log_entry(roll_data)
+        with self._entries_lock:
+            if self.entries and len(self.entries) == self.entries.maxlen:
+                evicted = self.entries.popleft()
+                if self.index.get(evicted["hash"]) is evicted:
+                    del self.index[evicted["hash"]]
+            self.entries.append(entry)
+            self.index[entry["hash"]] = entry
+        with self._pending_lock:
+            self.pending.append(entry)
+        if len(self.pending) >= self.flush_threshold:
+            self.flush()
+        return entry["hash"]
+
+    def get_roll_by_hash(self, roll_hash: str) -> Optional[dict[str, str]]:
+        """
+        Retrieves a roll based on its hash without touching the disk.
+
+        Args:
+            roll_hash (str): The hash of the roll to be retrieved.
+
+        Returns:
+            dict: The roll data associated with the provided hash.
+                None if the roll is not found.
+        """
+        entry = self.index.get(roll_hash)
+        if entry:
+            return entry["roll_data"]
+        if self.backend.INDEXED or self.backend.LAZY:
+            return self.backend.get_roll_by_hash(roll_hash)
+        return None
+
+    def history(
+        self,
+        room: Optional[str] = None,
+        user: Optional[str] = None,
+        limit: int = 10,
+    ) -> list[dict]:
+        """
+        Retrieves the most recent log entries, optionally of one room or user.
+
+        The entries held in memory are searched first, so rolls that are
+            still pending are included; older entries come from the backend.
+
+        Args:
+            room (str, optional): Only entries of rolls made in this room.
+            user (str, optional): Only entries of rolls made by this user.
+            limit (int): Maximum number of entries.
+
+        Returns:
+            list[dict]: The matching entries, newest first.
+        """
+        matches = []
+        with self._entries_lock:
+            entries = list(self.entries)
+        for entry in reversed(entries):
+            if len(matches) >= limit:
+                return matches
+            roll_data = entry["roll_data"]
+            if room is not None and roll_data.get("room") != room:
+                continue
+            if user is not None and roll_data.get("user") != user:
+                continue
+            matches.append(entry)
+        if self.backend.INDEXED or self.backend.LAZY:
+            seen = {entry["hash"] for entry in matches}
+            for entry in self.backend.history(room, user, limit + len(matches)):
+                if len(matches) >= limit:
+                    break
+                if entry["hash"] not in seen:
+                    matches.append(entry)
+        return matches
+
+    def flush(self) -> None:
+        """
+        Writes all pending entries to the backend in a single batch,
+            on the writer's thread if the store has one.
+        """
+        if not self.pending:
+            return
+        if self.writer is None:
+            self.write_pending()
+        else:
+            self.writer.submit(self.backend.LOG_FILE, self.write_pending)
+
+    def write_pending(self) -> None:
+        """
+        Takes the pending entries and appends them to the backend.
+        """
+        with self._pending_lock:
+            pending, self.pending = self.pending, []
+        if pending:
+            with STAGE_SECONDS.time("persist"):
+                self.backend.append_logs(pending)
@@ -0,0 +1,82 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import random
+import secrets
+from typing import NamedTuple, Optional
+
+
+class StreamPosition(NamedTuple):
+    """
+    Address of a single roll within a room's random stream.
+
+    Attributes:
+        seed (int): The 64-bit seed of the stream.
+        counter (int): Number of the roll within the stream, from 1.
+    """
+
+    seed: int
+    counter: int
+
+    def generator(self) -> random.Random:
+        """
+        Creates the random generator of the roll at this position.
+
+        The same position always yields a generator producing the
+        same numbers, so a roll can be regenerated from its position.
+
+        Returns:
+            random.Random: A generator seeded from the seed and the counter.
+        """
+        return random.Random((self.seed << 64) | self.counter)
+
+
+class RoomStreams:
+    """
+    Independent, counter-addressed random streams, one per room.
+
+    Each room draws an unpredictable 64-bit seed the first time it rolls
+    in this process. Every roll then advances the room's counter and gets
+    its own generator seeded from the seed and the counter, so rolls of
+    different rooms never share generator state and any roll can be
+    regenerated from the position recorded in the roll log.
+
+    Attributes:
+        streams (dict): Current position of every room's stream.
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes the streams with no rooms.
+        """
+        self.streams: dict[Optional[str], StreamPosition] = {}
+
+    def advance(self, room_id: Optional[str] = None) -> StreamPosition:
+        """
+        Moves a room's stream to its next roll.
+
+        Args:
+            room_id (str, optional): The room rolling. Rolls outside
+                a room share a stream of their own.
+
+        Returns:
+            StreamPosition: The position of the roll.
+        """
+        position = self.streams.get(room_id)
+        if position is None:
+            position = StreamPosition(secrets.randbits(64), 1)
+        else:
+            position = position._replace(counter=position.counter + 1)
+        self.streams[room_id] = position
+        return position
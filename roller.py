@@ -12,34 +12,101 @@
 # You should have received a copy of the GNU General Public License
 # along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
 
-from typing import Optional
+import heapq
+import itertools
+import math
+import random
+from typing import Optional, Union
 
 from dice import Die
+from face_pool import POOL_RATIO, FacePool
+
+SELECTIONS: tuple[str, ...] = ("dh", "dl", "kh", "kl")
+MAX_CHAIN_DEPTH: int = 20
 
 
 class Roller:
     """Handles various types of dice rolls and related operations.
 
+    Every roll type draws its dice through Die.roll_many, so a pool of any
+    size costs one batched draw instead of one call per die. Exploding and
+    imploding rolls draw the length of every chain at once and its dice in
+    a few batches, see roll_chains, and stop after max_depth added dice.
+
+    Pools of at least POOL_RATIO dice per side are drawn as a FacePool
+    instead, holding the number of dice showing each face, and are summed
+    and selected on those counts. Their results hold the FacePool in place
+    of the list of dice.
+
     Attributes:
         num_dice (int): Number of dice to be rolled.
         die (Die): Instance of Die class representing
             a dice with specified number of sides.
+        rng (random.Random, optional): Random generator the dice are drawn
+            from, or None for the global generator of the random module.
     """
 
-    def __init__(self, num_dice: int, sides: int):
+    def __init__(
+        self,
+        num_dice: int,
+        sides: int,
+        rng: Optional[random.Random] = None,
+        max_depth: int = MAX_CHAIN_DEPTH,
+    ):
         """
         Initializes a new instance of the Roller class.
 
         Args:
             num_dice (int): Number of dice to be rolled.
             sides (int): Number of sides on each dice.
+            rng (random.Random, optional): Random generator the dice are
+                drawn from. A seeded generator makes the rolls reproducible.
+            max_depth (int): Most dice an exploding or imploding die adds.
         """
         self.num_dice: int = num_dice
         self.die: Die = Die(sides)
+        self.rng: Optional[random.Random] = rng
+        self.max_depth: int = max_depth
+
+    def pooled(self) -> bool:
+        """
+        Checks whether the dice are drawn as counts per face.
+
+        Returns:
+            bool: True if there are at least POOL_RATIO dice per side.
+        """
+        return self.num_dice >= POOL_RATIO * self.die.sides
+
+    def roll_pool(self, count: int) -> FacePool:
+        """
+        Draws dice as counts per face.
+
+        Args:
+            count (int): Number of dice.
+
+        Returns:
+            FacePool: The dice.
+        """
+        return FacePool.roll(count, self.die.sides, self.rng)
+
+    def _pool_result(
+        self, pool: FacePool, modifier: int
+    ) -> tuple[FacePool, list[int, int]]:
+        """
+        Builds the result of a roll drawn as counts per face.
+
+        Args:
+            pool (FacePool): The dice.
+            modifier (int): Modifier to be added to the sum of the dice rolls.
+
+        Returns:
+            tuple: The pool, then the total and the modifier.
+        """
+        return pool, [pool.total() + modifier, modifier]
 
     def normal_roll(
         self, modifier: int = 0
-    ) -> tuple[list[int, ...], list[int, int]]:
+    ) -> tuple[Union[list[int, ...], FacePool], list[int, int]]:
         """
         Performs a normal roll of the dice.
 
@@ -51,145 +118,292 @@ class Roller:
                    Second element is a tuple with total sum after
                         adding the modifier and the modifier itself.
         """
-        rolls: list[int, ...] = [self.die.roll() for _ in range(self.num_dice)]
+        if self.pooled():
+            return self._pool_result(self.roll_pool(self.num_dice), modifier)
+        rolls: list[int, ...] = self.die.roll_many(self.num_dice, self.rng)
         return rolls, [sum(rolls) + modifier, modifier]
 
     def exploding_roll(
             self, threshold: Optional[int] = None, modifier: int = 0
     ) -> tuple[list[int], list[int]]:
         """
-        Performs an exploding roll where additional rolls are
-            made for dice values above a threshold.
+        Performs an exploding roll where an additional die is rolled
+            for every die showing at least the threshold, for at most
+            max_depth additional dice per die.
 
         Args:
-            threshold (Optional[int]): Threshold value above which additional rolls are made.
+            threshold (Optional[int]): Lowest value that adds a die,
+                from 2 to the number of sides. Defaults to the number of sides.
             modifier (int): Modifier to be added to the sum of the dice rolls.
 
         Returns:
             tuple: Similar to normal_roll.
+
+        Raises:
+            ValueError: If the threshold is out of range.
         """
-        rolls: list[int, ...] = self.normal_roll(modifier)[0]
-        threshold = self.die if threshold is None else threshold
-        i = 0
-        while i < len(rolls):
-            if rolls[i] >= threshold:
-                rolls.append(self.die.roll())
-                i -= 1
-            i += 1
-        return rolls, [
-            sum(roll for roll in rolls if isinstance(roll, int)) + modifier,
-            modifier,
-        ]
+        rerolled = rerolled_faces(self.die.sides, "e", threshold)
+        return self._chain_roll(rerolled, modifier)
 
     def imploding_roll(
         self, threshold: Optional[int] = None, modifier: int = 0
     ) -> tuple[list[int], list[int]]:
         """
-        Performs an imploding roll where additional rolls are
-            made for dice values under a given threshold.
+        Performs an imploding roll where an additional die is rolled
+            for every die showing at most the threshold, for at most
+            max_depth additional dice per die.
 
         Args:
-            threshold (Optional[int]): Threshold value under which additional rolls are made.
+            threshold (Optional[int]): Highest value that adds a die,
+                from 1 to the number of sides minus 1. Defaults to 1.
             modifier (int): Modifier to be added to the sum of the dice rolls.
 
         Returns:
             tuple: First element is a list of individual dice rolls.
                    Second element is a tuple with total sum after
                         adding the modifier and the modifier itself.
+
+        Raises:
+            ValueError: If the threshold is out of range.
         """
-        rolls: list[int, ...] = self.normal_roll(modifier)[0]
-        threshold = 1 if threshold is None else threshold
-        i = 0
-        while i < len(rolls):
-            if rolls[i] <= threshold:
-                rolls.append(self.die.roll())
-            i += 1
+        rerolled = rerolled_faces(self.die.sides, "i", threshold)
+        return self._chain_roll(rerolled, modifier)
+
+    def _chain_roll(
+        self, rerolled: range, modifier: int
+    ) -> tuple[Union[list[int], FacePool], list[int, int]]:
+        """
+        Rolls the dice with their exploding or imploding chains.
+
+        Args:
+            rerolled (range): Faces that add another die.
+            modifier (int): Modifier to be added to the sum of the dice rolls.
+
+        Returns:
+            tuple: The dice, then the total and the modifier.
+        """
+        if self.pooled():
+            pool = FacePool.roll_chains(
+                self.num_dice, self.die.sides, rerolled, self.max_depth, self.rng
+            )
+            return self._pool_result(pool, modifier)
+        rolls = roll_chains(self.die, self.num_dice, rerolled, self.rng, self.max_depth)
         return rolls, [sum(rolls) + modifier, modifier]
 
-    def drop_high(
-        self, modifier: int = 0
-    ) -> tuple[list[int, ...], list[int, int]]:
+    def select(
+        self, selection: str, count: int = 1, modifier: int = 0
+    ) -> tuple[Union[list, FacePool], list[int, int]]:
         """
-        Performs a dice roll and drops the highest roll.
+        Performs a dice roll and keeps or drops its highest or lowest dice.
+
+        The dice are selected with a bounded heap, in O(N log count) rather
+            than by sorting the whole pool; among tied dice the first rolled
+            are selected first. Pools drawn as counts per face are selected
+            on their counts.
 
         Args:
+            selection (str): "dh" (drop highest), "dl" (drop lowest),
+                "kh" (keep highest) or "kl" (keep lowest).
+            count (int): Number of dice dropped or kept.
             modifier (int): Modifier to be added to the sum of the dice rolls.
 
         Returns:
-            tuple: First element is a list of individual dice rolls.
+            tuple: First element is a list of individual dice rolls, with
+                        discarded dice replaced by the upper-case selection.
                    Second element is a tuple with total sum after
                         adding the modifier and the modifier itself.
+
+        Raises:
+            ValueError: If count is not between 1 and the number of dice.
         """
-        rolls: list[int, ...] = self.normal_roll(modifier)[0]
-        max_val = max(rolls)
-        rolls[rolls.index(max_val)] = "DH"
+        if not 1 <= count <= self.num_dice:
+            raise ValueError(
+                f"'{selection}' count should be between 1 and {self.num_dice}"
+            )
+        if self.pooled():
+            pool = self.roll_pool(self.num_dice).select(selection, count)
+            return self._pool_result(pool, modifier)
+        rolls = mark_selection(
+            self.die.roll_many(self.num_dice, self.rng), selection, count
+        )
         return rolls, [
             sum(roll for roll in rolls if isinstance(roll, int)) + modifier,
             modifier,
         ]
 
+    def drop_high(
+        self, modifier: int = 0, count: int = 1
+    ) -> tuple[list[int, ...], list[int, int]]:
+        """
+        Performs a dice roll and drops the highest rolls.
+
+        Args:
+            modifier (int): Modifier to be added to the sum of the dice rolls.
+            count (int): Number of dice dropped.
+
+        Returns:
+            tuple: Similar to select.
+        """
+        return self.select("dh", count, modifier)
+
     def drop_low(
-        self, modifier: int = 0
+        self, modifier: int = 0, count: int = 1
     ) -> tuple[list[int, ...], list[int, int]]:
         """
-        Performs a dice roll and drops the lowest roll.
+        Performs a dice roll and drops the lowest rolls.
 
         Args:
             modifier (int): Modifier to be added to the sum of the dice rolls.
+            count (int): Number of dice dropped.
 
         Returns:
-            tuple: First element is a list of individual dice rolls.
-                   Second element is a tuple with total sum after
-                        adding the modifier and the modifier itself.
+            tuple: Similar to select.
         """
-        rolls: list[int, ...] = self.normal_roll(modifier)[0]
-        min_val = min(rolls)
-        rolls[rolls.index(min_val)] = "DL"
-        return rolls, [
-            sum(roll for roll in rolls if isinstance(roll, int)) + modifier,
-            modifier,
-        ]
+        return self.select("dl", count, modifier)
 
     def keep_high(
-        self, modifier: int = 0
+        self, modifier: int = 0, count: int = 1
     ) -> tuple[list[int, ...], list[int, int]]:
         """
-        Performs a dice roll and keeps only the highest roll.
+        Performs a dice roll and keeps only the highest rolls.
 
         Args:
             modifier (int): Modifier to be added to the sum of the dice rolls.
+            count (int): Number of dice kept.
 
         Returns:
-            tuple: First element is a list of individual dice rolls.
-                   Second element is a tuple with total sum after
-                        adding the modifier and the modifier itself.
+            tuple: Similar to select.
         """
-        rolls: list[int, ...] = self.normal_roll(modifier)[0]
-        max_val = max(rolls)
-        rolls = ["KH" if roll != max_val else max_val for roll in rolls]
-        return rolls, [
-            sum(roll for roll in rolls if isinstance(roll, int)) + modifier,
-            modifier,
-        ]
+        return self.select("kh", count, modifier)
 
     def keep_low(
-        self, modifier: int = 0
+        self, modifier: int = 0, count: int = 1
     ) -> tuple[list[int, ...], list[int, int]]:
         """
-        Performs a dice roll and keeps only the lowest roll.
+        Performs a dice roll and keeps only the lowest rolls.
 
         Args:
             modifier (int): Modifier to be added to the sum of the dice rolls.
+            count (int): Number of dice kept.
 
         Returns:
-            tuple: First element is a list of individual dice rolls.
-                   Second element is a tuple with total sum after
-                        adding the modifier and the modifier itself.
+            tuple: Similar to select.
         """
-        rolls: list[int, ...] = self.normal_roll(modifier)[0]
-        min_val = min(rolls)
-        rolls = ["KL" if roll != min_val else min_val for roll in rolls]
-        return rolls, [
-            sum(roll for roll in rolls if isinstance(roll, int)) + modifier,
-            modifier,
-        ]
+        return self.select("kl", count, modifier)
+
+
+def split_selection(roll_type: str) -> tuple[str, int]:
+    """
+    Splits a keep or drop roll type such as "kh3" into the selection
+        and the number of dice it selects, 1 if it is not given.
+
+    Args:
+        roll_type (str): The roll type.
+
+    Returns:
+        tuple: The selection and its count, or the roll type unchanged
+            and 1 if it is not a keep or drop roll type.
+    """
+    selection, count = roll_type[:2], roll_type[2:]
+    if selection in SELECTIONS and (not count or count.isdigit()):
+        return selection, int(count or 1)
+    return roll_type, 1
+
+
+def mark_selection(rolls: list[int], selection: str, count: int) -> list:
+    """
+    Replaces the dice discarded by a keep or drop selection by its marker.
+
+    Args:
+        rolls (list[int]): The dice, in roll order.
+        selection (str): "dh", "dl", "kh" or "kl".
+        count (int): Number of dice dropped or kept.
+
+    Returns:
+        list: The dice, with discarded ones replaced by the upper-case selection.
+    """
+    marker = selection.upper()
+    keep = selection[0] == "k"
+    pick = heapq.nlargest if selection[1] == "h" else heapq.nsmallest
+    chosen = set(pick(count, range(len(rolls)), key=rolls.__getitem__))
+    return [
+        roll if (index in chosen) == keep else marker
+        for index, roll in enumerate(rolls)
+    ]
+
+
+def rerolled_faces(
+    sides: int, roll_type: str, threshold: Optional[int] = None
+) -> range:
+    """
+    Finds the faces that add another die to an exploding or imploding chain.
+
+    Args:
+        sides (int): Number of sides on the die.
+        roll_type (str): "e" (exploding) or "i" (imploding).
+        threshold (int, optional): Lowest exploding value, by default the
+            number of sides, or highest imploding value, by default 1.
+
+    Returns:
+        range: The faces adding a die.
+
+    Raises:
+        ValueError: If the threshold would make every face or no face add a die.
+    """
+    if roll_type == "e":
+        threshold = sides if threshold is None else threshold
+        if not 2 <= threshold <= sides:
+            raise ValueError(f"Exploding threshold should be between 2 and {sides}")
+        return range(threshold, sides + 1)
+    threshold = 1 if threshold is None else threshold
+    if not 1 <= threshold < sides:
+        raise ValueError(f"Imploding threshold should be between 1 and {sides - 1}")
+    return range(1, threshold + 1)
+
+
+def roll_chains(
+    die: Die,
+    count: int,
+    rerolled: range,
+    rng: Optional[random.Random] = None,
+    max_depth: int = MAX_CHAIN_DEPTH,
+) -> list[int]:
+    """
+    Rolls dice with their exploding or imploding chains in bulk.
+
+    The chain of every die is a run of dice showing rerolled faces, ended
+        by a die showing another face, or by any die once max_depth dice
+        were added. Its length is drawn at once from the geometric
+        distribution, truncated at max_depth, and the faces of all chains
+        are then drawn in three batches: continuing, ending and truncated
+        dice. A roll costs O(count * max_depth) at worst, whatever the dice show.
+
+    Args:
+        die (Die): The die rolled.
+        count (int): Number of dice.
+        rerolled (range): Faces that add another die, neither none nor all.
+        rng (random.Random, optional): Random generator to draw from.
+        max_depth (int): Most dice added to the chain of a die.
+
+    Returns:
+        list[int]: The dice, the first die of every chain first, then the
+            second die of every chain that has one, and so on.
+    """
+    rng = rng or random
+    log_rerolled = math.log(len(rerolled) / die.sides)
+    lengths = [
+        min(int(math.log(1.0 - rng.random()) / log_rerolled), max_depth)
+        for _ in range(count)
+    ]
+    ending = [face for face in die.faces if face not in rerolled]
+    truncated = sum(1 for length in lengths if length == max_depth)
+    continuing = iter(rng.choices(rerolled, k=sum(lengths)))
+    ended = iter(rng.choices(ending, k=count - truncated))
+    cut = iter(die.roll_many(truncated, rng))
+
+    waves: list[list[int]] = [[] for _ in range(max(lengths, default=0) + 1)]
+    for length in lengths:
+        for depth in range(length):
+            waves[depth].append(next(continuing))
+        waves[length].append(next(cut if length == max_depth else ended))
+    return list(itertools.chain.from_iterable(waves))
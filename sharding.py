@@ -0,0 +1,88 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+
+
+class ShardPool:
+    """
+    Worker processes that rooms are sharded across by a hash of their id.
+
+    Each shard is a single worker process, so the work of one room always
+    runs in the same process, in submission order, while rooms of other
+    shards run in parallel without sharing a GIL. The workers only compute:
+    they receive everything a computation needs and return its result, so
+    the Matrix connection, the random streams and the roll log stay in the
+    supervising process.
+
+    Attributes:
+        shards (int): Number of worker processes.
+        executors (list[ProcessPoolExecutor]): The executor of each shard.
+    """
+
+    def __init__(self, shards: int) -> None:
+        """
+        Initializes the pool. Worker processes are started on first use.
+
+        Args:
+            shards (int): Number of worker processes.
+
+        Raises:
+            ValueError: If the number of shards is not positive.
+        """
+        if shards < 1:
+            raise ValueError("The number of shards must be positive")
+        self.shards: int = shards
+        self.executors: list[ProcessPoolExecutor] = [
+            ProcessPoolExecutor(max_workers=1) for _ in range(shards)
+        ]
+
+    def shard_of(self, room_id: Optional[str]) -> int:
+        """
+        Selects the shard of a room. The choice is stable across runs.
+
+        Args:
+            room_id (str, optional): The room, or None for work outside a room.
+
+        Returns:
+            int: Number of the shard.
+        """
+        if room_id is None:
+            return 0
+        return zlib.crc32(room_id.encode()) % self.shards
+
+    def submit(
+        self, room_id: Optional[str], function: Callable, *args: Any
+    ) -> Future:
+        """
+        Schedules a computation on the shard of a room.
+
+        Args:
+            room_id (str, optional): The room the computation is made for.
+            function (Callable): Module-level function to run.
+            *args: Picklable arguments of the function.
+
+        Returns:
+            Future: The future result of the function.
+        """
+        return self.executors[self.shard_of(room_id)].submit(function, *args)
+
+    def shutdown(self) -> None:
+        """
+        Waits for pending computations and stops the worker processes.
+        """
+        for executor in self.executors:
+            executor.shutdown()
@@ -0,0 +1,110 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from bot_reasoning import (
+    AuditCommand,
+    CommandRouter,
+    CreditsCommand,
+    ExpressionCommand,
+    HistoryCommand,
+    MyRollsCommand,
+    PingCommand,
+    RerollCommand,
+    RollCommand,
+    RollManyCommand,
+    StatsCommand,
+)
+
+
+class CommandRouterTest(unittest.TestCase):
+    """
+    Routes messages into typed commands.
+    """
+
+    def test_chatter_is_not_a_command(self) -> None:
+        """Messages without a leading slash are ignored."""
+        self.assertIsNone(CommandRouter.route("roll 2d6 please"))
+        self.assertIsNone(CommandRouter.route(""))
+        self.assertIsNone(CommandRouter.route("/unknown"))
+
+    def test_plain_commands(self) -> None:
+        """Commands without arguments route to their empty commands."""
+        self.assertEqual(CommandRouter.route("/ping"), PingCommand())
+        self.assertEqual(CommandRouter.route("/credits"), CreditsCommand())
+
+    def test_dice_roll(self) -> None:
+        """A single NdM+B roll_type term routes to a RollCommand."""
+        self.assertEqual(
+            CommandRouter.route("/roll 4d6-1 dl"), RollCommand(4, 6, -1, "dl")
+        )
+        self.assertEqual(
+            CommandRouter.route("/ROLL 2d20KH"), RollCommand(2, 20, 0, "kh")
+        )
+        self.assertEqual(
+            CommandRouter.route("/stats 3d8+2"), StatsCommand(3, 8, 2, "normal")
+        )
+
+    def test_thresholds(self) -> None:
+        """Comparisons after e and i become inclusive thresholds."""
+        self.assertEqual(
+            CommandRouter.route("/roll 6d10e>=8"), RollCommand(6, 10, 0, "e", 8)
+        )
+        self.assertEqual(
+            CommandRouter.route("/roll 6d10e>7"), RollCommand(6, 10, 0, "e", 8)
+        )
+        self.assertEqual(
+            CommandRouter.route("/stats 4d6i<2"), StatsCommand(4, 6, 0, "i", 1)
+        )
+        with self.assertRaises(ValueError):
+            CommandRouter.route("/roll 6d10e<=3")
+
+    def test_expressions(self) -> None:
+        """Other roll arguments route to the expression engine."""
+        self.assertEqual(
+            CommandRouter.route("/roll 2d6+1d4+3"), ExpressionCommand("2d6+1d4+3")
+        )
+        self.assertEqual(
+            CommandRouter.route("/rollmany 200 1d20+5 vs 15"),
+            RollManyCommand(200, "1d20+5 vs 15"),
+        )
+
+    def test_log_commands(self) -> None:
+        """Commands reading the roll log keep their hash, user and limit."""
+        self.assertEqual(CommandRouter.route("/reroll abc123"), RerollCommand("abc123"))
+        self.assertEqual(CommandRouter.route("/audit abc123"), AuditCommand("abc123"))
+        self.assertEqual(CommandRouter.route("/history"), HistoryCommand(None, 10))
+        self.assertEqual(CommandRouter.route("/history 5"), HistoryCommand(None, 5))
+        self.assertEqual(
+            CommandRouter.route("/history @alice:example.org 3"),
+            HistoryCommand("alice", 3),
+        )
+        self.assertEqual(CommandRouter.route("/myrolls 7"), MyRollsCommand(7))
+
+    def test_malformed_arguments(self) -> None:
+        """A known command with malformed arguments reports its usage."""
+        for text, usage in (
+            ("/reroll", "/reroll hash"),
+            ("/rollmany many 1d6", "/rollmany K expression"),
+            ("/stats lots", "/stats NdM+B"),
+        ):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError) as raised:
+                    CommandRouter.route(text)
+                self.assertIn(usage, str(raised.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import random
+import unittest
+
+from dice_expression import (
+    HISTOGRAM_BARS,
+    MAX_BULK_DICE,
+    MAX_BULK_ROLLS,
+    MAX_DICE,
+    MAX_LENGTH,
+    MAX_REPEAT,
+    BulkRollResult,
+    compile_expression,
+)
+
+
+class CompileExpressionTest(unittest.TestCase):
+    """
+    Parses dice expressions and enforces their limits.
+    """
+
+    def test_structure(self) -> None:
+        """The repetitions, target and dice of an expression are parsed."""
+        compiled = compile_expression("(4d6dl)x6")
+        self.assertEqual((compiled.repeat, compiled.target, compiled.dice), (6, None, 4))
+        compiled = compile_expression("1d20 + 5 VS 15")
+        self.assertEqual(compiled.source, "1d20+5 vs 15")
+        self.assertEqual((compiled.repeat, compiled.target), (1, 15))
+
+    def test_cache(self) -> None:
+        """Spellings that normalize alike share one compiled expression."""
+        self.assertIs(compile_expression("2D6 + 3"), compile_expression("2d6+3"))
+
+    def test_roll(self) -> None:
+        """Totals add the dice and constants, and a target counts successes."""
+        result = compile_expression("2d6+1d4+3 vs 10").roll(random.Random(1))
+        (dice,) = result.rolls
+        self.assertEqual(result.totals, [sum(map(sum, dice)) + 3])
+        self.assertEqual(result.successes, int(result.totals[0] >= 10))
+
+    def test_selection_markers(self) -> None:
+        """Discarded dice are replaced by the marker of the selection."""
+        result = compile_expression("4d6kh3").roll(random.Random(2))
+        (term,) = result.rolls[0]
+        self.assertEqual(term.count("KH"), 1)
+        self.assertEqual(result.totals, [sum(die for die in term if die != "KH")])
+
+    def test_reproducible(self) -> None:
+        """The same generator state gives the same roll."""
+        compiled = compile_expression("(3d10e>=9)x4")
+        self.assertEqual(
+            compiled.roll(random.Random(7)), compiled.roll(random.Random(7))
+        )
+
+    def test_limits(self) -> None:
+        """Expressions over the length, dice or repetition limits are rejected."""
+        for source in (
+            "1d6+" * MAX_LENGTH,
+            f"{MAX_DICE + 1}d6",
+            f"{MAX_DICE // 2 + 1}d6x2",
+            f"(1d6)x{MAX_REPEAT + 1}",
+        ):
+            with self.subTest(source=source[:20]):
+                with self.assertRaises(ValueError):
+                    compile_expression(source)
+
+    def test_malformed(self) -> None:
+        """Malformed expressions raise ValueError."""
+        for source in ("", "2d", "1d6)", "1d6e<3", "2d6+?"):
+            with self.subTest(source=source):
+                with self.assertRaises(ValueError):
+                    compile_expression(source)
+
+
+
+class RollManyTest(unittest.TestCase):
+    """
+    Rolls expressions in bulk and summarizes the totals.
+    """
+
+    def test_histogram(self) -> None:
+        """Every repetition of every roll lands in the histogram."""
+        result = compile_expression("(2d6)x3 vs 7").roll_many(100, random.Random(4))
+        self.assertEqual(sum(times for _, times in result.histogram), 300)
+        self.assertEqual(
+            result.total, sum(value * times for value, times in result.histogram)
+        )
+        self.assertEqual(
+            result.successes,
+            sum(times for value, times in result.histogram if value >= 7),
+        )
+        self.assertIn(f"successes: {result.successes}/300", list(result.lines()))
+
+    def test_limits(self) -> None:
+        """Counts out of range and too many dice are rejected."""
+        for count in (0, MAX_BULK_ROLLS + 1):
+            with self.assertRaises(ValueError):
+                compile_expression("1d6").roll_many(count)
+        with self.assertRaisesRegex(ValueError, str(MAX_BULK_DICE)):
+            compile_expression("(10d1000e>=2)x100").roll_many(1000)
+
+    def test_binned_lines(self) -> None:
+        """Wide ranges of totals are grouped into at most HISTOGRAM_BARS bars."""
+        lines = list(compile_expression("1d1000").roll_many(5000, random.Random(3)).lines())
+        self.assertEqual(len(lines), 1 + HISTOGRAM_BARS)
+        self.assertTrue(lines[1].lstrip().startswith("1-50: #"))
+
+    def test_narrow_lines(self) -> None:
+        """Every total gets its own bar scaled to the most common one."""
+        result = BulkRollResult(3, [(1, 1), (2, 2)], 5)
+        self.assertEqual(
+            list(result.lines()),
+            [
+                "total 5, mean 1.67 over 3 results",
+                "1: ########## 1",
+                "2: #################### 2",
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import unittest
+
+from outbox import RoomOutbox
+
+ROOM = "!room:example.org"
+
+
+class RoomOutboxTest(unittest.IsolatedAsyncioTestCase):
+    """
+    Coalesces replies to a room through a slow connection.
+    """
+
+    async def asyncSetUp(self) -> None:
+        """Creates an outbox whose sends take longer than its window."""
+        self.sent: list[str] = []
+        self.outbox = RoomOutbox(self.send, window=0.01, max_length=15)
+
+    async def send(self, room_id: str, body: str) -> None:
+        """Records a message after a delay longer than the window."""
+        await asyncio.sleep(0.05)
+        self.sent.append(f"{room_id} {body}")
+
+    async def test_coalesced(self) -> None:
+        """Replies put during a window are sent together after the first."""
+        await asyncio.gather(*(self.outbox.put(ROOM, reply) for reply in "abc"))
+        await self.outbox.close()
+        self.assertEqual(self.sent, [f"{ROOM} a", f"{ROOM} b\nc"])
+
+    async def test_overflow_outlives_window(self) -> None:
+        """A reply held while an overflow is sent is flushed in order."""
+        replies = ["a" * 10, "b" * 10, "c" * 10]
+        await asyncio.gather(*(self.outbox.put(ROOM, reply) for reply in replies))
+        await self.outbox.close()
+        self.assertEqual(self.sent, [f"{ROOM} {reply}" for reply in replies])
+
+    async def test_after_close(self) -> None:
+        """Replies put after closing are sent at once."""
+        await self.outbox.close()
+        await self.outbox.put(ROOM, "a")
+        self.assertEqual(self.sent, [f"{ROOM} a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+
+from rate_limit import RateLimiter, command_cost
+
+ROOM = "!room:example.org"
+USER = "@user:example.org"
+
+
+class CommandCostTest(unittest.TestCase):
+    """
+    Estimates the cost of commands from their text.
+    """
+
+    def test_flat_cost(self) -> None:
+        """Chatter is free and a small command costs about one token."""
+        self.assertEqual(command_cost("hello 2d6"), 0.0)
+        self.assertEqual(command_cost("/ping"), 1.0)
+        self.assertAlmostEqual(command_cost("/roll 2d6"), 1.02)
+
+    def test_repetitions(self) -> None:
+        """Repetitions multiply the dice drawn but not the base token."""
+        self.assertAlmostEqual(command_cost("/rollmany 200 1d20+5 vs 15"), 3.0)
+        self.assertAlmostEqual(command_cost("/roll (4d6dl)x6"), 1.24)
+        self.assertAlmostEqual(command_cost("/rollmany 10 (1d6)x10"), 2.0)
+
+    def test_chains(self) -> None:
+        """Exploding and imploding dice count twice."""
+        self.assertAlmostEqual(command_cost("/roll 999d1000e"), 20.98)
+        self.assertAlmostEqual(command_cost("/roll 50d10i"), 2.0)
+
+
+class RateLimiterTest(unittest.TestCase):
+    """
+    Takes the cost of commands from token buckets on a fake clock.
+    """
+
+    def setUp(self) -> None:
+        """Creates a limiter of one token per second and a burst of 10."""
+        self.now = 0.0
+        self.limiter = RateLimiter(
+            user_rate=1.0, user_burst=10.0, clock=lambda: self.now
+        )
+
+    def test_burst(self) -> None:
+        """A full bucket allows its burst, then refills at its rate."""
+        for _ in range(10):
+            self.assertIsNone(self.limiter.allow(ROOM, USER, 1.0))
+        self.assertEqual(self.limiter.allow(ROOM, USER, 1.0), "user")
+        self.now += 1.0
+        self.assertIsNone(self.limiter.allow(ROOM, USER, 1.0))
+
+    def test_cost_above_capacity(self) -> None:
+        """A command costing more than the bucket empties a full bucket."""
+        cost = command_cost("/rollmany 2000 1d20")
+        self.assertGreater(cost, 10.0)
+        self.assertIsNone(self.limiter.allow(ROOM, USER, cost))
+        self.assertEqual(self.limiter.allow(ROOM, USER, cost), "user")
+        self.now += 9.0
+        self.assertEqual(self.limiter.allow(ROOM, USER, cost), "user")
+        self.now += 1.0
+        self.assertIsNone(self.limiter.allow(ROOM, USER, cost))
+
+    def test_notice(self) -> None:
+        """Rejected commands are reported at most once per interval."""
+        self.assertEqual(
+            self.limiter.reject(ROOM, "user"), "Slow down! Ignored commands: user x1"
+        )
+        self.assertIsNone(self.limiter.reject(ROOM, "user"))
+        self.now += self.limiter.notice_interval
+        self.assertEqual(
+            self.limiter.reject(ROOM, "other"),
+            "Slow down! Ignored commands: user x1, other x1",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
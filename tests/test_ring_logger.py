@@ -0,0 +1,82 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from logger import RingRollLogger
+
+ROLL_DATA = {
+    "type": "normal",
+    "num_dice": 1,
+    "sides": 20,
+    "modifier": 2,
+    "threshold": None,
+    "results": [[17], [19, 0]],
+}
+
+ENTRY = {
+    "hash": "ab23456789abcdef0123456789abcdef",
+    "time": "2024-05-01T12:30:45.123456",
+    "roll_data": ROLL_DATA,
+}
+
+
+class RingHashLookupTest(unittest.TestCase):
+    """
+    Looks up rolls in the ring buffer by their hash.
+    """
+
+    def setUp(self) -> None:
+        """Logs one roll to a ring buffer in an empty directory."""
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+        self.roll_logger = RingRollLogger(max_logs=10)
+        self.roll_logger.append_logs([ENTRY])
+
+    def tearDown(self) -> None:
+        """Leaves and removes the directory."""
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def test_exact_hash(self) -> None:
+        """The complete hash finds the roll, in either case."""
+        for roll_hash in (ENTRY["hash"], ENTRY["hash"].upper()):
+            with self.subTest(roll_hash=roll_hash):
+                self.assertEqual(self.roll_logger.get_roll_by_hash(roll_hash), ROLL_DATA)
+
+    def test_partial_hash(self) -> None:
+        """Prefixes, longer strings and other hashes find nothing."""
+        for roll_hash in (
+            "",
+            "ab",
+            ENTRY["hash"][:-1],
+            ENTRY["hash"] + "00",
+            "cd" + ENTRY["hash"][2:],
+        ):
+            with self.subTest(roll_hash=roll_hash):
+                self.assertIsNone(self.roll_logger.get_roll_by_hash(roll_hash))
+
+    def test_malformed_hash(self) -> None:
+        """Hashes that are not hexadecimal find nothing."""
+        for roll_hash in ("z" * 32, " " + ENTRY["hash"][1:]):
+            with self.subTest(roll_hash=roll_hash):
+                self.assertIsNone(self.roll_logger.get_roll_by_hash(roll_hash))
+
+
+if __name__ == "__main__":
+    unittest.main()
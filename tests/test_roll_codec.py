@@ -0,0 +1,99 @@
+# Elemental_Dice_Bot is Copyright (C) 2023 <Roman Glegola>
+#
+# Elemental_Dice_Bot is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation version 3 of the License.
+#
+# Elemental_Dice_Bot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Elemental_Dice_Bot. If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from logger import BinaryRollLogger, JsonlRollLogger, RingRollLogger
+from roll_codec import convert_json_log, iter_records, read_json_log
+
+SHIPPED_LOG = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "dice_rolls.json",
+)
+
+ENTRY = {
+    "hash": "0123456789abcdef0123456789abcdef",
+    "time": "2024-05-01T12:30:45.123456",
+    "roll_data": {
+        "type": "normal",
+        "num_dice": 2,
+        "sides": 10,
+        "modifier": 1,
+        "threshold": None,
+        "results": [[3, 7], [11, 0]],
+    },
+}
+
+
+class ShippedLogTest(unittest.TestCase):
+    """
+    Reads and converts the roll log shipped with the bot, whose only entry
+        is a template with a placeholder hash and time.
+    """
+
+    def setUp(self) -> None:
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        shutil.copy(SHIPPED_LOG, self.directory)
+        os.chdir(self.directory)
+
+    def tearDown(self) -> None:
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def test_read_skips_template(self) -> None:
+        """The template entry is not read as a roll."""
+        self.assertEqual(read_json_log("dice_rolls.json"), [])
+
+    def test_read_keeps_valid_entries(self) -> None:
+        """Entries after the template are read unchanged."""
+        with open("dice_rolls.json", "r", encoding='utf-8') as file:
+            entries = json.load(file)
+        with open("dice_rolls.json", "w", encoding='utf-8') as file:
+            json.dump(entries + [ENTRY], file)
+        self.assertEqual(read_json_log("dice_rolls.json"), [ENTRY])
+
+    def test_convert(self) -> None:
+        """Converting only the template writes no records."""
+        self.assertEqual(convert_json_log("dice_rolls.json", "dice_rolls.bin"), 0)
+        with open("dice_rolls.bin", "rb") as file:
+            self.assertEqual(list(iter_records(file.read())), [])
+
+    def test_binary_logger_after_legacy_import(self) -> None:
+        """The binary loggers start empty after the JSON lines import."""
+        JsonlRollLogger(max_logs=10)
+        for logger_class in (BinaryRollLogger, RingRollLogger):
+            with self.subTest(logger=logger_class.__name__):
+                roll_logger = logger_class(max_logs=10)
+                self.assertEqual(list(roll_logger.logs), [])
+        self.assertFalse(os.path.exists("dice_rolls.bin.tmp"))
+
+    def test_binary_logger_skips_template_in_journal(self) -> None:
+        """Replaying the journal skips the template but keeps real rolls."""
+        with open("dice_rolls.json", "r", encoding='utf-8') as file:
+            template = json.load(file)[0]
+        with open("dice_rolls.jsonl", "w", encoding='utf-8') as file:
+            for entry in (template, ENTRY):
+                file.write(json.dumps(entry) + "\n")
+        roll_logger = BinaryRollLogger(max_logs=10)
+        self.assertEqual(list(roll_logger.logs), [ENTRY])
+        self.assertFalse(os.path.exists("dice_rolls.bin.tmp"))
+
+
+if __name__ == "__main__":
+    unittest.main()